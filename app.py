@@ -6,25 +6,57 @@ Main Flask application entry point
 from flask import Flask
 from config import Config
 from models import db
+from database import init_db
+from utils.upload_utils import StreamingUploadRequest
+from utils.file_reaper import init_reaper
+from utils.instrumentation import init_instrumentation
+from utils.profiling import init_profiling
 import os
 
+def bootstrap(app):
+    """
+    One-time setup of the storage directories
+    
+    Runs inside create_app; with gunicorn's preload_app (gunicorn.conf.py)
+    that happens once in the master instead of in every worker. The schema
+    is managed separately by `python migrate_db.py`.
+    """
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    os.makedirs(app.config['PROJECTS_FOLDER'], exist_ok=True)
+    os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
+    os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'archives'), exist_ok=True)
+    if not app.config.get('PROJECT_ASSETS_FOLDER'):
+        # Dot folders are never served from the uploads route
+        app.config['PROJECT_ASSETS_FOLDER'] = os.path.join(app.config['UPLOAD_FOLDER'], '.project_assets')
+    os.makedirs(app.config['PROJECT_ASSETS_FOLDER'], exist_ok=True)
+
+
 def create_app(config_class=Config):
-    """Application factory pattern for Flask"""
+    """
+    Application factory pattern for Flask
+    
+    Safe to call before forking: it opens no database connections and
+    starts no threads (the file reaper starts on the first request in each
+    worker), and heavy image libraries are imported on first use.
+    """
     app = Flask(__name__)
     app.config.from_object(config_class)
+    app.request_class = StreamingUploadRequest
     
     # Initialize database
-    db.init_app(app)
+    init_db(app)
+    
+    # Opt-in timing, SQL accounting and /metrics
+    init_instrumentation(app)
+    
+    # Token-guarded cProfile captures and stack sampling
+    init_profiling(app)
     
     # Ensure necessary directories exist
-    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-    os.makedirs(app.config['PROJECTS_FOLDER'], exist_ok=True)
-    os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
-    os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'archives'), exist_ok=True)
+    bootstrap(app)
     
-    # Create database tables
-    with app.app_context():
-        db.create_all()
+    # Background removal of deleted upload trees
+    init_reaper(app)
     
     # Register blueprints
     from blueprints.main import bp as main_bp
@@ -51,5 +83,9 @@ def create_app(config_class=Config):
     return app
 
 if __name__ == '__main__':
+    import migrations
     app = create_app()
+    # Development convenience; deployments run `python migrate_db.py` instead
+    with app.app_context():
+        migrations.upgrade(db.engine)
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,8 @@
+"""
+Benchmarks for HueVault
+
+Run individual benchmarks as modules from the repository root, e.g.
+``python -m benchmarks.db_concurrency``. ``python -m benchmarks.suite``
+times every hot path on the synthetic fixtures in ``benchmarks.fixtures``
+and can compare the results against a saved baseline.
+"""
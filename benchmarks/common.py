@@ -0,0 +1,78 @@
+"""
+Shared helpers for HueVault benchmarks
+"""
+
+import contextlib
+import math
+import os
+import shutil
+import tempfile
+from typing import Dict, List
+
+from config import Config
+
+
+@contextlib.contextmanager
+def temporary_app(**overrides):
+    """
+    Build an app whose database and storage folders live in a temp directory
+
+    Blueprints read folder paths from ``Config`` directly, so the paths are
+    patched on the class for the duration of the context and restored after.
+
+    Args:
+        **overrides: Extra Config attributes to set (e.g. SQLITE_PRAGMAS={})
+
+    Yields:
+        The Flask application
+    """
+    from app import create_app
+    from models import db
+    import migrations
+
+    root = tempfile.mkdtemp(prefix='huevault-bench-')
+    settings = {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(root, 'bench.db')}",
+        'UPLOAD_FOLDER': os.path.join(root, 'uploads'),
+        'PROJECTS_FOLDER': os.path.join(root, 'projects'),
+        'OUTPUT_FOLDER': os.path.join(root, 'outputs'),
+    }
+    settings.update(overrides)
+    saved = {name: getattr(Config, name) for name in settings if hasattr(Config, name)}
+    for name, value in settings.items():
+        setattr(Config, name, value)
+    try:
+        app = create_app(Config)
+        with app.app_context():
+            migrations.upgrade(db.engine)
+        yield app
+        with app.app_context():
+            db.engine.dispose()
+    finally:
+        for name in settings:
+            if name in saved:
+                setattr(Config, name, saved[name])
+            else:
+                delattr(Config, name)
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    """Summarize a list of latencies in seconds as milliseconds"""
+    values = sorted(latencies)
+    return {
+        'count': len(values),
+        'mean_ms': (sum(values) / len(values) * 1000) if values else 0.0,
+        'p50_ms': percentile(values, 50) * 1000,
+        'p95_ms': percentile(values, 95) * 1000,
+        'p99_ms': percentile(values, 99) * 1000,
+        'max_ms': (values[-1] * 1000) if values else 0.0,
+    }
@@ -0,0 +1,125 @@
+"""
+Concurrency benchmark for the archives endpoints
+
+Runs a mix of reads (archive list and archive view) and writes (display
+name updates and project inserts) from several threads against a fresh
+SQLite database, once with the tuned pragmas from Config.SQLITE_PRAGMAS
+and once without, and reports throughput, latency and lock errors.
+
+Usage:
+    python -m benchmarks.db_concurrency --threads 8 --seconds 10
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+
+from benchmarks.common import temporary_app, summarize
+
+ARCHIVES = 8
+
+
+def _seed(client):
+    for i in range(ARCHIVES):
+        client.get(f'/archives/user{i}/edit')
+        for j in range(5):
+            client.post(f'/archives/user{i}/project', data={
+                'title': f'Project {j}',
+                'palette': json.dumps(['#0f62fe', '#da1e28', '#24a148'])
+            })
+
+
+def _worker(app, deadline, write_ratio, rng, results):
+    client = app.test_client()
+    while time.perf_counter() < deadline:
+        username = f'user{rng.randrange(ARCHIVES)}'
+        if rng.random() < write_ratio:
+            if rng.random() < 0.5:
+                name = 'update'
+                start = time.perf_counter()
+                response = client.post(f'/archives/{username}/update',
+                                       json={'display_name': f'User {rng.random():.6f}'})
+            else:
+                name = 'add_project'
+                start = time.perf_counter()
+                response = client.post(f'/archives/{username}/project', data={
+                    'title': 'Bench', 'palette': '["#8a3ffc"]'
+                })
+        else:
+            if rng.random() < 0.2:
+                name = 'list'
+                start = time.perf_counter()
+                response = client.get('/archives/')
+            else:
+                name = 'view'
+                start = time.perf_counter()
+                response = client.get(f'/archives/{username}/view')
+        elapsed = time.perf_counter() - start
+        results[name]['latencies'].append(elapsed)
+        if response.status_code >= 400:
+            results[name]['errors'] += 1
+            body = response.get_data(as_text=True)
+            if 'locked' in body:
+                results[name]['locked'] += 1
+
+
+def run(threads: int, seconds: float, write_ratio: float, tuned: bool) -> dict:
+    """Run one benchmark pass and return per-endpoint statistics"""
+    overrides = {} if tuned else {'SQLITE_PRAGMAS': {}}
+    with temporary_app(**overrides) as app:
+        _seed(app.test_client())
+        results = defaultdict(lambda: {'latencies': [], 'errors': 0, 'locked': 0})
+        deadline = time.perf_counter() + seconds
+        workers = [
+            threading.Thread(target=_worker,
+                             args=(app, deadline, write_ratio, random.Random(i), results))
+            for i in range(threads)
+        ]
+        started = time.perf_counter()
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        wall = time.perf_counter() - started
+
+    report = {'tuned': tuned, 'threads': threads, 'seconds': wall, 'endpoints': {}}
+    total = 0
+    for name, data in sorted(results.items()):
+        stats = summarize(data['latencies'])
+        stats.update(errors=data['errors'], locked=data['locked'])
+        report['endpoints'][name] = stats
+        total += stats['count']
+    report['requests_per_second'] = total / wall if wall else 0.0
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--write-ratio', type=float, default=0.3)
+    parser.add_argument('--json', action='store_true', help='Print raw JSON results')
+    args = parser.parse_args()
+
+    reports = [run(args.threads, args.seconds, args.write_ratio, tuned)
+               for tuned in (False, True)]
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return
+
+    for report in reports:
+        label = 'tuned' if report['tuned'] else 'default'
+        print(f"\n[{label}] {report['requests_per_second']:.1f} req/s "
+              f"({report['threads']} threads, {report['seconds']:.1f}s)")
+        for name, s in report['endpoints'].items():
+            print(f"  {name:<12} n={s['count']:<6} p50={s['p50_ms']:7.2f}ms "
+                  f"p95={s['p95_ms']:7.2f}ms p99={s['p99_ms']:7.2f}ms "
+                  f"errors={s['errors']} locked={s['locked']}")
+
+
+if __name__ == '__main__':
+    main()
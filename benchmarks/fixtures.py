@@ -0,0 +1,196 @@
+"""
+Synthetic, seeded fixtures for HueVault benchmarks
+
+Every generator takes a seed, so the same arguments always produce the same
+bytes and runs are comparable across machines and commits.
+"""
+
+import io
+import json
+import math
+import os
+import random
+from typing import List
+
+from PIL import Image, ImageDraw
+
+# Named SVG complexities: number of drawn elements
+SVG_COMPLEXITY = {
+    'simple': 10,
+    'moderate': 200,
+    'complex': 2000
+}
+
+
+def make_palette(size: int, seed: int = 0) -> List[str]:
+    """A palette of ``size`` random uppercase hex colors"""
+    rng = random.Random(seed)
+    return [f'#{rng.randrange(0x1000000):06X}' for _ in range(size)]
+
+
+def make_svg(elements: int, size: int = 512, seed: int = 0) -> bytes:
+    """
+    An SVG document with a mix of rects, circles, paths and gradients
+
+    Args:
+        elements: Number of shapes to draw (see SVG_COMPLEXITY)
+        size: Width and height in user units
+        seed: Random seed
+
+    Returns:
+        The SVG as UTF-8 bytes
+    """
+    rng = random.Random(seed)
+    colors = make_palette(16, seed)
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{size}" '
+        f'viewBox="0 0 {size} {size}">',
+        '<defs>'
+    ]
+    for i in range(4):
+        parts.append(
+            f'<linearGradient id="g{i}" x1="0" y1="0" x2="1" y2="1">'
+            f'<stop offset="0" stop-color="{rng.choice(colors)}"/>'
+            f'<stop offset="1" stop-color="{rng.choice(colors)}"/></linearGradient>'
+        )
+    parts.append('</defs>')
+    parts.append(f'<rect width="{size}" height="{size}" fill="#FFFFFF"/>')
+
+    for i in range(elements):
+        fill = f'url(#g{rng.randrange(4)})' if rng.random() < 0.2 else rng.choice(colors)
+        kind = i % 3
+        if kind == 0:
+            w, h = rng.uniform(4, size / 4), rng.uniform(4, size / 4)
+            parts.append(
+                f'<rect x="{rng.uniform(0, size - w):.1f}" y="{rng.uniform(0, size - h):.1f}" '
+                f'width="{w:.1f}" height="{h:.1f}" rx="{rng.uniform(0, 8):.1f}" fill="{fill}"/>'
+            )
+        elif kind == 1:
+            parts.append(
+                f'<circle cx="{rng.uniform(0, size):.1f}" cy="{rng.uniform(0, size):.1f}" '
+                f'r="{rng.uniform(2, size / 10):.1f}" fill="{fill}" opacity="{rng.uniform(0.3, 1):.2f}"/>'
+            )
+        else:
+            points = ' '.join(
+                f'{rng.uniform(0, size):.1f},{rng.uniform(0, size):.1f}' for _ in range(6)
+            )
+            parts.append(
+                f'<path d="M {points} Z" fill="{fill}" stroke="{rng.choice(colors)}" '
+                f'stroke-width="{rng.uniform(0.5, 3):.1f}"/>'
+            )
+    parts.append('</svg>')
+    return '\n'.join(parts).encode('utf-8')
+
+
+def make_image(megapixels: float, background: str = '#FFFFFF', seed: int = 0,
+               image_format: str = 'PNG') -> bytes:
+    """
+    An RGB image of roughly ``megapixels`` with shapes on a solid background
+
+    Args:
+        megapixels: Target pixel count in millions (4:3 aspect ratio)
+        background: Background color, as removed by remove_background_color
+        seed: Random seed
+        image_format: Pillow format name
+
+    Returns:
+        The encoded image bytes
+    """
+    rng = random.Random(seed)
+    width = int(math.sqrt(megapixels * 1_000_000 * 4 / 3))
+    height = int(width * 3 / 4)
+    img = Image.new('RGB', (width, height), background)
+    draw = ImageDraw.Draw(img)
+    colors = make_palette(8, seed)
+    for _ in range(40):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1 = min(width, x0 + rng.randrange(width // 8 + 1))
+        y1 = min(height, y0 + rng.randrange(height // 8 + 1))
+        if rng.random() < 0.5:
+            draw.rectangle((x0, y0, x1, y1), fill=rng.choice(colors))
+        else:
+            draw.ellipse((x0, y0, x1, y1), fill=rng.choice(colors))
+    buffer = io.BytesIO()
+    img.save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def make_photo(megapixels: float, seed: int = 0) -> 'Image.Image':
+    """
+    A photo-like RGB image (smooth gradients plus sensor-like noise)
+
+    Flat-shaded images from make_image compress extremely well; this is the
+    hard case for lossless encoders.
+    """
+    width = int(math.sqrt(megapixels * 1_000_000 * 4 / 3))
+    height = int(width * 3 / 4)
+    rng = random.Random(seed)
+    gradient = Image.linear_gradient('L').resize((width, height))
+    noise = Image.effect_noise((width, height), 24)
+    return Image.merge('RGB', (
+        gradient,
+        Image.blend(gradient.rotate(90), noise, 0.3),
+        noise.point(lambda v: (v + rng.randrange(64)) % 256)
+    ))
+
+
+def write_fixture(folder: str, name: str, content: bytes) -> str:
+    """Write fixture bytes to ``folder/name`` and return the path"""
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, name)
+    with open(path, 'wb') as f:
+        f.write(content)
+    return path
+
+
+def seed_archive(app, username: str, projects: int, palette_size: int = 5,
+                 seed: int = 0, batch: int = 500) -> None:
+    """
+    Create an archive with ``projects`` projects directly through the models
+
+    Going through the ORM instead of the HTTP endpoints keeps seeding
+    thousands of projects fast; no image files are written.
+    """
+    from models import db, Archive, Project
+
+    rng = random.Random(seed)
+    with app.app_context():
+        archive = Archive(username=username, display_name=username.title())
+        db.session.add(archive)
+        db.session.flush()
+        for i in range(projects):
+            project = Project(archive_id=archive.id, title=f'Project {i}')
+            project.set_palette(make_palette(palette_size, rng.randrange(1 << 30)))
+            db.session.add(project)
+            if (i + 1) % batch == 0:
+                db.session.commit()
+        db.session.commit()
+
+
+def seed_projects(app, count: int, palettes: int = 3, palette_size: int = 5, seed: int = 0) -> List[str]:
+    """
+    Save ``count`` public project pages through the project store
+
+    Returns:
+        The saved project ids
+    """
+    from utils.project_store import save_project
+
+    rng = random.Random(seed)
+    ids = []
+    with app.app_context():
+        for i in range(count):
+            data = {
+                'title': f'Bench Project {i}',
+                'description': 'Synthetic benchmark project',
+                'palettes': [make_palette(palette_size, rng.randrange(1 << 30))
+                             for _ in range(palettes)],
+                'logos': [], 'favicons': [], 'graphics': []
+            }
+            ids.append(save_project(f'bench-project-{i}', data, on_conflict='overwrite'))
+    return ids
+
+
+def palette_request(size: int, seed: int = 0) -> str:
+    """JSON form field for a palette, as posted by the archive editor"""
+    return json.dumps(make_palette(size, seed))
@@ -0,0 +1,386 @@
+"""
+Load generator for the HueVault app
+
+Drives a weighted mix of requests (palette clicks, SVG converts, background
+removals, archive and project browsing) either against the app in-process
+through the Flask test client, or over HTTP against a running server such
+as gunicorn with gunicorn.conf.py, and reports throughput, latency
+percentiles and error rates per endpoint.
+
+Two load models are available:
+
+- closed loop (``--users N``): N virtual users each send a request, wait
+  for the answer, optionally think, and repeat;
+- open loop (``--rate R``): requests arrive at R per second whatever the
+  server does. Latency is measured from each request's scheduled start, so
+  time spent queued behind slow requests (head-of-line blocking) shows up
+  in the percentiles instead of silently lowering the request rate.
+
+Usage:
+    python -m benchmarks.load_test --scenario mixed --users 8 --seconds 30
+    PORT=8000 gunicorn wsgi:app &
+    python -m benchmarks.load_test --url http://127.0.0.1:8000 --rate 20 --seconds 60
+"""
+
+import argparse
+import contextlib
+import http.client
+import io
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit
+
+from benchmarks import fixtures
+from benchmarks.common import temporary_app, summarize
+
+ARCHIVES = 4
+
+
+class Request(NamedTuple):
+    """One request to send; ``files`` maps field name to (filename, bytes)"""
+    name: str
+    method: str
+    path: str
+    json: Optional[dict] = None
+    form: Optional[dict] = None
+    files: Optional[Dict[str, Tuple[str, bytes]]] = None
+
+
+class Payloads:
+    """Request bodies generated once per run"""
+
+    def __init__(self, image_megapixels: float, svg_complexity: str, project_ids: List[str]):
+        self.svg = fixtures.make_svg(fixtures.SVG_COMPLEXITY[svg_complexity], seed=3)
+        self.image = fixtures.make_image(image_megapixels, seed=3)
+        self.project_ids = project_ids or ['missing']
+
+
+def _palette_click(rng, payloads):
+    size = rng.choice((5, 5, 5, 8))
+    kind = rng.random()
+    if kind < 0.6:
+        return Request('palette.generate', 'POST', '/palette/generate',
+                       json={'num_colors': size})
+    palette = fixtures.make_palette(size, rng.randrange(1 << 20))
+    if kind < 0.9:
+        return Request('palette.regenerate', 'POST', '/palette/regenerate',
+                       json={'palette': palette, 'locked_indices': [0, 2]})
+    return Request('palette.expand', 'POST', '/palette/expand',
+                   json={'palette': palette, 'new_size': size + 2})
+
+
+def _simulate(rng, payloads):
+    return Request('accessibility.simulate', 'POST', '/accessibility/simulate', json={
+        'palette': fixtures.make_palette(5, rng.randrange(1 << 20)),
+        'deficiency_type': rng.choice(('protanopia', 'deuteranopia', 'tritanopia'))
+    })
+
+
+def _svg_convert(rng, payloads):
+    return Request('svg.convert', 'POST', '/svg/convert',
+                   form={'format': rng.choice(('png', 'png', 'jpeg', 'tiff'))},
+                   files={'file': ('load.svg', payloads.svg)})
+
+
+def _background_remove(rng, payloads):
+    return Request('background.remove', 'POST', '/background/remove',
+                   form={'background_color': '#FFFFFF', 'tolerance': '10'},
+                   files={'file': ('load.png', payloads.image)})
+
+
+def _browse_archive(rng, payloads):
+    kind = rng.random()
+    username = f'load{rng.randrange(ARCHIVES)}'
+    if kind < 0.6:
+        return Request('archives.view', 'GET', f'/archives/{username}/view')
+    if kind < 0.8:
+        return Request('archives.list', 'GET', '/archives/')
+    return Request('archives.search', 'GET', '/archives/search/colors?color=%230F62FE&radius=15')
+
+
+def _browse_projects(rng, payloads):
+    if rng.random() < 0.5:
+        return Request('projects.list', 'GET', '/projects/')
+    return Request('projects.view', 'GET', f'/projects/{rng.choice(payloads.project_ids)}')
+
+
+# Scenario name -> [(weight, request factory)]
+SCENARIOS: Dict[str, List[Tuple[float, Callable]]] = {
+    'palette': [(0.85, _palette_click), (0.15, _simulate)],
+    'svg': [(1.0, _svg_convert)],
+    'background': [(1.0, _background_remove)],
+    'browse': [(0.7, _browse_archive), (0.3, _browse_projects)],
+    'mixed': [
+        (0.45, _palette_click),
+        (0.10, _simulate),
+        (0.25, _browse_archive),
+        (0.10, _browse_projects),
+        (0.06, _svg_convert),
+        (0.04, _background_remove)
+    ]
+}
+
+
+def _pick(rng, scenario, payloads) -> Request:
+    weights = [w for w, _ in scenario]
+    factory = rng.choices([f for _, f in scenario], weights=weights)[0]
+    return factory(rng, payloads)
+
+
+class InProcessTarget:
+    """Sends requests through Flask test clients, one per thread"""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def send(self, req: Request) -> int:
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        kwargs = {}
+        if req.json is not None:
+            kwargs['json'] = req.json
+        if req.form is not None or req.files:
+            data = dict(req.form or {})
+            for field, (filename, content) in (req.files or {}).items():
+                data[field] = (io.BytesIO(content), filename)
+            kwargs['data'] = data
+        response = client.open(req.path, method=req.method, **kwargs)
+        response.close()
+        return response.status_code
+
+
+def _multipart(form: dict, files: dict) -> Tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for name, value in (form or {}).items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'
+                   f'{value}\r\n'.encode('utf-8'))
+    for name, (filename, content) in (files or {}).items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; '
+                   f'filename="{filename}"\r\nContent-Type: application/octet-stream\r\n\r\n'
+                   .encode('utf-8'))
+        body.write(content)
+        body.write(b'\r\n')
+    body.write(f'--{boundary}--\r\n'.encode('utf-8'))
+    return body.getvalue(), f'multipart/form-data; boundary={boundary}'
+
+
+class HttpTarget:
+    """Sends requests over keep-alive HTTP connections, one per thread"""
+
+    def __init__(self, base_url: str, timeout: float = 120):
+        parts = urlsplit(base_url)
+        self.https = parts.scheme == 'https'
+        self.host = parts.hostname
+        self.port = parts.port
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            conn = self._local.conn = cls(self.host, self.port, timeout=self.timeout)
+        return conn
+
+    def send(self, req: Request) -> int:
+        headers = {}
+        body = None
+        if req.json is not None:
+            body = json.dumps(req.json).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        elif req.form is not None or req.files:
+            body, headers['Content-Type'] = _multipart(req.form, req.files)
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request(req.method, self.prefix + req.path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                return response.status
+            except (http.client.HTTPException, ConnectionError):
+                # Server closed the keep-alive connection; reconnect once
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+
+
+class Recorder:
+    """Thread-safe per-endpoint latency and error collection"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, name: str, seconds: float, status: Optional[int]) -> None:
+        with self._lock:
+            self.latencies[name].append(seconds)
+            self.statuses[name][status or 'exception'] += 1
+            if status is None or status >= 400:
+                self.errors[name] += 1
+
+
+def _execute(target, req: Request, recorder: Recorder, started: float) -> None:
+    try:
+        status = target.send(req)
+    except Exception:
+        status = None
+    recorder.record(req.name, time.perf_counter() - started, status)
+
+
+def run_closed(target, scenario, payloads, users: int, seconds: float,
+               think: float, seed: int, recorder: Recorder) -> None:
+    deadline = time.perf_counter() + seconds
+
+    def user(index):
+        rng = random.Random(seed + index)
+        while time.perf_counter() < deadline:
+            _execute(target, _pick(rng, scenario, payloads), recorder, time.perf_counter())
+            if think:
+                time.sleep(rng.expovariate(1.0 / think))
+
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def run_open(target, scenario, payloads, rate: float, seconds: float,
+             concurrency: int, seed: int, recorder: Recorder) -> None:
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    # Poisson arrivals; each request is timed from when it should have started
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        scheduled = start
+        while scheduled < start + seconds:
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(_execute, target, _pick(rng, scenario, payloads), recorder, scheduled)
+            scheduled += rng.expovariate(rate)
+
+
+def seed_in_process(app, projects_per_archive: int) -> List[str]:
+    for i in range(ARCHIVES):
+        fixtures.seed_archive(app, f'load{i}', projects_per_archive, seed=i)
+    return fixtures.seed_projects(app, 50)
+
+
+def seed_over_http(target: HttpTarget, projects_per_archive: int) -> List[str]:
+    ids = []
+    for i in range(ARCHIVES):
+        target.send(Request('seed', 'GET', f'/archives/load{i}/edit'))
+        for j in range(projects_per_archive):
+            target.send(Request('seed', 'POST', f'/archives/load{i}/project', form={
+                'title': f'Load {j}', 'palette': fixtures.palette_request(5, j)
+            }))
+    for j in range(50):
+        target.send(Request('seed', 'POST', '/projects/create', json={
+            'title': f'load-project-{j}', 'palettes': [fixtures.make_palette(5, j)],
+            'on_conflict': 'overwrite'
+        }))
+        ids.append(f'load-project-{j}')
+    return ids
+
+
+def report(recorder: Recorder, wall: float, settings: dict) -> dict:
+    endpoints = {}
+    total = errors = 0
+    for name in sorted(recorder.latencies):
+        stats = summarize(recorder.latencies[name])
+        count = stats['count']
+        stats.update(
+            errors=recorder.errors[name],
+            error_rate=recorder.errors[name] / count if count else 0.0,
+            throughput=count / wall if wall else 0.0,
+            statuses={str(k): v for k, v in recorder.statuses[name].items()}
+        )
+        endpoints[name] = stats
+        total += count
+        errors += recorder.errors[name]
+    everything = summarize([x for values in recorder.latencies.values() for x in values])
+    return dict(settings, seconds=wall, requests=total,
+                throughput=total / wall if wall else 0.0,
+                error_rate=errors / total if total else 0.0,
+                p50_ms=everything['p50_ms'], p95_ms=everything['p95_ms'],
+                p99_ms=everything['p99_ms'], endpoints=endpoints)
+
+
+def _print(result: dict) -> None:
+    mode = f"rate={result['rate']}/s" if result.get('rate') else f"users={result['users']}"
+    print(f"\n{result['scenario']} ({result['target']}, {mode}, {result['seconds']:.1f}s): "
+          f"{result['throughput']:.1f} req/s, errors {result['error_rate']:.1%}, "
+          f"p50={result['p50_ms']:.1f}ms p95={result['p95_ms']:.1f}ms p99={result['p99_ms']:.1f}ms")
+    print(f"  {'endpoint':<24}{'n':>7}{'req/s':>9}{'p50':>10}{'p95':>10}{'p99':>10}{'err%':>8}")
+    for name, s in result['endpoints'].items():
+        print(f"  {name:<24}{s['count']:>7}{s['throughput']:>9.1f}{s['p50_ms']:>10.1f}"
+              f"{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}{s['error_rate'] * 100:>8.1f}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='mixed')
+    parser.add_argument('--url', help='Base URL of a running server (default: in-process)')
+    parser.add_argument('--seconds', type=float, default=20.0)
+    parser.add_argument('--users', type=int, default=4, help='Closed-loop virtual users')
+    parser.add_argument('--think', type=float, default=0.0, help='Mean think time per user (s)')
+    parser.add_argument('--rate', type=float, help='Open-loop arrival rate (req/s); overrides --users')
+    parser.add_argument('--concurrency', type=int, default=64,
+                        help='Maximum requests in flight in open-loop mode')
+    parser.add_argument('--image-mp', type=float, default=0.25,
+                        help='Megapixels of the background removal upload')
+    parser.add_argument('--svg', choices=sorted(fixtures.SVG_COMPLEXITY), default='moderate')
+    parser.add_argument('--projects', type=int, default=50, help='Projects seeded per archive')
+    parser.add_argument('--no-seed', action='store_true', help='Do not seed archives and projects')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='Print the raw JSON report')
+    args = parser.parse_args(argv)
+
+    scenario = SCENARIOS[args.scenario]
+    settings = {'scenario': args.scenario, 'target': args.url or 'in-process',
+                'users': None if args.rate else args.users, 'rate': args.rate}
+    recorder = Recorder()
+
+    with contextlib.ExitStack() as stack:
+        if args.url:
+            target = HttpTarget(args.url)
+            project_ids = [] if args.no_seed else seed_over_http(target, args.projects)
+        else:
+            app = stack.enter_context(temporary_app())
+            target = InProcessTarget(app)
+            project_ids = [] if args.no_seed else seed_in_process(app, args.projects)
+        payloads = Payloads(args.image_mp, args.svg, project_ids)
+
+        started = time.perf_counter()
+        if args.rate:
+            run_open(target, scenario, payloads, args.rate, args.seconds,
+                     args.concurrency, args.seed, recorder)
+        else:
+            run_closed(target, scenario, payloads, args.users, args.seconds,
+                       args.think, args.seed, recorder)
+        wall = time.perf_counter() - started
+
+    result = report(recorder, wall, settings)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        _print(result)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+Import-time benchmark for worker startup
+
+Measures, in fresh interpreters, how long ``import wsgi`` (module imports
+plus create_app) takes, lists the slowest imports from ``-X importtime``
+and checks that heavy image libraries are not loaded at startup.
+
+Usage:
+    python -m benchmarks.startup --runs 10
+    python -m benchmarks.startup --max-ms 800   # exit 1 if slower or heavy imports leak in
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import List, Optional
+
+# Modules that must only be imported on first use
+LAZY_MODULES = ('cairosvg', 'cairocffi', 'PIL.Image', 'numpy')
+
+_PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import wsgi
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "lazy_loaded": [m for m in %r if m in sys.modules]}))
+''' % (LAZY_MODULES,)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _run(args: List[str]) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='0')
+    return subprocess.run([sys.executable] + args, cwd=ROOT, env=env,
+                          capture_output=True, text=True, check=True)
+
+
+def measure(runs: int) -> dict:
+    """Time ``import wsgi`` in ``runs`` fresh interpreters"""
+    samples, lazy_loaded = [], set()
+    _run(['-c', _PROBE])  # warm the bytecode cache
+    for _ in range(runs):
+        result = json.loads(_run(['-c', _PROBE]).stdout.strip().splitlines()[-1])
+        samples.append(result['seconds'])
+        lazy_loaded.update(result['lazy_loaded'])
+    return {
+        'runs': runs,
+        'min_ms': min(samples) * 1000,
+        'median_ms': statistics.median(samples) * 1000,
+        'max_ms': max(samples) * 1000,
+        'lazy_modules_loaded': sorted(lazy_loaded)
+    }
+
+
+def slowest_imports(top: int) -> List[dict]:
+    """Top-level imports by cumulative time, from ``-X importtime``"""
+    stderr = _run(['-X', 'importtime', '-c', 'import wsgi']).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        rows.append({'module': name.strip(), 'self_ms': int(self_us) / 1000,
+                     'cumulative_ms': int(cumulative_us) / 1000,
+                     'depth': max(0, len(name) - len(name.lstrip()) - 1) // 2})
+    return sorted(rows, key=lambda r: -r['cumulative_ms'])[:top]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='Slowest imports to list')
+    parser.add_argument('--max-ms', type=float, help='Fail if the median exceeds this')
+    parser.add_argument('--json', action='store_true', help='Print the raw JSON report')
+    args = parser.parse_args(argv)
+
+    report = measure(args.runs)
+    report['slowest_imports'] = slowest_imports(args.top)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"import wsgi: median {report['median_ms']:.1f} ms "
+              f"(min {report['min_ms']:.1f}, max {report['max_ms']:.1f}, {report['runs']} runs)")
+        for row in report['slowest_imports']:
+            print(f"  {row['cumulative_ms']:9.1f} ms  {'  ' * row['depth']}{row['module']}")
+        if report['lazy_modules_loaded']:
+            print(f"Loaded at startup but should be lazy: {', '.join(report['lazy_modules_loaded'])}")
+
+    failed = bool(report['lazy_modules_loaded'])
+    if args.max_ms is not None and report['median_ms'] > args.max_ms:
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,425 @@
+"""
+Benchmark suite for HueVault's hot paths
+
+Times palette generation, color-blindness simulation, SVG rasterization,
+background removal, palette extraction from images, raster encoding
+(time and output size per encode profile) and the archive/project endpoints (through the Flask
+test client) on seeded synthetic fixtures, and writes the results as JSON.
+A saved result file can be used as a baseline: cases whose median time
+grew by more than the threshold are reported as regressions and make the
+command exit with status 1.
+
+Usage:
+    python -m benchmarks.suite --profile quick --output bench.json
+    python -m benchmarks.suite --compare bench.json --threshold 0.15
+    python -m benchmarks.suite --only palette,archive
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional
+
+from benchmarks import fixtures
+from benchmarks.common import temporary_app
+
+# Fixture sizes per profile
+PROFILES = {
+    'quick': {
+        'palette_sizes': (2, 8, 32),
+        'megapixels': (1,),
+        'svg_complexity': ('simple', 'moderate'),
+        'archive_projects': (100,),
+        'project_pages': 50
+    },
+    'standard': {
+        'palette_sizes': (2, 16, 64),
+        'megapixels': (1, 10),
+        'svg_complexity': ('simple', 'moderate', 'complex'),
+        'archive_projects': (100, 2000),
+        'project_pages': 500
+    },
+    'full': {
+        'palette_sizes': (2, 16, 64, 256),
+        'megapixels': (1, 10, 100),
+        'svg_complexity': ('simple', 'moderate', 'complex'),
+        'archive_projects': (100, 2000, 5000),
+        'project_pages': 2000
+    }
+}
+
+
+class Case(NamedTuple):
+    """One timed operation"""
+    name: str
+    params: dict
+    run: Callable[[], object]
+    heavy: bool = False  # Slow enough that warmup and repeats are skipped
+
+
+class Skip(Exception):
+    """Raised by a group when its dependencies are unavailable"""
+
+
+def measure(run: Callable[[], object], heavy: bool = False, min_runs: int = 5,
+            max_runs: int = 200, min_time: float = 0.5) -> dict:
+    """
+    Time ``run`` repeatedly and summarize in milliseconds
+
+    Light cases get one untimed warmup call and repeat until both
+    ``min_runs`` and ``min_time`` are reached; heavy cases run once.
+    """
+    if heavy:
+        min_runs, max_runs, min_time = 1, 1, 0.0
+    else:
+        run()
+    times = []
+    started = time.perf_counter()
+    while len(times) < max_runs and (len(times) < min_runs or time.perf_counter() - started < min_time):
+        t0 = time.perf_counter()
+        output = run()
+        times.append(time.perf_counter() - t0)
+    stats = {
+        'runs': len(times),
+        'min_ms': min(times) * 1000,
+        'median_ms': statistics.median(times) * 1000,
+        'mean_ms': statistics.fmean(times) * 1000,
+        'stdev_ms': (statistics.stdev(times) * 1000) if len(times) > 1 else 0.0
+    }
+    if isinstance(output, (bytes, bytearray)):
+        # Encoders: size matters as much as time
+        stats['output_bytes'] = len(output)
+    return stats
+
+
+def palette_cases(profile: dict, workdir: str) -> Iterator[Case]:
+    from utils.color_utils import generate_palette, regenerate_unlocked_colors, expand_palette
+
+    for size in profile['palette_sizes']:
+        palette = fixtures.make_palette(size, seed=size)
+        locked = list(range(0, size, 2))
+        yield Case('generate_palette', {'colors': size},
+                   lambda size=size: generate_palette(size, seed=7))
+        yield Case('regenerate_unlocked_colors', {'colors': size, 'locked': len(locked)},
+                   lambda palette=palette, locked=locked: regenerate_unlocked_colors(palette, locked, seed=7))
+        yield Case('expand_palette', {'colors': size, 'new_size': size * 2},
+                   lambda palette=palette, size=size: expand_palette(palette, size * 2, seed=7))
+
+
+def simulation_cases(profile: dict, workdir: str) -> Iterator[Case]:
+    from utils.colorblind_simulator import simulate_colorblindness
+
+    for size in profile['palette_sizes']:
+        palette = fixtures.make_palette(size, seed=size)
+        for deficiency in ('protanopia', 'deuteranopia', 'tritanopia'):
+            yield Case('simulate_colorblindness', {'colors': size, 'type': deficiency},
+                       lambda palette=palette, deficiency=deficiency:
+                       [simulate_colorblindness(c, deficiency) for c in palette])
+
+
+def svg_cases(profile: dict, workdir: str) -> Iterator[Case]:
+    from config import Config
+    from utils.image_utils import convert_svg_to_raster, convert_svg_to_tiled_tiff, plan_svg_render
+
+    svg_data = fixtures.make_svg(fixtures.SVG_COMPLEXITY['complex'], seed=1)
+    yield Case('plan_svg_render', {'complexity': 'complex'},
+               lambda: plan_svg_render(svg_data, 1200))
+    try:
+        import cairosvg  # noqa: F401 (imported lazily by image_utils)
+    except (ImportError, OSError) as e:  # cairosvg needs the native cairo library
+        raise Skip(f'cairosvg unavailable: {e}')
+    from utils.cache import get_cache
+    from utils.svg_cache import parsed_svg_tree
+
+    trees = get_cache('svg_tree')
+    for complexity in profile['svg_complexity']:
+        svg_data = fixtures.make_svg(fixtures.SVG_COMPLEXITY[complexity], seed=1)
+        path = fixtures.write_fixture(workdir, f'{complexity}.svg', svg_data)
+        # Parse-once cache: a cold parse against the per-render copy of a cached tree
+        yield Case('parsed_svg_tree', {'complexity': complexity, 'tree_cache': 'cold'},
+                   lambda svg_data=svg_data: (trees.clear(), parsed_svg_tree(svg_data)))
+        yield Case('parsed_svg_tree', {'complexity': complexity, 'tree_cache': 'warm'},
+                   lambda svg_data=svg_data: parsed_svg_tree(svg_data))
+        yield Case('convert_svg_to_raster',
+                   {'complexity': complexity, 'format': 'png', 'dpi': 300, 'tree_cache': 'cold'},
+                   lambda path=path: (trees.clear(), convert_svg_to_raster(path, dpi=300))[1],
+                   heavy=complexity == 'complex')
+        # Repeated renders below reuse the cached tree
+        for output_format, dpi in (('png', 300), ('png', 1200), ('jpeg', 300), ('tiff', 300)):
+            yield Case('convert_svg_to_raster',
+                       {'complexity': complexity, 'format': output_format, 'dpi': dpi},
+                       lambda path=path, output_format=output_format, dpi=dpi:
+                       convert_svg_to_raster(path, output_format=output_format, dpi=dpi),
+                       heavy=dpi >= 1200 or complexity == 'complex')
+        yield Case('convert_svg_to_raster',
+                   {'complexity': complexity, 'format': 'png', 'width': 2048},
+                   lambda path=path: convert_svg_to_raster(path, output_format='png', width=2048),
+                   heavy=complexity == 'complex')
+        # Tiled TIFF path (normally only taken above SVG_MAX_PIXELS), written to disk
+        tiled = plan_svg_render(svg_data, 300, width=4096)._replace(tiled=True)
+        output_path = os.path.join(workdir, f'{complexity}-tiled.tiff')
+
+        def render_tiled(svg_data=svg_data, plan=tiled, output_path=output_path):
+            with open(output_path, 'wb') as f:
+                convert_svg_to_tiled_tiff(svg_data, f, plan, 300, 'fast', 'deflate')
+        yield Case('convert_svg_to_tiled_tiff',
+                   {'complexity': complexity, 'width': 4096, 'tile_size': Config.SVG_TILE_SIZE},
+                   render_tiled, heavy=True)
+
+
+def background_cases(profile: dict, workdir: str) -> Iterator[Case]:
+    from utils.image_utils import remove_background_color
+
+    for megapixels in profile['megapixels']:
+        path = fixtures.write_fixture(workdir, f'bg-{megapixels}mp.png',
+                                      fixtures.make_image(megapixels, seed=megapixels))
+        yield Case('remove_background_color', {'megapixels': megapixels, 'tolerance': 10},
+                   lambda path=path: remove_background_color(path, '#FFFFFF', 10),
+                   heavy=megapixels >= 10)
+        yield Case('remove_background_color', {'megapixels': megapixels, 'tolerance': 'auto'},
+                   lambda path=path: remove_background_color(path, 'auto', None),
+                   heavy=megapixels >= 10)
+
+
+def encode_cases(profile: dict, workdir: str) -> Iterator[Case]:
+    import io
+    from PIL import Image
+    from config import Config
+    from utils.image_utils import encode_image
+
+    def encode(img, output_format, encode_profile, compression=None):
+        buffer = io.BytesIO()
+        encode_image(img, buffer, output_format, (1200, 1200), encode_profile, compression)
+        return buffer.getvalue()
+
+    for megapixels in profile['megapixels']:
+        # A flat-shaded graphic with transparency (like an SVG render or a
+        # background-removed logo) and a noisy photo
+        graphic = Image.open(io.BytesIO(fixtures.make_image(megapixels, seed=megapixels))).convert('RGBA')
+        assets = {'graphic': graphic, 'photo': fixtures.make_photo(megapixels, seed=megapixels)}
+        for asset, img in assets.items():
+            img.load()
+            for encode_profile in Config.ENCODE_PROFILES:
+                for output_format in ('png', 'jpeg'):
+                    yield Case('encode_image',
+                               {'asset': asset, 'megapixels': megapixels,
+                                'format': output_format, 'profile': encode_profile},
+                               lambda img=img, f=output_format, p=encode_profile: encode(img, f, p),
+                               heavy=megapixels >= 10)
+            for compression in Config.TIFF_COMPRESSIONS:
+                yield Case('encode_image',
+                           {'asset': asset, 'megapixels': megapixels,
+                            'format': 'tiff', 'compression': compression},
+                           lambda img=img, c=compression: encode(img, 'tiff', None, c),
+                           heavy=megapixels >= 10)
+
+
+def extraction_cases(profile: dict, workdir: str) -> Iterator[Case]:
+    from config import Config
+    from utils.palette_extraction import extract_palette
+
+    for megapixels in profile['megapixels'] + (50,):
+        for image_format in ('JPEG', 'PNG'):
+            if image_format == 'PNG' and megapixels * 1_000_000 > Config.PALETTE_EXTRACT_MAX_PIXELS:
+                continue  # Refused: PNGs are decoded in full
+            path = fixtures.write_fixture(
+                workdir, f'extract-{megapixels}mp.{image_format.lower()}',
+                fixtures.make_image(megapixels, background='#336699', seed=megapixels,
+                                    image_format=image_format)
+            )
+            yield Case('extract_palette', {'megapixels': megapixels, 'format': image_format.lower()},
+                       lambda path=path: extract_palette(path, 8, seed=7),
+                       heavy=megapixels >= 10)
+
+
+def endpoint_cases(profile: dict, workdir: str) -> Iterator[Case]:
+    """Archive and project endpoints on seeded databases"""
+    from utils.cache import get_cache
+
+    for projects in profile['archive_projects']:
+        with temporary_app() as app:
+            client = app.test_client()
+            username = f'bench{projects}'
+            fixtures.seed_archive(app, username, projects)
+            pages = get_cache('pages')
+
+            def view_uncached(client=client, username=username, pages=pages):
+                pages.clear()
+                return client.get(f'/archives/{username}/view')
+
+            cases = [
+                Case('archive_view', {'projects': projects, 'cache': 'cold'}, view_uncached),
+                Case('archive_view', {'projects': projects, 'cache': 'warm'},
+                     lambda: client.get(f'/archives/{username}/view')),
+                Case('archive_view', {'projects': projects, 'cache': 'etag'},
+                     lambda: client.get(f'/archives/{username}/view',
+                                        headers={'If-None-Match': etag})),
+                Case('archive_edit', {'projects': projects},
+                     lambda: client.get(f'/archives/{username}/edit')),
+                Case('archives_list', {'archives': 1},
+                     lambda: client.get('/archives/')),
+                Case('archive_color_search', {'projects': projects},
+                     lambda: client.get('/archives/search/colors?color=%230F62FE&radius=15')),
+                Case('archive_update', {'projects': projects},
+                     lambda: client.post(f'/archives/{username}/update',
+                                         json={'display_name': 'Bench'})),
+                Case('archive_add_project', {'projects': projects},
+                     lambda: client.post(f'/archives/{username}/project', data={
+                         'title': 'Bench', 'palette': fixtures.palette_request(5)
+                     }))
+            ]
+            etag = client.get(f'/archives/{username}/view').headers.get('ETag', '')
+            # Timed inside the app's lifetime, so yield while the context is open
+            yield from cases
+
+    with temporary_app() as app:
+        client = app.test_client()
+        ids = fixtures.seed_projects(app, profile['project_pages'])
+        count = len(ids)
+        yield Case('projects_list', {'projects': count}, lambda: client.get('/projects/'))
+        yield Case('projects_list', {'projects': count, 'page': 2},
+                   lambda: client.get('/projects/?page=2'))
+        yield Case('project_view', {'projects': count},
+                   lambda: client.get(f'/projects/{ids[0]}'))
+        yield Case('project_create', {'projects': count},
+                   lambda: client.post('/projects/create', json={
+                       'title': 'Bench Create', 'palettes': [fixtures.make_palette(5)],
+                       'on_conflict': 'overwrite'
+                   }))
+
+
+GROUPS: Dict[str, Callable[[dict, str], Iterator[Case]]] = {
+    'palette': palette_cases,
+    'simulation': simulation_cases,
+    'svg': svg_cases,
+    'background': background_cases,
+    'extraction': extraction_cases,
+    'encode': encode_cases,
+    'archive': endpoint_cases
+}
+
+
+def case_id(name: str, params: dict) -> str:
+    """Stable identifier used to match cases against a baseline"""
+    args = ','.join(f'{k}={params[k]}' for k in sorted(params))
+    return f'{name}[{args}]'
+
+
+def _environment() -> dict:
+    try:
+        import PIL
+        pillow = PIL.__version__
+    except ImportError:
+        pillow = None
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                  text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        revision = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'pillow': pillow,
+        'revision': revision,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+    }
+
+
+def run(profile_name: str, groups: List[str], log: Callable = None) -> dict:
+    """Run the selected groups and return the JSON-serializable report"""
+    profile = PROFILES[profile_name]
+    report = {'profile': profile_name, 'environment': _environment(), 'results': {}, 'skipped': {}}
+    with tempfile.TemporaryDirectory(prefix='huevault-fixtures-') as workdir:
+        for group in groups:
+            try:
+                for case in GROUPS[group](profile, workdir):
+                    key = case_id(case.name, case.params)
+                    stats = measure(case.run, heavy=case.heavy)
+                    report['results'][key] = dict(stats, group=group, name=case.name,
+                                                  params=case.params)
+                    if log:
+                        size = f"  {stats['output_bytes']:,} bytes" if 'output_bytes' in stats else ''
+                        log(f"{key:<70} {stats['median_ms']:10.3f} ms  (n={stats['runs']}){size}")
+            except Skip as e:
+                report['skipped'][group] = str(e)
+                if log:
+                    log(f'[{group}] skipped: {e}')
+    return report
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> List[dict]:
+    """
+    Compare median times against a baseline report
+
+    Returns:
+        One row per case present in both reports, with ``ratio`` (new/old)
+        and ``regression`` set when the slowdown exceeds ``threshold``
+    """
+    rows = []
+    for key, result in report['results'].items():
+        old = baseline.get('results', {}).get(key)
+        if not old or not old['median_ms']:
+            continue
+        ratio = result['median_ms'] / old['median_ms']
+        rows.append({
+            'case': key,
+            'baseline_ms': old['median_ms'],
+            'current_ms': result['median_ms'],
+            'ratio': ratio,
+            'regression': ratio > 1 + threshold
+        })
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='quick')
+    parser.add_argument('--only', help=f"Comma-separated groups ({', '.join(GROUPS)})")
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    parser.add_argument('--compare', metavar='BASELINE', help='Baseline JSON report to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Allowed slowdown before a case counts as a regression (default 0.10)')
+    args = parser.parse_args(argv)
+
+    groups = args.only.split(',') if args.only else list(GROUPS)
+    unknown = [g for g in groups if g not in GROUPS]
+    if unknown:
+        parser.error(f"Unknown groups: {', '.join(unknown)}")
+
+    report = run(args.profile, groups, log=lambda line: print(line, file=sys.stderr))
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        rows = compare(report, baseline, args.threshold)
+        report['comparison'] = {'baseline': args.compare, 'threshold': args.threshold, 'cases': rows}
+
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(payload + '\n')
+    else:
+        print(payload)
+
+    if args.compare:
+        regressions = [row for row in report['comparison']['cases'] if row['regression']]
+        for row in sorted(report['comparison']['cases'], key=lambda r: -r['ratio']):
+            flag = 'REGRESSION' if row['regression'] else ''
+            print(f"{row['case']:<70} {row['baseline_ms']:10.3f} -> {row['current_ms']:10.3f} ms "
+                  f"x{row['ratio']:.2f} {flag}", file=sys.stderr)
+        if regressions:
+            print(f'{len(regressions)} regression(s) over {args.threshold:.0%}', file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
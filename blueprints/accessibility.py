@@ -4,6 +4,8 @@ Color Accessibility & Color-Blindness Simulator blueprint
 
 from flask import Blueprint, render_template, request, jsonify
 from utils.colorblind_simulator import simulate_colorblindness
+from utils.cache import get_cache
+from utils.color_names import annotate_palette
 
 bp = Blueprint('accessibility', __name__)
 
@@ -28,15 +30,25 @@ def simulate():
                 'error': 'Invalid deficiency type'
             }), 400
         
+        cache = get_cache('simulation')
         simulated_palette = []
         for color in palette:
-            simulated_color = simulate_colorblindness(color, deficiency_type)
+            simulated_color = cache.get_or_set(
+                f'{deficiency_type}:{color}',
+                lambda: simulate_colorblindness(color, deficiency_type)
+            )
             simulated_palette.append(simulated_color)
         
-        return jsonify({
+        response = {
             'success': True,
             'palette': simulated_palette
-        })
+        }
+        if data.get('annotate', False):
+            # Names of the colors as chosen, and of what each is perceived as
+            response['annotations'] = annotate_palette(palette)
+            response['simulated_annotations'] = annotate_palette(simulated_palette)
+        
+        return jsonify(response)
     except Exception as e:
         return jsonify({
             'success': False,
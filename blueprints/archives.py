@@ -2,13 +2,19 @@
 User Archives blueprint
 """
 
-from flask import Blueprint, render_template, request, jsonify, send_from_directory, redirect, url_for
-from werkzeug.utils import secure_filename
+from flask import Blueprint, render_template, request, jsonify, send_from_directory, redirect, url_for, abort, current_app
+from sqlalchemy import insert, delete, update
+from sqlalchemy.orm import selectinload
+from werkzeug.exceptions import RequestEntityTooLarge
 from config import Config
-from models import db, Archive, Project, ProjectImage
+from models import db, Archive, Project, ProjectImage, PaletteColor
+from utils.color_utils import is_hex_color, hex_to_rgb, int_to_hex, rgb_to_lab, delta_e, lab_buckets_within
+from utils.upload_utils import streamed_uploads, stage_uploads, promote_uploads, discard_uploads
+from utils.file_reaper import schedule_removal, restore_from_trash, wake_reaper
+from utils.page_cache import cached_page
+from datetime import datetime
 import os
 import json
-import uuid
 
 bp = Blueprint('archives', __name__)
 
@@ -19,6 +25,43 @@ def allowed_file(filename):
            filename.rsplit('.', 1)[1].lower() in {'png', 'jpg', 'jpeg', 'gif', 'svg', 'webp'}
 
 
+def _project_dir(username, project_id):
+    """Directory holding a project's uploaded images"""
+    return os.path.join(Config.UPLOAD_FOLDER, 'archives', username, str(project_id))
+
+
+def _insert_project_images(username, project_id, staged):
+    """Move staged uploads into the project directory and bulk insert their rows"""
+    promote_uploads(staged, _project_dir(username, project_id))
+    if staged:
+        db.session.execute(insert(ProjectImage), [
+            {
+                'project_id': project_id,
+                'filename': upload.filename,
+                # Store relative path for serving
+                'filepath': f"archives/{username}/{project_id}/{upload.unique_filename}"
+            }
+            for upload in staged
+        ])
+
+
+def _touch_archive(archive_id):
+    """Bump an archive's version in the caller's transaction, so cached pages miss"""
+    db.session.execute(
+        update(Archive)
+        .where(Archive.id == archive_id)
+        .values(version=Archive.version + 1, updated_at=datetime.utcnow())
+    )
+
+
+def _archive_projects(archive):
+    """Serialize an archive's projects, loading their images in bulk"""
+    projects = Project.query.filter_by(archive_id=archive.id) \
+        .options(selectinload(Project.images)) \
+        .order_by(Project.id).all()
+    return [p.to_dict() for p in projects]
+
+
 @bp.route('/')
 def archives_list():
     """List all public archives"""
@@ -54,6 +97,58 @@ def go_to_archive():
     return redirect(url_for('archives.edit_archive', username=username))
 
 
+@bp.route('/search/colors')
+def search_colors():
+    """Find projects whose palettes use colors near a given hex color"""
+    color = request.args.get('color', '').strip()
+    if not is_hex_color(color):
+        return jsonify({'success': False, 'error': 'A hex color is required'}), 400
+    
+    try:
+        radius = float(request.args.get('radius', Config.PALETTE_SEARCH_RADIUS))
+        limit = int(request.args.get('limit', 20))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid radius or limit'}), 400
+    # Bound the number of grid cells looked up
+    radius = min(max(radius, 0.0), 50.0)
+    limit = min(max(limit, 1), 100)
+    
+    target = rgb_to_lab(*hex_to_rgb(color))
+    buckets = lab_buckets_within(target, radius, Config.PALETTE_SEARCH_CELL_SIZE)
+    rows = db.session.query(
+        PaletteColor.project_id, PaletteColor.rgb,
+        PaletteColor.lab_l, PaletteColor.lab_a, PaletteColor.lab_b,
+        Project.title, Archive.username, Archive.display_name
+    ).join(Project, PaletteColor.project_id == Project.id) \
+     .join(Archive, Project.archive_id == Archive.id) \
+     .filter(PaletteColor.bucket.in_(buckets)).all()
+    
+    # Keep each project's closest matching color
+    matches = {}
+    for project_id, rgb, lab_l, lab_a, lab_b, title, username, display_name in rows:
+        distance = delta_e(target, (lab_l, lab_a, lab_b))
+        if distance > radius:
+            continue
+        if project_id not in matches or distance < matches[project_id]['distance']:
+            matches[project_id] = {
+                'project_id': project_id,
+                'title': title,
+                'username': username,
+                'display_name': display_name,
+                'matched_color': int_to_hex(rgb),
+                'distance': round(distance, 2),
+                'url': url_for('archives.view_archive', username=username)
+            }
+    
+    results = sorted(matches.values(), key=lambda m: m['distance'])[:limit]
+    return jsonify({
+        'success': True,
+        'color': color,
+        'radius': radius,
+        'projects': results
+    })
+
+
 @bp.route('/<username>/view')
 def view_archive(username):
     """View archive (read-only)"""
@@ -65,9 +160,15 @@ def view_archive(username):
                              error='Archive not found',
                              message='The requested archive does not exist.'), 404
     
-    projects = [p.to_dict() for p in archive.projects]
-    
-    return render_template('archive_view.html', archive=archive, projects=projects, edit_mode=False)
+    # created_at tells apart an archive recreated under a reused id
+    created = int(archive.created_at.timestamp()) if archive.created_at else 0
+    return cached_page(
+        ('archive', archive.id, created, archive.version),
+        f'archive-{archive.id}-{created}-{archive.version}',
+        archive.updated_at or archive.created_at,
+        lambda: render_template('archive_view.html', archive=archive,
+                                projects=_archive_projects(archive), edit_mode=False)
+    )
 
 
 @bp.route('/<username>/edit')
@@ -82,7 +183,7 @@ def edit_archive(username):
         db.session.add(archive)
         db.session.commit()
     
-    projects = [p.to_dict() for p in archive.projects]
+    projects = _archive_projects(archive)
     
     return render_template('archive_edit.html', archive=archive, projects=projects, edit_mode=True)
 
@@ -100,6 +201,7 @@ def update_archive(username):
         
         if display_name:
             archive.display_name = display_name
+            _touch_archive(archive.id)
             db.session.commit()
         
         return jsonify({'success': True})
@@ -108,6 +210,7 @@ def update_archive(username):
 
 
 @bp.route('/<username>/project', methods=['POST'])
+@streamed_uploads
 def add_project(username):
     """Add a project to an archive"""
     try:
@@ -136,55 +239,46 @@ def add_project(username):
         img_radius = int(request.form.get('img_radius', 8))
         img_gap = int(request.form.get('img_gap', 16))
         
+        # Land uploaded images on disk before touching the database
+        staged = stage_uploads(request.files.getlist('images'), allowed_file)
+        
         # Create project
         project = Project(
             archive_id=archive.id,
             title=title,
-            palette=json.dumps(palette),
             img_width=img_width,
             img_height=img_height,
             img_fit=img_fit,
             img_radius=img_radius,
             img_gap=img_gap
         )
-        db.session.add(project)
-        db.session.flush()  # Get project ID
-        
-        # Handle image uploads
-        uploaded_files = request.files.getlist('images')
-        project_dir = os.path.join(Config.UPLOAD_FOLDER, 'archives', username, str(project.id))
-        os.makedirs(project_dir, exist_ok=True)
-        
-        for file in uploaded_files:
-            if file and file.filename and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                # Add UUID to avoid conflicts
-                unique_filename = f"{uuid.uuid4().hex[:8]}_{filename}"
-                filepath = os.path.join(project_dir, unique_filename)
-                file.save(filepath)
-                
-                # Store relative path for serving
-                relative_path = f"archives/{username}/{project.id}/{unique_filename}"
-                
-                project_image = ProjectImage(
-                    project_id=project.id,
-                    filename=filename,
-                    filepath=relative_path
-                )
-                db.session.add(project_image)
-        
-        db.session.commit()
+        project.set_palette(palette)
+        project_dir = None
+        try:
+            db.session.add(project)
+            db.session.flush()  # Get project ID
+            project_dir = _project_dir(username, project.id)
+            _insert_project_images(username, project.id, staged)
+            _touch_archive(archive.id)
+            db.session.commit()
+        except Exception:
+            discard_uploads(staged, project_dir)
+            raise
         
         return jsonify({
             'success': True,
             'project': project.to_dict()
         })
+    except RequestEntityTooLarge as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': e.description}), 413
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
 @bp.route('/<username>/projects/<int:project_id>/update', methods=['POST'])
+@streamed_uploads
 def update_project(username, project_id):
     """Update an existing project"""
     try:
@@ -206,7 +300,7 @@ def update_project(username, project_id):
         try:
             palette = json.loads(palette_json)
             if isinstance(palette, list):
-                project.palette = json.dumps(palette)
+                project.set_palette(palette)
         except:
             pass
         
@@ -222,33 +316,23 @@ def update_project(username, project_id):
         if request.form.get('img_gap'):
             project.img_gap = int(request.form.get('img_gap'))
         
-        # Handle new image uploads
-        uploaded_files = request.files.getlist('images')
-        project_dir = os.path.join(Config.UPLOAD_FOLDER, 'archives', username, str(project.id))
-        os.makedirs(project_dir, exist_ok=True)
-        
-        for file in uploaded_files:
-            if file and file.filename and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                unique_filename = f"{uuid.uuid4().hex[:8]}_{filename}"
-                filepath = os.path.join(project_dir, unique_filename)
-                file.save(filepath)
-                
-                relative_path = f"archives/{username}/{project.id}/{unique_filename}"
-                
-                project_image = ProjectImage(
-                    project_id=project.id,
-                    filename=filename,
-                    filepath=relative_path
-                )
-                db.session.add(project_image)
-        
-        db.session.commit()
+        # Land new uploads on disk, then insert them with the field updates
+        staged = stage_uploads(request.files.getlist('images'), allowed_file)
+        try:
+            _insert_project_images(username, project.id, staged)
+            _touch_archive(archive.id)
+            db.session.commit()
+        except Exception:
+            discard_uploads(staged, _project_dir(username, project.id))
+            raise
         
         return jsonify({
             'success': True,
             'project': project.to_dict()
         })
+    except RequestEntityTooLarge as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': e.description}), 413
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -266,14 +350,19 @@ def delete_project(username, project_id):
         if not project:
             return jsonify({'success': False, 'error': 'Project not found'}), 404
         
-        # Delete project directory
-        project_dir = os.path.join(Config.UPLOAD_FOLDER, 'archives', username, str(project.id))
-        if os.path.exists(project_dir):
-            import shutil
-            shutil.rmtree(project_dir)
-        
-        db.session.delete(project)
-        db.session.commit()
+        # Images and palette colors go with it via ON DELETE CASCADE;
+        # the directory is handed to the background reaper
+        project_dir = _project_dir(username, project.id)
+        trash_path = schedule_removal(db.session, project_dir)
+        try:
+            db.session.execute(delete(Project).where(Project.id == project.id))
+            _touch_archive(archive.id)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            restore_from_trash(trash_path, project_dir)
+            raise
+        wake_reaper(current_app)
         
         return jsonify({'success': True})
     except Exception as e:
@@ -303,6 +392,7 @@ def delete_image(username, project_id, image_id):
             os.remove(filepath)
         
         db.session.delete(image)
+        _touch_archive(archive.id)
         db.session.commit()
         
         return jsonify({'success': True})
@@ -328,22 +418,18 @@ def delete_archive(username):
         if confirmed_username != username:
             return jsonify({'success': False, 'error': 'Username confirmation does not match'}), 400
         
-        # Delete all uploaded files for this archive
+        # One set-based DELETE; projects, images and palette colors cascade in
+        # the database. Uploaded files are handed to the background reaper.
         archive_dir = os.path.join(Config.UPLOAD_FOLDER, 'archives', username)
-        if os.path.exists(archive_dir):
-            import shutil
-            shutil.rmtree(archive_dir)
-        
-        # Delete all projects and images (cascade should handle this, but we'll be explicit)
-        for project in archive.projects:
-            # Delete project images
-            for image in project.images:
-                db.session.delete(image)
-            db.session.delete(project)
-        
-        # Delete the archive
-        db.session.delete(archive)
-        db.session.commit()
+        trash_path = schedule_removal(db.session, archive_dir)
+        try:
+            db.session.execute(delete(Archive).where(Archive.id == archive.id))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            restore_from_trash(trash_path, archive_dir)
+            raise
+        wake_reaper(current_app)
         
         return jsonify({'success': True})
     except Exception as e:
@@ -354,4 +440,7 @@ def delete_archive(username):
 @bp.route('/uploads/<path:filename>')
 def uploaded_file(filename):
     """Serve uploaded files"""
+    # Staging and trash folders are not public
+    if any(part.startswith('.') for part in filename.split('/')):
+        abort(404)
     return send_from_directory(Config.UPLOAD_FOLDER, filename)
@@ -2,10 +2,20 @@
 Background Removal Tool blueprint
 """
 
-from flask import Blueprint, render_template, request, send_file, jsonify
+from flask import Blueprint, Response, render_template, request, send_file, jsonify
 from werkzeug.utils import secure_filename
 from config import Config
-from utils.image_utils import remove_background_color
+from utils.image_utils import (
+    remove_background_color,
+    trim_transparent,
+    background_output_name,
+    encode_settings,
+    save_background_removed
+)
+from utils.background_batch import collect_inputs, new_scratch_dir, stream_batch_zip
+from utils.upload_utils import upload_limit
+from functools import partial
+import shutil
 import os
 import io
 
@@ -24,6 +34,50 @@ def background_removal():
     return render_template('background_removal.html')
 
 
+def _background_settings():
+    """
+    Background color and tolerance from the form
+    
+    background_color "auto" detects it from the image border; with auto and
+    no (or "auto") tolerance the suggested tolerance is used.
+    
+    Raises:
+        ValueError: If the tolerance is not a whole number
+    """
+    background_color = request.form.get('background_color', '#FFFFFF').strip()
+    tolerance = request.form.get('tolerance', '').strip()
+    if background_color.lower() == 'auto' and tolerance in ('', 'auto'):
+        return 'auto', None
+    try:
+        tolerance = int(tolerance or 10)
+    except ValueError:
+        raise ValueError('Tolerance must be a whole number')
+    return ('auto' if background_color.lower() == 'auto' else background_color), tolerance
+
+
+def _encode_settings():
+    """
+    Encode profile and TIFF compression from the form
+    
+    Raises:
+        ValueError: For unknown names
+    """
+    profile = request.form.get('profile') or Config.DEFAULT_ENCODE_PROFILE
+    tiff_compression = request.form.get('tiff_compression') or None
+    encode_settings(profile, tiff_compression)
+    return profile, tiff_compression
+
+
+def _trim_settings():
+    """Padding to keep when trimming transparent margins, or None to keep the canvas"""
+    if request.form.get('trim', '').lower() not in ('1', 'true', 'yes', 'on'):
+        return None
+    try:
+        return max(0, int(request.form.get('padding', 0) or 0))
+    except ValueError:
+        raise ValueError('Padding must be a whole number')
+
+
 @bp.route('/remove', methods=['POST'])
 def remove():
     """Remove background color from image"""
@@ -38,8 +92,12 @@ def remove():
         if not allowed_file(file.filename):
             return jsonify({'success': False, 'error': 'Invalid file type'}), 400
         
-        background_color = request.form.get('background_color', '#FFFFFF')
-        tolerance = int(request.form.get('tolerance', 10))
+        try:
+            background_color, tolerance = _background_settings()
+            padding = _trim_settings()
+            profile, tiff_compression = _encode_settings()
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
         # Save uploaded file temporarily
         filename = secure_filename(file.filename)
@@ -49,45 +107,34 @@ def remove():
         try:
             # Remove background
             img = remove_background_color(upload_path, background_color, tolerance)
+            original_size = img.size
+            if padding is not None:
+                img, crop_box = trim_transparent(img, padding)
             
             # Determine output format (same as input, but JPEG doesn't support transparency)
-            file_ext = filename.rsplit('.', 1)[1].lower()
-            if file_ext in ['jpg', 'jpeg']:
-                # JPEG doesn't support transparency - convert to PNG
-                file_ext = 'png'
-                output_filename = f"{os.path.splitext(filename)[0]}_no_bg.png"
-            elif file_ext == 'tif':
-                file_ext = 'tiff'
-                output_filename = f"{os.path.splitext(filename)[0]}_no_bg.tiff"
-            else:
-                output_filename = f"{os.path.splitext(filename)[0]}_no_bg.{file_ext}"
-            
-            # Get DPI from image info or use 1200
-            dpi = img.info.get('dpi', (1200, 1200))
-            if isinstance(dpi, tuple) and len(dpi) == 2:
-                dpi_x, dpi_y = dpi
-            else:
-                dpi_x, dpi_y = 1200, 1200
+            output_filename, file_ext = background_output_name(filename)
             
             # Save to bytes with DPI metadata
             output_buffer = io.BytesIO()
-            
-            if file_ext == 'png':
-                img.save(output_buffer, format='PNG', dpi=(dpi_x, dpi_y))
-            elif file_ext == 'tiff':
-                img.save(output_buffer, format='TIFF', dpi=(dpi_x, dpi_y))
-            else:
-                img.save(output_buffer, format='PNG', dpi=(dpi_x, dpi_y))
-            
+            save_background_removed(img, output_buffer, file_ext, profile, tiff_compression)
             output_buffer.seek(0)
             
-            # Return file
-            return send_file(
+            # Return file, with the color and tolerance that were applied
+            response = send_file(
                 output_buffer,
                 mimetype=f'image/{file_ext}',
                 as_attachment=True,
                 download_name=output_filename
             )
+            response.headers['X-Background-Color'] = img.info['background_color']
+            response.headers['X-Background-Tolerance'] = str(img.info['background_tolerance'])
+            if 'background_coverage' in img.info:
+                response.headers['X-Background-Coverage'] = f"{img.info['background_coverage']:.3f}"
+            if padding is not None:
+                # Where the cropped image sits on the original canvas
+                response.headers['X-Crop-Box'] = ','.join(str(v) for v in crop_box)
+                response.headers['X-Original-Size'] = f'{original_size[0]}x{original_size[1]}'
+            return response
         finally:
             # Clean up uploaded file
             if os.path.exists(upload_path):
@@ -99,3 +146,56 @@ def remove():
             'error': str(e)
         }), 500
 
+
+@bp.route('/batch', methods=['POST'])
+@upload_limit(Config.BACKGROUND_BATCH_MAX_CONTENT_LENGTH)
+def batch():
+    """
+    Remove the background from many images (or a ZIP of images) at once
+    
+    Responds with a ZIP that is streamed as images are processed. Files that
+    can't be processed are left out and listed with their error in the
+    ZIP's manifest.json.
+    """
+    scratch_dir = None
+    try:
+        files = request.files.getlist('files') + request.files.getlist('file')
+        if not any(f.filename for f in files):
+            return jsonify({'success': False, 'error': 'No files provided'}), 400
+        
+        try:
+            background_color, tolerance = _background_settings()
+            padding = _trim_settings()
+            profile, tiff_compression = _encode_settings()
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        scratch_dir = new_scratch_dir()
+        items = collect_inputs(
+            files, scratch_dir,
+            lambda name: allowed_file(name) and not name.lower().endswith('.zip')
+        )
+        if not items:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+            return jsonify({'success': False, 'error': 'No images found'}), 400
+        
+        # From here on the response owns (and removes) the scratch directory,
+        # even if the client goes away before the stream starts
+        stream = stream_batch_zip(items, scratch_dir, background_color, tolerance, padding,
+                                  profile, tiff_compression)
+        response = Response(
+            stream,
+            mimetype='application/zip',
+            headers={'Content-Disposition': 'attachment; filename=backgrounds_removed.zip'}
+        )
+        response.call_on_close(partial(shutil.rmtree, scratch_dir, ignore_errors=True))
+        scratch_dir = None
+        return response
+    
+    except Exception as e:
+        if scratch_dir:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
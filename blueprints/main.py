@@ -2,7 +2,13 @@
 Main blueprint - Home page and navigation
 """
 
-from flask import Blueprint, render_template
+from flask import Blueprint, render_template, jsonify
+from sqlalchemy import text
+from config import Config
+from models import db
+from utils.cache import cache_stats
+from utils.profiling import require_profile_token
+import os
 
 bp = Blueprint('main', __name__)
 
@@ -12,3 +18,48 @@ def index():
     """Home page"""
     return render_template('index.html')
 
+
+@bp.route('/healthz')
+def healthz():
+    """Liveness: the worker is up and serving requests"""
+    return jsonify({'status': 'ok'})
+
+
+_latest_schema_version = None
+
+
+def _schema_ready():
+    """Whether every migration has been applied to the database"""
+    global _latest_schema_version
+    import migrations
+    
+    if _latest_schema_version is None:
+        _latest_schema_version = max((m.version for m in migrations.load_migrations()), default=0)
+    return migrations.current_version(db.engine) >= _latest_schema_version
+
+
+@bp.route('/readyz')
+def readyz():
+    """Readiness: database reachable, schema migrated, storage writable"""
+    checks = {}
+    try:
+        db.session.execute(text('SELECT 1'))
+        checks['database'] = True
+        checks['schema'] = _schema_ready()
+    except Exception:
+        checks['database'] = checks.get('database', False)
+        checks['schema'] = False
+    finally:
+        db.session.rollback()
+    checks['storage'] = all(os.access(folder, os.W_OK)
+                            for folder in (Config.UPLOAD_FOLDER, Config.PROJECTS_FOLDER))
+    
+    ready = all(checks.values())
+    return jsonify({'ready': ready, 'checks': checks}), 200 if ready else 503
+
+
+@bp.route('/_cache')
+def caches():
+    """Per-namespace cache size, hit rate and eviction metrics"""
+    require_profile_token()
+    return jsonify(cache_stats())
@@ -10,11 +10,29 @@ from utils.color_utils import (
     hex_to_rgb,
     rgb_to_hex
 )
+from utils.palette_extraction import extract_palette
+from utils.color_names import annotate_palette, brand_index, name_index
+from utils.cache import cache_key, get_cache
 import json
 
 bp = Blueprint('palette', __name__)
 
 
+def _memoized(seed, compute, *key_parts):
+    """Cache seeded results, which are deterministic; unseeded calls stay random"""
+    if seed is None:
+        return compute()
+    return get_cache('palette').get_or_set(cache_key(seed, *key_parts), compute)
+
+
+def _palette_response(palette, annotate=False, **extra):
+    """JSON response for a palette, with name/brand annotations on request"""
+    response = {'success': True, 'palette': palette, **extra}
+    if annotate:
+        response['annotations'] = annotate_palette(palette)
+    return jsonify(response)
+
+
 @bp.route('/')
 def palette_generator():
     """Palette generator page"""
@@ -34,24 +52,25 @@ def generate():
         manual_colors = data.get('manual_colors', [])  # List of hex codes
         seed = data.get('seed', None)
         
-        # If manual colors provided, use them and generate remaining
-        if manual_colors:
-            palette = manual_colors[:num_colors]
-            remaining = num_colors - len(manual_colors)
-            if remaining > 0:
-                additional = generate_palette(
-                    remaining, formal_playful, modern_classic, adjectives, seed
-                )
-                palette.extend(additional)
-        else:
-            palette = generate_palette(
+        def build():
+            # If manual colors provided, use them and generate remaining
+            if manual_colors:
+                palette = manual_colors[:num_colors]
+                remaining = num_colors - len(manual_colors)
+                if remaining > 0:
+                    additional = generate_palette(
+                        remaining, formal_playful, modern_classic, adjectives, seed
+                    )
+                    palette.extend(additional)
+                return palette
+            return generate_palette(
                 num_colors, formal_playful, modern_classic, adjectives, seed
             )
         
-        return jsonify({
-            'success': True,
-            'palette': palette
-        })
+        palette = _memoized(seed, build, 'generate', num_colors, formal_playful,
+                            modern_classic, adjectives, manual_colors)
+        
+        return _palette_response(palette, data.get('annotate', False))
     except Exception as e:
         return jsonify({
             'success': False,
@@ -72,19 +91,21 @@ def regenerate():
         adjectives = data.get('adjectives', [])
         seed = data.get('seed', None)
         
-        new_palette = regenerate_unlocked_colors(
-            current_palette,
-            locked_indices,
-            formal_playful,
-            modern_classic,
-            adjectives,
-            seed
+        new_palette = _memoized(
+            seed,
+            lambda: regenerate_unlocked_colors(
+                current_palette,
+                locked_indices,
+                formal_playful,
+                modern_classic,
+                adjectives,
+                seed
+            ),
+            'regenerate', current_palette, locked_indices, formal_playful,
+            modern_classic, adjectives
         )
         
-        return jsonify({
-            'success': True,
-            'palette': new_palette
-        })
+        return _palette_response(new_palette, data.get('annotate', False))
     except Exception as e:
         return jsonify({
             'success': False,
@@ -105,22 +126,91 @@ def expand():
         adjectives = data.get('adjectives', [])
         seed = data.get('seed', None)
         
-        expanded_palette = expand_palette(
-            current_palette,
-            new_size,
-            formal_playful,
-            modern_classic,
-            adjectives,
-            seed
+        expanded_palette = _memoized(
+            seed,
+            lambda: expand_palette(
+                current_palette,
+                new_size,
+                formal_playful,
+                modern_classic,
+                adjectives,
+                seed
+            ),
+            'expand', current_palette, new_size, formal_playful,
+            modern_classic, adjectives
         )
         
-        return jsonify({
-            'success': True,
-            'palette': expanded_palette
-        })
+        return _palette_response(expanded_palette, data.get('annotate', False))
     except Exception as e:
         return jsonify({
         'success': False,
         'error': str(e)
     }), 400
 
+
+def allowed_image(filename):
+    """Check if an uploaded image can be analyzed"""
+    return '.' in filename and \
+           filename.rsplit('.', 1)[1].lower() in {'png', 'jpg', 'jpeg', 'gif', 'webp', 'tiff', 'tif'}
+
+
+@bp.route('/extract', methods=['POST'])
+def extract():
+    """Extract a palette of dominant colors from an uploaded image"""
+    try:
+        if 'file' not in request.files:
+            return jsonify({'success': False, 'error': 'No file provided'}), 400
+        
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({'success': False, 'error': 'No file selected'}), 400
+        
+        if not allowed_image(file.filename):
+            return jsonify({'success': False, 'error': 'Invalid file type'}), 400
+        
+        num_colors = int(request.form.get('num_colors', 5))
+        seed = request.form.get('seed')
+        seed = int(seed) if seed not in (None, '') else None
+        
+        colors = extract_palette(file.stream, num_colors, seed)
+        
+        return _palette_response(
+            [color for color, _ in colors],
+            request.form.get('annotate', '').lower() in ('1', 'true', 'yes'),
+            weights=[round(weight, 4) for _, weight in colors]
+        )
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+
+@bp.route('/names', methods=['POST'])
+def names():
+    """Nearest named or brand colors for a list of colors"""
+    try:
+        data = request.get_json()
+        
+        colors = data.get('colors', [])
+        k = max(1, min(int(data.get('k', 1)), 10))
+        reference = data.get('reference', 'names')
+        
+        if reference not in ('names', 'brand'):
+            return jsonify({'success': False, 'error': 'Invalid reference'}), 400
+        
+        index = brand_index() if reference == 'brand' else name_index()
+        matches = index.nearest_many(colors, k)
+        
+        return jsonify({
+            'success': True,
+            'matches': [
+                [{'name': m.name, 'hex': m.hex, 'distance': round(m.distance, 2)} for m in found]
+                for found in matches
+            ]
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
@@ -3,30 +3,50 @@ Public Project Pages blueprint
 """
 
 from flask import Blueprint, render_template, request, jsonify, send_from_directory
+import click
 from config import Config
-import os
-import json
+from models import db
+from utils.project_store import (
+    load_project,
+    project_signature,
+    save_project,
+    list_projects,
+    rebuild_index,
+    externalize_existing_projects,
+    ProjectConflictError
+)
+from utils.asset_store import assets_folder, externalize_assets
+from utils.page_cache import cached_page
+from datetime import datetime, timezone
 
 bp = Blueprint('projects', __name__)
 
 
+@bp.cli.command('rebuild-index')
+def rebuild_index_command():
+    """Rebuild the project list index from the JSON files"""
+    with db.engine.begin() as conn:
+        count = rebuild_index(conn)
+    click.echo(f"Indexed {count} projects")
+
+
+@bp.cli.command('externalize-assets')
+def externalize_assets_command():
+    """Move inlined data-URL assets out of existing project JSON files"""
+    count = externalize_existing_projects()
+    with db.engine.begin() as conn:
+        rebuild_index(conn)
+    click.echo(f"Rewrote {count} projects")
+
+
 @bp.route('/')
 def projects_list():
     """List all public projects"""
-    projects = []
-    if os.path.exists(Config.PROJECTS_FOLDER):
-        for filename in os.listdir(Config.PROJECTS_FOLDER):
-            if filename.endswith('.json'):
-                project_path = os.path.join(Config.PROJECTS_FOLDER, filename)
-                try:
-                    with open(project_path, 'r', encoding='utf-8') as f:
-                        project_data = json.load(f)
-                        project_data['id'] = os.path.splitext(filename)[0]
-                        projects.append(project_data)
-                except:
-                    continue
+    page = request.args.get('page', 1, type=int)
+    pagination = list_projects(page=max(page, 1), per_page=Config.PROJECTS_PER_PAGE)
+    projects = [p.to_dict() for p in pagination.items]
     
-    return render_template('projects.html', projects=projects)
+    return render_template('projects.html', projects=projects, pagination=pagination)
 
 
 @bp.route('/create', methods=['GET', 'POST'])
@@ -45,11 +65,12 @@ def create_project():
         logos = data.get('logos', [])
         favicons = data.get('favicons', [])
         graphics = data.get('graphics', [])
+        on_conflict = data.get('on_conflict', 'overwrite')  # overwrite | unique | error
         
         # Generate project ID from title
         project_id = title.lower().replace(' ', '-').replace('_', '-')
         # Remove special characters
-        project_id = ''.join(c for c in project_id if c.isalnum() or c == '-')
+        project_id = ''.join(c for c in project_id if c.isalnum() or c == '-') or 'untitled'
         
         project_data = {
             'title': title,
@@ -60,16 +81,22 @@ def create_project():
             'graphics': graphics
         }
         
-        # Save project JSON
-        project_path = os.path.join(Config.PROJECTS_FOLDER, f"{project_id}.json")
-        with open(project_path, 'w', encoding='utf-8') as f:
-            json.dump(project_data, f, indent=2)
+        # Decode inlined data-URL assets into the blob store
+        project_data, _ = externalize_assets(project_data)
+        
+        # Save project JSON and update the list index
+        project_id = save_project(project_id, project_data, on_conflict=on_conflict)
         
         return jsonify({
             'success': True,
             'project_id': project_id,
             'url': f'/projects/{project_id}'
         })
+    except ProjectConflictError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 409
     except Exception as e:
         return jsonify({
             'success': False,
@@ -77,21 +104,35 @@ def create_project():
         }), 500
 
 
+@bp.route('/assets/<path:filename>')
+def project_asset(filename):
+    """Serve a stored project asset (content-addressed, so cacheable forever)"""
+    response = send_from_directory(assets_folder(), filename)
+    # Assets are user supplied; never let an SVG run scripts on this origin
+    response.headers['Content-Security-Policy'] = "default-src 'none'; style-src 'unsafe-inline'"
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
 @bp.route('/<project_id>')
 def view_project(project_id):
     """View a specific project page"""
-    project_path = os.path.join(Config.PROJECTS_FOLDER, f"{project_id}.json")
-    
-    if not os.path.exists(project_path):
-        return render_template('error.html', 
-                             error='Project not found',
-                             message='The requested project does not exist.'), 404
-    
     try:
-        with open(project_path, 'r', encoding='utf-8') as f:
-            project_data = json.load(f)
+        # Saving a project rewrites its file, so the file signature is its version
+        stat = project_signature(project_id)
+        project_data = load_project(project_id) if stat else None
+        if project_data is None:
+            return render_template('error.html', 
+                                 error='Project not found',
+                                 message='The requested project does not exist.'), 404
         
-        return render_template('project_view.html', project=project_data, project_id=project_id)
+        return cached_page(
+            ('project', project_id, stat.st_mtime_ns, stat.st_size),
+            f'project-{stat.st_mtime_ns:x}-{stat.st_size:x}',
+            datetime.fromtimestamp(stat.st_mtime, timezone.utc),
+            lambda: render_template('project_view.html', project=project_data, project_id=project_id)
+        )
     except Exception as e:
         return render_template('error.html',
                              error='Error loading project',
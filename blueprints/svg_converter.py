@@ -2,12 +2,23 @@
 SVG Conversion Tool blueprint
 """
 
-from flask import Blueprint, render_template, request, send_file, jsonify
+from flask import Blueprint, Response, render_template, request, send_file, jsonify
 from werkzeug.utils import secure_filename
 from config import Config
-from utils.image_utils import convert_svg_to_raster
+from utils.image_utils import (
+    convert_svg_to_raster,
+    convert_svg_to_tiled_tiff,
+    encode_settings,
+    plan_svg_render,
+    tiled_svg_render_available
+)
+from utils.cache import cache_key, get_cache
+from functools import partial
+import contextlib
+import hashlib
 import os
 import io
+import tempfile
 
 bp = Blueprint('svg_converter', __name__)
 
@@ -18,6 +29,69 @@ def allowed_file(filename):
            filename.rsplit('.', 1)[1].lower() in {'svg'}
 
 
+def _target_size(name):
+    """Optional output width/height from the form, in pixels"""
+    value = request.form.get(name, '').strip()
+    if not value:
+        return None
+    size = int(value)
+    if not 0 < size <= Config.SVG_TARGET_SIZE_MAX:
+        raise ValueError(name)
+    return size
+
+
+def _with_plan_headers(response, plan):
+    response.headers['X-Output-Size'] = f'{plan.width}x{plan.height}'
+    response.headers['X-Output-DPI'] = f'{plan.dpi:g}'
+    if plan.clamped:
+        response.headers['X-Output-Clamped'] = 'true'
+    if plan.tiled:
+        response.headers['X-Output-Tiled'] = 'true'
+    return response
+
+
+def _remove_scratch(path):
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(path)
+
+
+def _stream_file(path, chunk_size=1024 * 1024):
+    """Yield a scratch file in chunks and remove it when the stream ends"""
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        _remove_scratch(path)
+
+
+def _send_tiled(svg_data, plan, output_filename, profile, tiff_compression):
+    """Render an oversized TIFF to a scratch file and stream it (not cached)"""
+    # Dot folders under the upload folder are never served by /archives/uploads/
+    scratch_dir = os.path.join(Config.UPLOAD_FOLDER, '.svg-tiles')
+    os.makedirs(scratch_dir, exist_ok=True)
+    fd, output_path = tempfile.mkstemp(suffix='.tiff', dir=scratch_dir)
+    try:
+        with os.fdopen(fd, 'w+b') as f:
+            convert_svg_to_tiled_tiff(svg_data, f, plan, Config.SVG_DPI, profile, tiff_compression)
+            size = f.tell()
+    except BaseException:
+        os.remove(output_path)
+        raise
+    response = Response(
+        _stream_file(output_path),
+        mimetype='image/tiff',
+        headers={'Content-Disposition': f'attachment; filename={output_filename}',
+                 'Content-Length': str(size)}
+    )
+    # The stream's finally doesn't run if the client leaves before it starts
+    response.call_on_close(partial(_remove_scratch, output_path))
+    return _with_plan_headers(response, plan)
+
+
 @bp.route('/')
 def svg_converter():
     """SVG converter page"""
@@ -42,36 +116,82 @@ def convert():
         if output_format not in ['png', 'jpeg', 'jpg', 'tiff']:
             output_format = 'png'
         
-        # Save uploaded file temporarily
+        if output_format == 'jpg':
+            output_format = 'jpeg'
+        
+        profile = request.form.get('profile') or Config.DEFAULT_ENCODE_PROFILE
+        tiff_compression = request.form.get('tiff_compression') or None
+        try:
+            encode_settings(profile, tiff_compression)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        try:
+            width, height = _target_size('width'), _target_size('height')
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': f'Width and height must be whole numbers from 1 to {Config.SVG_TARGET_SIZE_MAX}'
+            }), 400
         filename = secure_filename(file.filename)
-        upload_path = os.path.join(Config.UPLOAD_FOLDER, filename)
-        file.save(upload_path)
         
+        svg_data = file.read()
+        # Size check before anything is rendered (also refuses oversized SVGs)
         try:
-            # Convert SVG
-            output_data = convert_svg_to_raster(
-                upload_path,
-                output_format=output_format,
-                dpi=Config.SVG_DPI
-            )
-            
-            # Determine output filename
-            base_name = os.path.splitext(filename)[0]
-            if output_format == 'jpg':
-                output_format = 'jpeg'
-            output_filename = f"{base_name}.{output_format}"
+            # Tiling hooks into cairosvg internals; without a verified match
+            # with single renders, oversized TIFFs are clamped instead
+            allow_tiles = (output_format == 'tiff' and Config.SVG_OVERSIZE_POLICY == 'tile'
+                           and tiled_svg_render_available())
+            plan = plan_svg_render(svg_data, Config.SVG_DPI, width, height,
+                                   allow_tiles=allow_tiles)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        base_name = os.path.splitext(filename)[0]
+        if plan.tiled:
+            return _send_tiled(svg_data, plan, f'{base_name}.tiff', profile, tiff_compression)
+        
+        # Identical SVGs convert to identical output, so key on the content and
+        # on the planned size, which follows the pixel budget and oversize policy
+        cache = get_cache('svg')
+        key = cache_key(hashlib.sha256(svg_data).hexdigest(), output_format, Config.SVG_DPI,
+                        profile, tiff_compression, width, height,
+                        plan.width, plan.height, plan.dpi)
+        output_data = cache.get(key)
+        
+        if output_data is None:
+            # Save uploaded file temporarily
+            upload_path = os.path.join(Config.UPLOAD_FOLDER, filename)
+            with open(upload_path, 'wb') as f:
+                f.write(svg_data)
             
-            # Return file
-            return send_file(
-                io.BytesIO(output_data),
-                mimetype=f'image/{output_format}',
-                as_attachment=True,
-                download_name=output_filename
-            )
-        finally:
-            # Clean up uploaded file
-            if os.path.exists(upload_path):
-                os.remove(upload_path)
+            try:
+                # Convert SVG
+                output_data = convert_svg_to_raster(
+                    upload_path,
+                    output_format=output_format,
+                    dpi=Config.SVG_DPI,
+                    profile=profile,
+                    tiff_compression=tiff_compression,
+                    width=width,
+                    height=height
+                )
+            finally:
+                # Clean up uploaded file
+                if os.path.exists(upload_path):
+                    os.remove(upload_path)
+            cache.set(key, output_data)
+        
+        # Determine output filename
+        output_filename = f"{base_name}.{output_format}"
+        
+        # Return file
+        response = send_file(
+            io.BytesIO(output_data),
+            mimetype=f'image/{output_format}',
+            as_attachment=True,
+            download_name=output_filename
+        )
+        return _with_plan_headers(response, plan)
     
     except Exception as e:
         return jsonify({
@@ -14,17 +14,128 @@ class Config:
         f'sqlite:///{os.path.join(Path(__file__).parent, "huevault.db")}'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # SQLite tuning, applied to every new connection (ignored for other databases)
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',         # Readers no longer block behind writers
+        'synchronous': 'NORMAL',       # Safe with WAL, fsync only at checkpoints
+        'busy_timeout': 5000,          # ms to wait on a locked database
+        'cache_size': -32000,          # 32MB page cache per connection
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+        'foreign_keys': 'ON'           # Needed for ON DELETE CASCADE
+    }
+    SQLITE_POOL_SIZE = int(os.environ.get('SQLITE_POOL_SIZE', 4))
+    SQLITE_POOL_OVERFLOW = int(os.environ.get('SQLITE_POOL_OVERFLOW', 4))
+    SQLITE_POOL_TIMEOUT = 30
+    
     # File upload settings
     UPLOAD_FOLDER = os.path.join(Path(__file__).parent, 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'svg', 'tiff', 'tif', 'gif', 'webp'}
+    MAX_UPLOAD_FILE_SIZE = MAX_CONTENT_LENGTH  # Per-file limit for archive images
+    FILE_REAPER_ENABLED = True
+    FILE_REAPER_INTERVAL = 30  # Seconds between passes over the deletion queue
     
     # Project storage
     PROJECTS_FOLDER = os.path.join(Path(__file__).parent, 'projects')
     OUTPUT_FOLDER = os.path.join(Path(__file__).parent, 'static', 'outputs')
+    # Project page assets (utils/asset_store.py); None means <UPLOAD_FOLDER>/.project_assets.
+    # Must not be served by /archives/uploads/, which sends no CSP for user SVGs.
+    PROJECT_ASSETS_FOLDER = None
+    PROJECTS_PER_PAGE = 24
+    
+    # Identifies the deployed code in cached page keys and ETags (utils/page_cache.py);
+    # when unset, a hash of the templates is used
+    BUILD_VERSION = os.environ.get('HUEVAULT_BUILD_VERSION') or os.environ.get('RENDER_GIT_COMMIT')
+    
+    # Caches (see utils/cache.py). 'memory' keeps a private LRU per worker;
+    # 'sqlite' shares one file-backed store between all workers on the host.
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+    CACHE_PATH = os.environ.get('CACHE_PATH') or os.path.join(Path(__file__).parent, 'cache', 'huevault-cache.db')
+    CACHE_MMAP_SIZE = 256 * 1024 * 1024
+    CACHE_NAMESPACES = {
+        'pages': {'max_entries': 512, 'max_bytes': 64 * 1024 * 1024},
+        'palette': {'max_entries': 4096, 'max_bytes': 8 * 1024 * 1024},
+        'svg': {'max_entries': 64, 'max_bytes': 256 * 1024 * 1024,
+                'max_item_bytes': 32 * 1024 * 1024},
+        # Parsed SVG documents (utils/svg_cache.py); live objects, so memory only
+        'svg_tree': {'backend': 'memory', 'max_entries': 32, 'max_bytes': 128 * 1024 * 1024,
+                     'max_item_bytes': 64 * 1024 * 1024},
+        # Parsed project documents (utils/project_store.py); live objects, so memory only
+        'projects': {'backend': 'memory', 'max_entries': 256, 'max_bytes': 64 * 1024 * 1024},
+        # Cheaper to recompute than to fetch from a shared store
+        'simulation': {'backend': 'memory', 'max_entries': 16384, 'max_bytes': 4 * 1024 * 1024}
+    }
+    
+    # Request timing, Server-Timing header and Prometheus /metrics (per worker)
+    INSTRUMENTATION_ENABLED = os.environ.get('HUEVAULT_INSTRUMENTATION', '').lower() in ('1', 'true', 'yes')
+    INSTRUMENTATION_BUCKETS = None  # Latency buckets in seconds; None uses the defaults
+    
+    # On-demand profiling (see utils/profiling.py); disabled without a token
+    PROFILING_TOKEN = os.environ.get('HUEVAULT_PROFILING_TOKEN')
+    PROFILE_FOLDER = os.path.join(Path(__file__).parent, 'profiles')
+    PROFILING_MAX_SECONDS = 120  # Upper bound for one sampling run
+    PROFILING_SAMPLE_INTERVAL = 0.005
+    
+    # Archive color search: Lab grid cell size and default match radius (delta E).
+    # Changing the cell size requires re-running the palette_colors backfill;
+    # it must be at least 1 (utils.color_utils.MIN_LAB_CELL_SIZE).
+    PALETTE_SEARCH_CELL_SIZE = 10
+    PALETTE_SEARCH_RADIUS = 10
+    
+    # Palette extraction from images: longest side of the analyzed sample (at most
+    # 512), and the largest image decoded in full (formats JPEG can't scale down
+    # while decoding); decoding is nearly all of the run time
+    PALETTE_EXTRACT_SAMPLE_SIZE = 256
+    PALETTE_EXTRACT_MAX_PIXELS = int(os.environ.get('HUEVAULT_PALETTE_EXTRACT_MAX_PIXELS', 24_000_000))
+    PALETTE_EXTRACT_MAX_COLORS = 32
+    
+    # Extra named colors for swatch annotations (JSON {name: hex} or CSV name,hex),
+    # added to the built-in CSS color names
+    COLOR_NAMES_FILE = os.environ.get('HUEVAULT_COLOR_NAMES_FILE') or \
+        os.path.join(Path(__file__).parent, 'data', 'color_names.csv')
+    
+    # Background auto-detection: border band width as a fraction of the shorter
+    # side (at most 32 px), and the upper bound for the suggested tolerance
+    BACKGROUND_DETECT_BORDER = 0.02
+    BACKGROUND_DETECT_MAX_TOLERANCE = 50
+    
+    # Batch background removal: worker processes (0 processes in the request
+    # thread), images queued at once, and request limits
+    BACKGROUND_BATCH_WORKERS = int(os.environ.get('BACKGROUND_BATCH_WORKERS', min(4, os.cpu_count() or 1)))
+    BACKGROUND_BATCH_IN_FLIGHT = 2 * max(1, BACKGROUND_BATCH_WORKERS)
+    BACKGROUND_BATCH_MAX_FILES = 500
+    BACKGROUND_BATCH_MAX_EXTRACTED_BYTES = 2 * 1024 * 1024 * 1024  # Uncompressed ZIP contents
+    BACKGROUND_BATCH_MAX_CONTENT_LENGTH = 512 * 1024 * 1024
+    
+    # Raster encode profiles (utils/image_utils.encode_image): speed vs size
+    ENCODE_PROFILES = {
+        'fast': {'png_filter': False, 'png_level': 1, 'png_optimize': False,
+                 'png_palette': False, 'jpeg_optimize': False, 'tiff_compression': 'none'},
+        'balanced': {'png_filter': True, 'png_level': 6, 'png_optimize': False,
+                     'png_palette': False, 'jpeg_optimize': False, 'tiff_compression': 'none'},
+        'smallest': {'png_filter': True, 'png_level': 9, 'png_optimize': True,
+                     'png_palette': True, 'jpeg_optimize': True, 'tiff_compression': 'deflate'}
+    }
+    DEFAULT_ENCODE_PROFILE = 'balanced'
+    TIFF_COMPRESSIONS = {'none': None, 'lzw': 'tiff_lzw', 'deflate': 'tiff_adobe_deflate'}
     
     # SVG conversion settings
     SVG_DPI = 1200
+    # Pixel budget per conversion; rendering peaks at about 8 bytes per pixel
+    # (cairo's surface plus the RGBA copy), so 64 MP is roughly 512 MB
+    SVG_MAX_PIXELS = int(os.environ.get('HUEVAULT_SVG_MAX_PIXELS', 64_000_000))
+    SVG_MAX_DIMENSION = 32767  # cairo image surfaces are limited to 32767 px per side
+    # SVGs over budget are scaled down to fit ('clamp'), refused ('reject') or,
+    # for TIFF output, rendered tile by tile to disk ('tile'; other formats clamp)
+    SVG_OVERSIZE_POLICY = os.environ.get('HUEVAULT_SVG_OVERSIZE_POLICY', 'clamp')
+    SVG_TARGET_SIZE_MAX = 262144  # Largest width/height a client may request
+    # Tiled rendering (utils/svg_tiles.py): memory is about 8 bytes per pixel
+    # of each tile in flight; the output is limited by SVG_TILED_MAX_PIXELS
+    SVG_TILE_SIZE = 1024  # Multiple of 16 (TIFF tiles)
+    SVG_TILE_WORKERS = int(os.environ.get('SVG_TILE_WORKERS', min(4, os.cpu_count() or 1)))
+    SVG_TILE_IN_FLIGHT = 2 * max(1, SVG_TILE_WORKERS)
+    SVG_TILED_MAX_PIXELS = int(os.environ.get('HUEVAULT_SVG_TILED_MAX_PIXELS', 2_000_000_000))
     
     # IBM Color Palette (accent colors)
     IBM_COLORS = {
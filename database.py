@@ -0,0 +1,69 @@
+"""
+Database engine setup for HueVault
+
+Applies the SQLite production tuning (WAL journal, relaxed fsync, memory
+mapping, page cache and busy timeout) through connect-event pragmas so every
+pooled connection is configured the same way. Other databases configured via
+DATABASE_URL are left untouched.
+"""
+
+from sqlalchemy import event
+from models import db
+
+
+def is_sqlite(uri: str) -> bool:
+    """Check whether a SQLAlchemy database URI points at SQLite"""
+    return (uri or '').startswith('sqlite')
+
+
+def _sqlite_engine_options(config) -> dict:
+    """Pool settings for a file-backed SQLite database"""
+    return {
+        # One connection per gunicorn thread plus headroom for background work
+        'pool_size': config.get('SQLITE_POOL_SIZE', 4),
+        'max_overflow': config.get('SQLITE_POOL_OVERFLOW', 4),
+        'pool_timeout': config.get('SQLITE_POOL_TIMEOUT', 30),
+        'connect_args': {
+            # Seconds the driver waits on a locked database before raising
+            'timeout': config.get('SQLITE_PRAGMAS', {}).get('busy_timeout', 5000) / 1000.0,
+        },
+    }
+
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas: dict) -> None:
+    """Run PRAGMA statements on a raw sqlite3 connection"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+    finally:
+        cursor.close()
+
+
+def init_db(app) -> None:
+    """
+    Bind the SQLAlchemy extension to the app with tuned engine settings
+
+    Args:
+        app: Flask application whose config provides SQLALCHEMY_DATABASE_URI,
+            SQLITE_PRAGMAS and the SQLITE_POOL_* settings
+    """
+    sqlite = is_sqlite(app.config.get('SQLALCHEMY_DATABASE_URI'))
+    if sqlite and ':memory:' not in app.config['SQLALCHEMY_DATABASE_URI']:
+        options = _sqlite_engine_options(app.config)
+        options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+    db.init_app(app)
+
+    if not sqlite:
+        return
+
+    pragmas = dict(app.config.get('SQLITE_PRAGMAS') or {})
+    if not pragmas:
+        return
+
+    with app.app_context():
+        @event.listens_for(db.engine, 'connect')
+        def _on_connect(dbapi_connection, connection_record):
+            apply_sqlite_pragmas(dbapi_connection, pragmas)
@@ -0,0 +1,25 @@
+"""
+Gunicorn settings for HueVault (loaded automatically from the working directory)
+
+The app is built once in the master (preload_app) and forked into the
+workers, so imports and directory bootstrap are not repeated per worker and
+recycled workers start instantly. Each worker drops the database
+connections inherited from the master after the fork.
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 2))
+timeout = 120
+preload_app = True
+
+
+def post_fork(server, worker):
+    from models import db
+
+    app = worker.app.wsgi()
+    with app.app_context():
+        # Never share pooled SQLite connections across processes
+        db.engine.dispose(close=False)
@@ -1,53 +1,52 @@
 """
-Database migration script to add new columns to projects table
-Run this once to update your existing database schema
+Database migration command
+Run at deploy time (and after pulling schema changes) to bring the database
+up to date. The app no longer creates tables on startup.
+
+Usage:
+    python migrate_db.py                  Apply all pending migrations
+    python migrate_db.py status           Show applied and pending migrations
+    python migrate_db.py new "<summary>"  Scaffold a new migration module
 """
 
-import sqlite3
-import os
-from pathlib import Path
-
-# Find the database file
-db_path = os.path.join(Path(__file__).parent, 'huevault.db')
-
-if not os.path.exists(db_path):
-    print(f"Database file not found at {db_path}")
-    print("The database will be created automatically when you run the app.")
-    exit(0)
-
-print(f"Migrating database at: {db_path}")
-
-conn = sqlite3.connect(db_path)
-cursor = conn.cursor()
-
-# Get current columns
-cursor.execute("PRAGMA table_info(projects)")
-columns = [row[1] for row in cursor.fetchall()]
-
-print(f"Current columns: {columns}")
-
-# Define new columns to add
-new_columns = {
-    'img_width': 'INTEGER DEFAULT 260',
-    'img_height': 'INTEGER DEFAULT 200',
-    'img_fit': 'VARCHAR(20) DEFAULT "cover"',
-    'img_radius': 'INTEGER DEFAULT 8',
-    'img_gap': 'INTEGER DEFAULT 16'
-}
-
-# Add missing columns
-for col_name, col_def in new_columns.items():
-    if col_name not in columns:
-        print(f"Adding column: {col_name}")
-        try:
-            cursor.execute(f'ALTER TABLE projects ADD COLUMN {col_name} {col_def}')
-            print(f"  [OK] Added {col_name}")
-        except Exception as e:
-            print(f"  [ERROR] Error adding {col_name}: {e}")
-    else:
-        print(f"  - Column {col_name} already exists")
-
-conn.commit()
-conn.close()
-
-print("\nMigration complete!")
+import sys
+
+from app import create_app
+from models import db
+import migrations
+
+
+def main(argv):
+    command = argv[1] if len(argv) > 1 else 'upgrade'
+
+    if command == 'new':
+        if len(argv) < 3:
+            print('Usage: python migrate_db.py new "<summary>"')
+            return 1
+        print(f"Created {migrations.new_migration(argv[2])}")
+        return 0
+
+    app = create_app()
+    with app.app_context():
+        print(f"Migrating database at: {db.engine.url.render_as_string(hide_password=True)}")
+
+        if command == 'status':
+            version = migrations.current_version(db.engine)
+            print(f"Current schema version: {version}")
+            for migration in migrations.pending_migrations(db.engine):
+                print(f"  pending {migration.version:04d}_{migration.name}: {migration.description}")
+            return 0
+
+        if command != 'upgrade':
+            print(__doc__)
+            return 1
+
+        applied = migrations.upgrade(db.engine, log=lambda message: print(f"  {message}"))
+        if not applied:
+            print("Database is already up to date")
+        print(f"\nMigration complete! Schema version: {migrations.current_version(db.engine)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,189 @@
+"""
+Versioned schema migrations for HueVault
+
+Each migration is a module in ``migrations/versions`` named
+``NNNN_short_name.py`` that defines ``DESCRIPTION`` and ``upgrade(conn)``.
+Applied versions are recorded in the ``schema_version`` table, so every
+migration runs exactly once per database. Migrations are run at deploy time
+with ``python migrate_db.py``; the app itself never creates or reflects
+tables at startup.
+
+To add a table, column or index, scaffold a new migration with
+``python migrate_db.py new "<description>"`` and fill in ``upgrade`` using
+the idempotent helpers in :mod:`migrations.ops`. Migrations that rebuild
+tables on SQLite set ``DISABLE_FOREIGN_KEYS = True`` so the runner turns
+foreign key enforcement off around them and checks integrity before commit.
+"""
+
+import importlib
+import os
+import re
+from datetime import datetime
+from typing import Callable, List, NamedTuple, Optional
+
+from sqlalchemy import Column, DateTime, Integer, String, text
+
+from migrations import ops
+
+VERSIONS_DIR = os.path.join(os.path.dirname(__file__), 'versions')
+VERSION_TABLE = 'schema_version'
+
+_FILENAME_RE = re.compile(r'^(\d{4})_(\w+)\.py$')
+
+MIGRATION_TEMPLATE = '''"""
+{description}
+"""
+
+from migrations import ops
+
+DESCRIPTION = {description!r}
+
+
+def upgrade(conn):
+    pass
+'''
+
+
+class Migration(NamedTuple):
+    """A single schema migration"""
+    version: int
+    name: str
+    description: str
+    upgrade: Callable
+    disable_foreign_keys: bool = False
+
+
+def load_migrations() -> List[Migration]:
+    """Load all migration modules, ordered by version"""
+    migrations = []
+    for filename in sorted(os.listdir(VERSIONS_DIR)):
+        match = _FILENAME_RE.match(filename)
+        if not match:
+            continue
+        module = importlib.import_module(f'migrations.versions.{filename[:-3]}')
+        migrations.append(Migration(
+            version=int(match.group(1)),
+            name=match.group(2),
+            description=getattr(module, 'DESCRIPTION', match.group(2)),
+            upgrade=module.upgrade,
+            disable_foreign_keys=getattr(module, 'DISABLE_FOREIGN_KEYS', False)
+        ))
+
+    versions = [m.version for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f'Duplicate migration versions in {VERSIONS_DIR}')
+    return migrations
+
+
+def _ensure_version_table(conn) -> None:
+    ops.create_table(
+        conn, VERSION_TABLE,
+        Column('version', Integer, primary_key=True, autoincrement=False),
+        Column('name', String(200), nullable=False),
+        Column('applied_at', DateTime, nullable=False)
+    )
+
+
+def _applied_versions(conn) -> set:
+    if not ops.has_table(conn, VERSION_TABLE):
+        return set()
+    return {row[0] for row in conn.execute(text(f'SELECT version FROM {VERSION_TABLE}'))}
+
+
+def current_version(engine) -> int:
+    """Highest applied migration version (0 for an unmigrated database)"""
+    with engine.connect() as conn:
+        return max(_applied_versions(conn), default=0)
+
+
+def pending_migrations(engine) -> List[Migration]:
+    """Migrations that have not been applied yet"""
+    with engine.connect() as conn:
+        applied = _applied_versions(conn)
+    return [m for m in load_migrations() if m.version not in applied]
+
+
+def upgrade(engine, target: Optional[int] = None, log: Callable = None) -> List[Migration]:
+    """
+    Apply pending migrations up to ``target`` (default: latest)
+
+    Each migration runs in its own transaction together with the row that
+    records it. On SQLite the transaction is started with BEGIN IMMEDIATE so
+    concurrent deploys serialize on the write lock instead of racing.
+
+    Args:
+        engine: SQLAlchemy engine to migrate
+        target: Highest version to apply
+        log: Optional callable receiving progress messages
+
+    Returns:
+        The migrations that were applied
+    """
+    applied = []
+    for migration in load_migrations():
+        if target is not None and migration.version > target:
+            break
+        with engine.connect() as conn:
+            sqlite = conn.dialect.name == 'sqlite'
+            foreign_keys = None
+            if sqlite and migration.disable_foreign_keys:
+                # Only takes effect outside a transaction
+                foreign_keys = conn.exec_driver_sql('PRAGMA foreign_keys').scalar()
+                conn.exec_driver_sql('PRAGMA foreign_keys=OFF')
+            try:
+                if not _apply(conn, migration, sqlite, log):
+                    continue
+            finally:
+                if foreign_keys is not None:
+                    if conn.in_transaction():
+                        conn.rollback()
+                    conn.exec_driver_sql(f'PRAGMA foreign_keys={int(foreign_keys)}')
+        applied.append(migration)
+    return applied
+
+
+def _apply(conn, migration: Migration, sqlite: bool, log: Optional[Callable]) -> bool:
+    """Run one migration in its own transaction; False if it was already applied"""
+    if sqlite:
+        conn.exec_driver_sql('BEGIN IMMEDIATE')
+    _ensure_version_table(conn)
+    if migration.version in _applied_versions(conn):
+        conn.rollback()
+        return False
+    if log:
+        log(f'Applying {migration.version:04d}_{migration.name}: {migration.description}')
+    migration.upgrade(conn)
+    if sqlite and migration.disable_foreign_keys:
+        violations = conn.exec_driver_sql('PRAGMA foreign_key_check').fetchall()
+        if violations:
+            conn.rollback()
+            raise RuntimeError(
+                f'Migration {migration.version:04d} left foreign key violations: {violations[:5]}'
+            )
+    conn.execute(
+        text(f'INSERT INTO {VERSION_TABLE} (version, name, applied_at) '
+             f'VALUES (:version, :name, :applied_at)'),
+        {'version': migration.version, 'name': migration.name,
+         'applied_at': datetime.utcnow()}
+    )
+    conn.commit()
+    return True
+
+
+def new_migration(description: str) -> str:
+    """
+    Scaffold the next migration module
+
+    Args:
+        description: Human readable summary, also used for the file name
+
+    Returns:
+        Path of the created file
+    """
+    versions = [m.version for m in load_migrations()]
+    version = max(versions, default=0) + 1
+    slug = re.sub(r'[^a-z0-9]+', '_', description.lower()).strip('_')[:50] or 'migration'
+    path = os.path.join(VERSIONS_DIR, f'{version:04d}_{slug}.py')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(MIGRATION_TEMPLATE.format(description=description))
+    return path
@@ -0,0 +1,116 @@
+"""
+Idempotent schema operations for migration scripts
+
+Every helper checks the live schema first, so a migration built from these
+operations can be re-run safely against a database that already has some
+or all of its changes (for example one created by the old db.create_all()).
+"""
+
+from typing import Iterable
+
+from sqlalchemy import Column, Index, MetaData, Table, inspect, text
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.types import NullType
+
+
+def has_table(conn, table: str) -> bool:
+    """Check whether a table exists"""
+    return inspect(conn).has_table(table)
+
+
+def has_column(conn, table: str, column: str) -> bool:
+    """Check whether a table has a column"""
+    return column in {c['name'] for c in inspect(conn).get_columns(table)}
+
+
+def has_index(conn, table: str, name: str) -> bool:
+    """Check whether a table has an index with the given name"""
+    return name in {i['name'] for i in inspect(conn).get_indexes(table)}
+
+
+def create_table(conn, name: str, *columns, **kwargs) -> None:
+    """
+    Create a table (and any indexes declared on its columns) if missing
+
+    Args:
+        conn: SQLAlchemy connection inside the migration transaction
+        name: Table name
+        *columns: Column and constraint objects, as for sqlalchemy.Table
+        **kwargs: Extra sqlalchemy.Table keyword arguments
+    """
+    metadata = MetaData()
+    table = Table(name, metadata, *columns, **kwargs)
+    # Foreign keys only need the referenced table/column names to render
+    for fk in table.foreign_keys:
+        ref_table, ref_column = fk.target_fullname.rsplit('.', 2)[-2:]
+        stub = metadata.tables.get(ref_table)
+        if stub is None:
+            stub = Table(ref_table, metadata)
+        if ref_column not in stub.c:
+            stub.append_column(Column(ref_column, NullType))
+    table.create(conn, checkfirst=True)
+
+
+def rebuild_table(conn, name: str, *columns, indexes: Iterable = (), **kwargs) -> None:
+    """
+    Recreate a table with a new definition, keeping its rows
+
+    SQLite cannot alter constraints in place, so this follows the documented
+    procedure: create the new table under a temporary name, copy the shared
+    columns, drop the old table and rename. Use it from a migration with
+    ``DISABLE_FOREIGN_KEYS = True``.
+
+    Args:
+        conn: SQLAlchemy connection inside the migration transaction
+        name: Table to rebuild
+        *columns: Full new column and constraint definitions
+        indexes: (index_name, [columns], unique) tuples to recreate afterwards
+        **kwargs: Extra sqlalchemy.Table keyword arguments
+    """
+    temp_name = f'_rebuild_{name}'
+    existing = {c['name'] for c in inspect(conn).get_columns(name)}
+    conn.execute(text(f'DROP TABLE IF EXISTS {temp_name}'))
+    create_table(conn, temp_name, *columns, **kwargs)
+
+    shared = [c.name for c in columns if isinstance(c, Column) and c.name in existing]
+    column_list = ', '.join(shared)
+    conn.execute(text(f'INSERT INTO {temp_name} ({column_list}) SELECT {column_list} FROM {name}'))
+    conn.execute(text(f'DROP TABLE {name}'))
+    conn.execute(text(f'ALTER TABLE {temp_name} RENAME TO {name}'))
+
+    for index_name, index_columns, unique in indexes:
+        create_index(conn, index_name, name, index_columns, unique=unique)
+
+
+def create_model_table(conn, model) -> None:
+    """Create a Flask-SQLAlchemy model's table as currently declared, if missing"""
+    model.__table__.create(conn, checkfirst=True)
+
+
+def add_column(conn, table: str, column: Column) -> None:
+    """Add a column to an existing table if it is not there yet"""
+    if has_column(conn, table, column.name):
+        return
+    Table(table, MetaData(), column)
+    ddl = CreateColumn(column).compile(dialect=conn.dialect)
+    conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {ddl}'))
+
+
+def create_index(conn, name: str, table: str, columns: Iterable[str], unique: bool = False) -> None:
+    """Create an index on existing columns if it does not exist yet"""
+    columns = list(columns)
+    if has_index(conn, table, name):
+        return
+    stub = Table(table, MetaData(), *(Column(c, NullType) for c in columns))
+    Index(name, *(stub.c[c] for c in columns), unique=unique).create(conn)
+
+
+def drop_index(conn, name: str, table: str) -> None:
+    """Drop an index if it exists"""
+    if has_index(conn, table, name):
+        conn.execute(text(f'DROP INDEX {name}'))
+
+
+def execute(conn, sql: str, **params):
+    """Run a raw SQL statement with bound parameters"""
+    return conn.execute(text(sql), params)
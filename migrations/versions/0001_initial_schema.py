@@ -0,0 +1,35 @@
+"""
+Initial archives schema, as previously created by db.create_all()
+"""
+
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text
+
+from migrations import ops
+
+DESCRIPTION = 'Create archives, projects and project_images tables'
+
+
+def upgrade(conn):
+    ops.create_table(
+        conn, 'archives',
+        Column('id', Integer, primary_key=True),
+        Column('username', String(80), nullable=False, unique=True, index=True),
+        Column('display_name', String(200), nullable=False),
+        Column('created_at', DateTime)
+    )
+    ops.create_table(
+        conn, 'projects',
+        Column('id', Integer, primary_key=True),
+        Column('archive_id', Integer, ForeignKey('archives.id'), nullable=False),
+        Column('title', String(200), nullable=False),
+        Column('palette', Text),
+        Column('created_at', DateTime)
+    )
+    ops.create_table(
+        conn, 'project_images',
+        Column('id', Integer, primary_key=True),
+        Column('project_id', Integer, ForeignKey('projects.id'), nullable=False),
+        Column('filename', String(255), nullable=False),
+        Column('filepath', String(500), nullable=False),
+        Column('created_at', DateTime)
+    )
@@ -0,0 +1,17 @@
+"""
+Image layout settings on projects (formerly migrate_db.py)
+"""
+
+from sqlalchemy import Column, Integer, String, text
+
+from migrations import ops
+
+DESCRIPTION = 'Add image layout columns to projects'
+
+
+def upgrade(conn):
+    ops.add_column(conn, 'projects', Column('img_width', Integer, server_default=text('260')))
+    ops.add_column(conn, 'projects', Column('img_height', Integer, server_default=text('200')))
+    ops.add_column(conn, 'projects', Column('img_fit', String(20), server_default='cover'))
+    ops.add_column(conn, 'projects', Column('img_radius', Integer, server_default=text('8')))
+    ops.add_column(conn, 'projects', Column('img_gap', Integer, server_default=text('16')))
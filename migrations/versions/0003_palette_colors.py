@@ -0,0 +1,58 @@
+"""
+Normalized palette colors for indexed color search
+"""
+
+import json
+
+from sqlalchemy import Column, Float, ForeignKey, Index, Integer, text
+
+from config import Config
+from migrations import ops
+from utils.color_utils import hex_to_int, hex_to_rgb, is_hex_color, lab_bucket, rgb_to_lab
+
+DESCRIPTION = 'Create palette_colors and backfill it from projects.palette'
+
+
+def upgrade(conn):
+    ops.create_table(
+        conn, 'palette_colors',
+        Column('id', Integer, primary_key=True),
+        Column('project_id', Integer, ForeignKey('projects.id', ondelete='CASCADE'), nullable=False),
+        Column('position', Integer, nullable=False),
+        Column('rgb', Integer, nullable=False),
+        Column('lab_l', Float, nullable=False),
+        Column('lab_a', Float, nullable=False),
+        Column('lab_b', Float, nullable=False),
+        Column('bucket', Integer, nullable=False),
+        Index('ix_palette_colors_bucket', 'bucket'),
+        Index('ix_palette_colors_project_position', 'project_id', 'position')
+    )
+
+    ops.execute(conn, 'DELETE FROM palette_colors')
+    rows = []
+    for project_id, palette in conn.execute(text('SELECT id, palette FROM projects')):
+        try:
+            colors = json.loads(palette) if palette else []
+        except ValueError:
+            continue
+        if not isinstance(colors, list):
+            continue
+        colors = [c for c in colors if is_hex_color(c)]
+        for position, color in enumerate(colors):
+            lab = rgb_to_lab(*hex_to_rgb(color))
+            rows.append({
+                'project_id': project_id,
+                'position': position,
+                'rgb': hex_to_int(color),
+                'lab_l': lab[0],
+                'lab_a': lab[1],
+                'lab_b': lab[2],
+                'bucket': lab_bucket(lab, Config.PALETTE_SEARCH_CELL_SIZE)
+            })
+    if rows:
+        conn.execute(
+            text('INSERT INTO palette_colors '
+                 '(project_id, position, rgb, lab_l, lab_a, lab_b, bucket) '
+                 'VALUES (:project_id, :position, :rgb, :lab_l, :lab_a, :lab_b, :bucket)'),
+            rows
+        )
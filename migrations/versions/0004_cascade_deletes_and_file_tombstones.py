@@ -0,0 +1,51 @@
+"""
+ON DELETE CASCADE foreign keys and the file tombstone queue
+"""
+
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text, text
+
+from migrations import ops
+
+DESCRIPTION = 'Add ON DELETE CASCADE to archive foreign keys and create file_tombstones'
+
+DISABLE_FOREIGN_KEYS = True
+
+
+def upgrade(conn):
+    # Rows orphaned before foreign keys were enforced would fail the rebuild
+    ops.execute(conn, 'DELETE FROM projects WHERE archive_id NOT IN (SELECT id FROM archives)')
+    ops.execute(conn, 'DELETE FROM project_images WHERE project_id NOT IN (SELECT id FROM projects)')
+    ops.execute(conn, 'DELETE FROM palette_colors WHERE project_id NOT IN (SELECT id FROM projects)')
+
+    ops.rebuild_table(
+        conn, 'projects',
+        Column('id', Integer, primary_key=True),
+        Column('archive_id', Integer, ForeignKey('archives.id', ondelete='CASCADE'), nullable=False),
+        Column('title', String(200), nullable=False),
+        Column('palette', Text),
+        Column('img_width', Integer, server_default=text('260')),
+        Column('img_height', Integer, server_default=text('200')),
+        Column('img_fit', String(20), server_default='cover'),
+        Column('img_radius', Integer, server_default=text('8')),
+        Column('img_gap', Integer, server_default=text('16')),
+        Column('created_at', DateTime),
+        indexes=[('ix_projects_archive_id', ['archive_id'], False)]
+    )
+    ops.rebuild_table(
+        conn, 'project_images',
+        Column('id', Integer, primary_key=True),
+        Column('project_id', Integer, ForeignKey('projects.id', ondelete='CASCADE'), nullable=False),
+        Column('filename', String(255), nullable=False),
+        Column('filepath', String(500), nullable=False),
+        Column('created_at', DateTime),
+        indexes=[('ix_project_images_project_id', ['project_id'], False)]
+    )
+
+    ops.create_table(
+        conn, 'file_tombstones',
+        Column('id', Integer, primary_key=True),
+        Column('path', String(500), nullable=False),
+        Column('attempts', Integer, nullable=False, server_default=text('0')),
+        Column('last_error', Text),
+        Column('created_at', DateTime)
+    )
@@ -0,0 +1,65 @@
+"""
+Index of public project pages stored as JSON files
+
+The rows are built here, not by utils.project_store, so that this
+migration keeps doing what it did when it was written.
+"""
+
+import json
+import os
+
+from sqlalchemy import Column, Float, Index, Integer, String, Text, text
+
+from config import Config
+from migrations import ops
+
+DESCRIPTION = 'Create project_pages and index the existing project JSON files'
+
+PREVIEW_COLORS = 5
+
+
+def _index_rows():
+    if not os.path.isdir(Config.PROJECTS_FOLDER):
+        return
+    for entry in os.scandir(Config.PROJECTS_FOLDER):
+        if not entry.name.endswith('.json') or not entry.is_file():
+            continue
+        try:
+            with open(entry.path, 'r', encoding='utf-8') as f:
+                project_data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if not isinstance(project_data, dict):
+            continue
+        project_id = entry.name[:-len('.json')]
+        palettes = project_data.get('palettes') or []
+        first = palettes[0] if palettes and isinstance(palettes[0], list) else []
+        stat = entry.stat()
+        yield {
+            'id': project_id,
+            'title': str(project_data.get('title') or project_id)[:200],
+            'description': str(project_data.get('description') or ''),
+            'preview': json.dumps(first[:PREVIEW_COLORS]),
+            'mtime': stat.st_mtime,
+            'size': stat.st_size
+        }
+
+
+def upgrade(conn):
+    ops.create_table(
+        conn, 'project_pages',
+        Column('id', String(200), primary_key=True),
+        Column('title', String(200), nullable=False),
+        Column('description', Text),
+        Column('preview', Text),
+        Column('mtime', Float, nullable=False),
+        Column('size', Integer, nullable=False),
+        Index('ix_project_pages_mtime', 'mtime')
+    )
+    rows = list(_index_rows())
+    ops.execute(conn, 'DELETE FROM project_pages')
+    if rows:
+        conn.execute(text(
+            'INSERT INTO project_pages (id, title, description, preview, mtime, size) '
+            'VALUES (:id, :title, :description, :preview, :mtime, :size)'
+        ), rows)
@@ -0,0 +1,111 @@
+"""
+Move inlined data-URL assets out of project JSON documents
+
+Self-contained copy of the asset store logic as it was when this
+migration was written, so later changes to utils.asset_store or
+utils.project_store don't change what it does.
+"""
+
+import base64
+import binascii
+import hashlib
+import json
+import os
+import tempfile
+from urllib.parse import unquote_to_bytes
+
+from flask import current_app, has_app_context
+
+from config import Config
+from migrations import ops
+
+DESCRIPTION = 'Rewrite project JSON files to reference externalized assets'
+
+ASSET_URL_PREFIX = '/projects/assets/'
+ASSET_FIELDS = ('logos', 'favicons', 'graphics')
+ASSET_EXTENSIONS = {
+    'image/png': 'png',
+    'image/jpeg': 'jpg',
+    'image/gif': 'gif',
+    'image/webp': 'webp',
+    'image/svg+xml': 'svg',
+    'image/x-icon': 'ico',
+    'image/vnd.microsoft.icon': 'ico',
+    'image/tiff': 'tiff'
+}
+
+
+def _write(path, payload: bytes) -> None:
+    fd, temp_path = tempfile.mkstemp(prefix=f'.{os.path.basename(path)}.', suffix='.tmp',
+                                     dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _externalize(value, assets_folder: str):
+    if not isinstance(value, str) or not value.startswith('data:') or ',' not in value:
+        return value
+    header, payload = value[5:].split(',', 1)
+    params = header.split(';')
+    mime = (params[0] or 'text/plain').strip().lower()
+    if mime not in ASSET_EXTENSIONS:
+        return value
+    try:
+        content = base64.b64decode(payload) if 'base64' in params[1:] else unquote_to_bytes(payload)
+    except (binascii.Error, ValueError):
+        return value
+    if not content:
+        return value
+    filename = f"{hashlib.sha256(content).hexdigest()}.{ASSET_EXTENSIONS[mime]}"
+    path = os.path.join(assets_folder, filename)
+    if not os.path.exists(path):
+        _write(path, content)
+    return ASSET_URL_PREFIX + filename
+
+
+def upgrade(conn):
+    config = current_app.config if has_app_context() else vars(Config)
+    projects_folder = config['PROJECTS_FOLDER']
+    assets_folder = config.get('PROJECT_ASSETS_FOLDER') or \
+        os.path.join(config['UPLOAD_FOLDER'], '.project_assets')
+    if not os.path.isdir(projects_folder):
+        return
+    os.makedirs(assets_folder, exist_ok=True)
+
+    for entry in os.scandir(projects_folder):
+        if not entry.name.endswith('.json') or not entry.is_file():
+            continue
+        try:
+            with open(entry.path, 'r', encoding='utf-8') as f:
+                project_data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if not isinstance(project_data, dict):
+            continue
+
+        changed = False
+        for field in ASSET_FIELDS:
+            values = project_data.get(field)
+            if not isinstance(values, list):
+                continue
+            new_values = [_externalize(v, assets_folder) for v in values]
+            if new_values != values:
+                project_data[field] = new_values
+                changed = True
+        if not changed:
+            continue
+
+        _write(entry.path, json.dumps(project_data, separators=(',', ':'),
+                                      ensure_ascii=False).encode('utf-8'))
+        # The document's size and mtime are part of its index entry
+        stat = os.stat(entry.path)
+        ops.execute(conn, 'UPDATE project_pages SET mtime = :mtime, size = :size WHERE id = :id',
+                    mtime=stat.st_mtime, size=stat.st_size, id=entry.name[:-len('.json')])
@@ -0,0 +1,14 @@
+"""
+Version counter on archives for page caching
+"""
+
+from sqlalchemy import Column, DateTime, Integer, text
+
+from migrations import ops
+
+DESCRIPTION = 'Add version and updated_at columns to archives'
+
+
+def upgrade(conn):
+    ops.add_column(conn, 'archives', Column('version', Integer, nullable=False, server_default=text('1')))
+    ops.add_column(conn, 'archives', Column('updated_at', DateTime))
@@ -0,0 +1,31 @@
+"""
+Move project page assets out of the publicly served uploads folder
+"""
+
+import os
+
+from flask import current_app, has_app_context
+
+from config import Config
+
+DESCRIPTION = 'Move project assets from uploads/project_assets to the private asset folder'
+
+
+def upgrade(conn):
+    config = current_app.config if has_app_context() else vars(Config)
+    upload_folder = config['UPLOAD_FOLDER']
+    source = os.path.join(upload_folder, 'project_assets')
+    target = config.get('PROJECT_ASSETS_FOLDER') or os.path.join(upload_folder, '.project_assets')
+    if not os.path.isdir(source) or os.path.abspath(source) == os.path.abspath(target):
+        return
+    os.makedirs(target, exist_ok=True)
+    for entry in os.scandir(source):
+        destination = os.path.join(target, entry.name)
+        if entry.is_file() and not os.path.exists(destination):
+            os.replace(entry.path, destination)
+    # Anything left is a duplicate of a content-addressed file already moved
+    for entry in os.scandir(source):
+        if entry.is_file():
+            os.remove(entry.path)
+    if not any(os.scandir(source)):
+        os.rmdir(source)
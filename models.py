@@ -4,6 +4,8 @@ Database models for User Archives
 
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from config import Config
+from utils.color_utils import hex_to_int, int_to_hex, is_hex_color, hex_to_rgb, rgb_to_lab, lab_bucket
 
 db = SQLAlchemy()
 
@@ -16,8 +18,12 @@ class Archive(db.Model):
     username = db.Column(db.String(80), unique=True, nullable=False, index=True)
     display_name = db.Column(db.String(200), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Bumped on every change to the archive or its projects; keys the page cache
+    version = db.Column(db.Integer, nullable=False, default=1, server_default=db.text('1'))
+    updated_at = db.Column(db.DateTime)
     
-    projects = db.relationship('Project', backref='archive', lazy=True, cascade='all, delete-orphan')
+    projects = db.relationship('Project', backref='archive', lazy=True,
+                               cascade='all, delete-orphan', passive_deletes=True)
     
     def to_dict(self):
         return {
@@ -34,7 +40,8 @@ class Project(db.Model):
     __tablename__ = 'projects'
     
     id = db.Column(db.Integer, primary_key=True)
-    archive_id = db.Column(db.Integer, db.ForeignKey('archives.id'), nullable=False)
+    archive_id = db.Column(db.Integer, db.ForeignKey('archives.id', ondelete='CASCADE'),
+                           nullable=False, index=True)
     title = db.Column(db.String(200), nullable=False)
     palette = db.Column(db.Text)  # JSON string of hex colors
     img_width = db.Column(db.Integer, default=260)
@@ -44,15 +51,30 @@ class Project(db.Model):
     img_gap = db.Column(db.Integer, default=16)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    images = db.relationship('ProjectImage', backref='project', lazy=True, cascade='all, delete-orphan')
+    images = db.relationship('ProjectImage', backref='project', lazy=True,
+                             cascade='all, delete-orphan', passive_deletes=True)
+    palette_colors = db.relationship('PaletteColor', backref='project', lazy=True,
+                                     cascade='all, delete-orphan', passive_deletes=True,
+                                     order_by='PaletteColor.position')
+    
+    def set_palette(self, colors):
+        """
+        Replace the palette, keeping the JSON column and palette_colors in sync
+        
+        The JSON column keeps the colors exactly as given; only the valid hex
+        colors among them are indexed in palette_colors for color search.
+        """
+        import json
+        self.palette = json.dumps(colors)
+        self.palette_colors = [PaletteColor.from_hex(color, position)
+                               for position, color in enumerate(c for c in colors if is_hex_color(c))]
     
     def to_dict(self):
         import json
-        palette_list = json.loads(self.palette) if self.palette else []
         return {
             'id': self.id,
             'title': self.title,
-            'palette': palette_list,
+            'palette': json.loads(self.palette) if self.palette else [],
             'img_width': self.img_width,
             'img_height': self.img_height,
             'img_fit': self.img_fit,
@@ -63,12 +85,50 @@ class Project(db.Model):
         }
 
 
+class PaletteColor(db.Model):
+    """A single palette color of a project, normalized for color search"""
+    __tablename__ = 'palette_colors'
+    __table_args__ = (
+        db.Index('ix_palette_colors_project_position', 'project_id', 'position'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id', ondelete='CASCADE'), nullable=False)
+    position = db.Column(db.Integer, nullable=False)
+    rgb = db.Column(db.Integer, nullable=False)  # packed 0xRRGGBB
+    lab_l = db.Column(db.Float, nullable=False)
+    lab_a = db.Column(db.Float, nullable=False)
+    lab_b = db.Column(db.Float, nullable=False)
+    bucket = db.Column(db.Integer, nullable=False, index=True)  # quantized Lab cell
+    
+    @classmethod
+    def from_hex(cls, hex_color, position):
+        lab = rgb_to_lab(*hex_to_rgb(hex_color))
+        return cls(
+            position=position,
+            rgb=hex_to_int(hex_color),
+            lab_l=lab[0],
+            lab_a=lab[1],
+            lab_b=lab[2],
+            bucket=lab_bucket(lab, Config.PALETTE_SEARCH_CELL_SIZE)
+        )
+    
+    @property
+    def hex(self):
+        return int_to_hex(self.rgb)
+    
+    @property
+    def lab(self):
+        return (self.lab_l, self.lab_a, self.lab_b)
+
+
 class ProjectImage(db.Model):
     """Image associated with a project"""
     __tablename__ = 'project_images'
     
     id = db.Column(db.Integer, primary_key=True)
-    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id', ondelete='CASCADE'),
+                           nullable=False, index=True)
     filename = db.Column(db.String(255), nullable=False)
     filepath = db.Column(db.String(500), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -80,3 +140,36 @@ class ProjectImage(db.Model):
             'filepath': self.filepath
         }
 
+
+class FileTombstone(db.Model):
+    """A file or directory queued for removal by the background reaper"""
+    __tablename__ = 'file_tombstones'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    path = db.Column(db.String(500), nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class ProjectPage(db.Model):
+    """Index entry for a public project page stored as projects/<id>.json"""
+    __tablename__ = 'project_pages'
+    
+    id = db.Column(db.String(200), primary_key=True)
+    title = db.Column(db.String(200), nullable=False)
+    description = db.Column(db.Text)
+    preview = db.Column(db.Text)  # JSON list of the first palette's leading colors
+    mtime = db.Column(db.Float, nullable=False, index=True)
+    size = db.Column(db.Integer, nullable=False)
+    
+    def to_dict(self):
+        import json
+        preview = json.loads(self.preview) if self.preview else []
+        return {
+            'id': self.id,
+            'title': self.title,
+            'description': self.description or '',
+            'palettes': [preview] if preview else []
+        }
+
@@ -6,6 +6,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const colorInput = document.getElementById('bg-color');
     const toleranceSlider = document.getElementById('tolerance');
     const toleranceValue = document.getElementById('tolerance-value');
+    const autoDetect = document.getElementById('auto-detect');
     
     // Sync color picker and text input
     colorPicker.addEventListener('input', (e) => {
@@ -18,6 +19,13 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
     
+    // Auto-detection replaces the manual color and tolerance
+    autoDetect.addEventListener('change', () => {
+        colorPicker.disabled = autoDetect.checked;
+        colorInput.disabled = autoDetect.checked;
+        toleranceSlider.disabled = autoDetect.checked;
+    });
+    
     // Update tolerance value display
     toleranceSlider.addEventListener('input', (e) => {
         toleranceValue.textContent = e.target.value;
@@ -34,18 +42,25 @@ document.addEventListener('DOMContentLoaded', () => {
             return;
         }
         
-        // Validate color
-        const bgColor = colorInput.value.trim();
-        if (!/^#[0-9A-Fa-f]{6}$/i.test(bgColor)) {
-            showError('Please enter a valid hex color (e.g., #FFFFFF)');
-            return;
+        if (autoDetect.checked) {
+            formData.set('background_color', 'auto');
+            formData.set('tolerance', 'auto');
+        } else {
+            // Validate color
+            const bgColor = colorInput.value.trim();
+            if (!/^#[0-9A-Fa-f]{6}$/i.test(bgColor)) {
+                showError('Please enter a valid hex color (e.g., #FFFFFF)');
+                return;
+            }
         }
         
         // Hide previous results
         const resultSection = document.getElementById('result-section');
         const errorSection = document.getElementById('error-section');
+        const detected = document.getElementById('detected-background');
         resultSection.style.display = 'none';
         errorSection.style.display = 'none';
+        detected.style.display = 'none';
         
         // Show loading state
         const submitBtn = form.querySelector('button[type="submit"]');
@@ -63,6 +78,16 @@ document.addEventListener('DOMContentLoaded', () => {
                     throw new Error(data.error || 'Processing failed');
                 });
             }
+            if (autoDetect.checked) {
+                const color = response.headers.get('X-Background-Color');
+                const tolerance = response.headers.get('X-Background-Tolerance');
+                detected.textContent = `Detected background ${color} (tolerance ${tolerance})`;
+                detected.style.display = 'block';
+                colorInput.value = color;
+                colorPicker.value = color;
+                toleranceSlider.value = tolerance;
+                toleranceValue.textContent = tolerance;
+            }
             return response.blob();
         })
         .then(blob => {
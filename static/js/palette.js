@@ -2,6 +2,7 @@
 
 let currentPalette = [];
 let lockedIndices = [];
+let currentAnnotations = [];
 let currentSeed = Math.floor(Math.random() * 1000000);
 
 // Initialize
@@ -30,6 +31,9 @@ function setupEventListeners() {
     // Add color input button
     document.getElementById('add-color-input').addEventListener('click', addColorInput);
     
+    // Extract from image button
+    document.getElementById('extract-btn').addEventListener('click', extractPalette);
+    
     // Copy all hex codes button
     const copyAllBtn = document.getElementById('copy-all-hex-btn');
     if (copyAllBtn) {
@@ -100,7 +104,8 @@ function generatePalette() {
             modern_classic: modernClassic,
             adjectives: adjectives,
             manual_colors: manualColors,
-            seed: currentSeed
+            seed: currentSeed,
+            annotate: true
         })
     })
     .then(response => response.json())
@@ -108,6 +113,7 @@ function generatePalette() {
         if (data.success) {
             currentPalette = data.palette;
             lockedIndices = [];
+            currentAnnotations = data.annotations || [];
             displayPalette(data.palette);
             document.getElementById('regenerate-btn').disabled = false;
             document.getElementById('expand-btn').disabled = false;
@@ -121,6 +127,44 @@ function generatePalette() {
     });
 }
 
+function extractPalette() {
+    const fileInput = document.getElementById('extract-image');
+    if (!fileInput.files.length) {
+        alert('Please choose an image to extract colors from');
+        return;
+    }
+    
+    currentSeed = Math.floor(Math.random() * 1000000);
+    
+    const formData = new FormData();
+    formData.append('file', fileInput.files[0]);
+    formData.append('num_colors', document.getElementById('num-colors').value);
+    formData.append('seed', currentSeed);
+    formData.append('annotate', 'true');
+    
+    fetch('/palette/extract', {
+        method: 'POST',
+        body: formData
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            currentPalette = data.palette;
+            lockedIndices = [];
+            currentAnnotations = data.annotations || [];
+            displayPalette(data.palette);
+            document.getElementById('regenerate-btn').disabled = false;
+            document.getElementById('expand-btn').disabled = false;
+        } else {
+            alert('Error extracting palette: ' + data.error);
+        }
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        alert('Failed to extract palette');
+    });
+}
+
 function regenerateUnlocked() {
     if (currentPalette.length === 0) return;
     
@@ -141,13 +185,15 @@ function regenerateUnlocked() {
             formal_playful: formalPlayful,
             modern_classic: modernClassic,
             adjectives: adjectives,
-            seed: currentSeed
+            seed: currentSeed,
+            annotate: true
         })
     })
     .then(response => response.json())
     .then(data => {
         if (data.success) {
             currentPalette = data.palette;
+            currentAnnotations = data.annotations || [];
             displayPalette(data.palette);
         } else {
             alert('Error regenerating palette: ' + data.error);
@@ -180,13 +226,15 @@ function expandPalette() {
             formal_playful: formalPlayful,
             modern_classic: modernClassic,
             adjectives: adjectives,
-            seed: currentSeed
+            seed: currentSeed,
+            annotate: true
         })
     })
     .then(response => response.json())
     .then(data => {
         if (data.success) {
             currentPalette = data.palette;
+            currentAnnotations = data.annotations || [];
             displayPalette(data.palette);
         } else {
             alert('Error expanding palette: ' + data.error);
@@ -216,11 +264,16 @@ function displayPalette(palette) {
         colorItem.className = 'color-item';
         
         const isLocked = lockedIndices.includes(index);
+        const annotation = currentAnnotations[index];
+        const nameLabel = annotation
+            ? `<span class="color-name" title="Closest brand color: ${annotation.brand} (${annotation.brand_hex})">${annotation.name}</span>`
+            : '';
         
         colorItem.innerHTML = `
             <div class="color-swatch" style="background-color: ${color};"></div>
             <div class="color-info">
                 <span class="color-hex">${color}</span>
+                ${nameLabel}
                 <div class="color-actions">
                     <button class="lock-btn ${isLocked ? 'locked' : ''}" data-index="${index}" title="${isLocked ? 'Unlock' : 'Lock'}">
                         ${isLocked ? '🔒' : '🔓'}
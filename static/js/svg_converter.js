@@ -36,6 +36,7 @@ document.addEventListener('DOMContentLoaded', () => {
                     throw new Error(data.error || 'Conversion failed');
                 });
             }
+            showOutputSize(response.headers);
             return response.blob();
         })
         .then(blob => {
@@ -61,6 +62,17 @@ document.addEventListener('DOMContentLoaded', () => {
     });
 });
 
+function showOutputSize(headers) {
+    const size = headers.get('X-Output-Size');
+    let text = size ? `Output size: ${size.replace('x', ' × ')} px` : '';
+    if (headers.get('X-Output-Clamped') === 'true') {
+        text += ' (scaled down to fit the maximum output size)';
+    } else if (headers.get('X-Output-Tiled') === 'true') {
+        text += ' (rendered in tiles)';
+    }
+    document.getElementById('result-size').textContent = text;
+}
+
 function showError(message) {
     const errorSection = document.getElementById('error-section');
     const errorMessage = document.getElementById('error-message');
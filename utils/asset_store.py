@@ -0,0 +1,106 @@
+"""
+Content-addressed blob store for project page assets
+
+Logos, favicons and graphics posted as data URLs are decoded once at save
+time and written to the app's PROJECT_ASSETS_FOLDER under the SHA-256 of
+their content, so project documents only carry short URLs. Assets are
+served only by projects.project_asset, which adds a restrictive CSP.
+"""
+
+import base64
+import binascii
+import hashlib
+import os
+from typing import Optional, Tuple
+from urllib.parse import unquote_to_bytes
+
+from flask import current_app
+
+ASSET_URL_PREFIX = '/projects/assets/'
+ASSET_FIELDS = ('logos', 'favicons', 'graphics')
+
+# Only image types are externalized; anything else stays inline
+ASSET_EXTENSIONS = {
+    'image/png': 'png',
+    'image/jpeg': 'jpg',
+    'image/gif': 'gif',
+    'image/webp': 'webp',
+    'image/svg+xml': 'svg',
+    'image/x-icon': 'ico',
+    'image/vnd.microsoft.icon': 'ico',
+    'image/tiff': 'tiff'
+}
+
+
+def parse_data_url(value: str) -> Optional[Tuple[str, bytes]]:
+    """
+    Decode a ``data:`` URL
+
+    Returns:
+        (mime type, content bytes), or None if ``value`` is not a valid
+        data URL
+    """
+    if not isinstance(value, str) or not value.startswith('data:') or ',' not in value:
+        return None
+    header, payload = value[5:].split(',', 1)
+    params = header.split(';')
+    mime = (params[0] or 'text/plain').strip().lower()
+    try:
+        if 'base64' in params[1:]:
+            return mime, base64.b64decode(payload, validate=False)
+        return mime, unquote_to_bytes(payload)
+    except (binascii.Error, ValueError):
+        return None
+
+
+def assets_folder() -> str:
+    """Directory holding stored assets (needs an app context)"""
+    return current_app.config['PROJECT_ASSETS_FOLDER']
+
+
+def store_asset(content: bytes, mime: str) -> str:
+    """
+    Write an asset to the blob store if it is not there yet
+
+    Returns:
+        The asset's file name (``<sha256>.<ext>``)
+    """
+    from utils.project_store import atomic_write
+
+    digest = hashlib.sha256(content).hexdigest()
+    filename = f"{digest}.{ASSET_EXTENSIONS[mime]}"
+    folder = assets_folder()
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, filename)
+    if not os.path.exists(path):
+        atomic_write(path, content)
+    return filename
+
+
+def externalize_asset(value):
+    """Replace an image data URL with the URL of its stored copy"""
+    parsed = parse_data_url(value)
+    if parsed is None or parsed[0] not in ASSET_EXTENSIONS or not parsed[1]:
+        return value
+    mime, content = parsed
+    return ASSET_URL_PREFIX + store_asset(content, mime)
+
+
+def externalize_assets(project_data: dict) -> Tuple[dict, bool]:
+    """
+    Move inlined assets of a project document into the blob store
+
+    Returns:
+        (updated document, whether anything changed)
+    """
+    updated = dict(project_data)
+    changed = False
+    for field in ASSET_FIELDS:
+        values = project_data.get(field)
+        if not isinstance(values, list):
+            continue
+        new_values = [externalize_asset(v) for v in values]
+        if new_values != values:
+            updated[field] = new_values
+            changed = True
+    return updated, changed
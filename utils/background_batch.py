@@ -0,0 +1,309 @@
+"""
+Batch background removal
+
+Images are processed by a pool of worker processes (Pillow work holds the
+GIL for the per-pixel mask), with only a bounded number of images in flight
+so memory use doesn't grow with the batch size. Inputs and outputs live in
+a scratch directory on disk; the output ZIP is produced entry by entry as
+results arrive, so the response can start streaming after the first image.
+"""
+
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterator, List, NamedTuple, Optional
+
+from werkzeug.utils import secure_filename
+
+from config import Config
+
+CHUNK_SIZE = 1024 * 1024
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class BatchItem(NamedTuple):
+    """One input image of a batch, already on disk"""
+    filename: str
+    path: str
+    error: Optional[str] = None  # Set when the input was rejected up front
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                # Spawned (not forked) workers: the web process runs threads
+                _executor = ProcessPoolExecutor(
+                    max_workers=Config.BACKGROUND_BATCH_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+    return _executor
+
+
+def remove_background_file(input_path: str, output_path: str, file_ext: str,
+                           background_color: str, tolerance: Optional[int],
+                           padding: Optional[int] = None, profile: Optional[str] = None,
+                           tiff_compression: Optional[str] = None) -> dict:
+    """
+    Remove the background of one image file and write the result
+
+    Runs in a worker process, so it takes and returns only plain values.
+
+    Returns:
+        The background color and tolerance applied (and the border coverage
+        when the color was auto-detected); with a ``padding``, transparent
+        margins are trimmed and the crop box and original size are included
+    """
+    from utils.image_utils import remove_background_color, save_background_removed, trim_transparent
+
+    img = remove_background_color(input_path, background_color, tolerance)
+    crop = None
+    if padding is not None:
+        original_size = img.size
+        img, box = trim_transparent(img, padding)
+        crop = {'crop_box': list(box), 'original_size': list(original_size)}
+    with open(output_path, 'wb') as f:
+        save_background_removed(img, f, file_ext, profile, tiff_compression)
+    result = {
+        'background_color': img.info['background_color'],
+        'tolerance': img.info['background_tolerance']
+    }
+    if 'background_coverage' in img.info:
+        result['coverage'] = round(img.info['background_coverage'], 3)
+    if crop:
+        result.update(crop)
+    return result
+
+
+class _ZipStream:
+    """Write-only buffer for zipfile; drained between entries"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _unique_name(name: str, used: set) -> str:
+    base, ext = os.path.splitext(name)
+    candidate, n = name, 1
+    while candidate in used:
+        n += 1
+        candidate = f'{base}-{n}{ext}'
+    used.add(candidate)
+    return candidate
+
+
+def collect_inputs(files, scratch_dir: str, allowed_file) -> List[BatchItem]:
+    """
+    Save uploaded images to the scratch directory, expanding ZIP archives
+
+    Unsupported or oversized entries are kept as items with an error, so
+    they show up in the batch manifest instead of failing the request.
+    Limits on the number of files and on the total uncompressed size of
+    ZIP members are checked before anything more is written to disk.
+
+    Args:
+        files: FileStorage objects from ``request.files.getlist``
+        scratch_dir: Directory for the batch's files
+        allowed_file: Predicate on an image filename
+    """
+    items = []
+    extracted = 0
+
+    def append(item):
+        if len(items) >= Config.BACKGROUND_BATCH_MAX_FILES:
+            raise ValueError(f'Batch exceeds {Config.BACKGROUND_BATCH_MAX_FILES} files')
+        items.append(item)
+
+    def add(filename):
+        path = os.path.join(scratch_dir, 'in', f'{len(items):05d}_{filename}')
+        append(BatchItem(filename, path))
+        return path
+
+    os.makedirs(os.path.join(scratch_dir, 'in'), exist_ok=True)
+    for file in files:
+        if not file or not file.filename:
+            continue
+        filename = secure_filename(file.filename) or 'upload'
+
+        if filename.lower().endswith('.zip'):
+            try:
+                with zipfile.ZipFile(file.stream) as archive:
+                    for member in archive.infolist():
+                        name = secure_filename(os.path.basename(member.filename))
+                        if member.is_dir() or not name or member.filename.startswith('__MACOSX/'):
+                            continue
+                        if not allowed_file(name):
+                            append(BatchItem(name, '', 'Invalid file type'))
+                        elif member.file_size > Config.MAX_UPLOAD_FILE_SIZE:
+                            append(BatchItem(name, '', 'File too large'))
+                        else:
+                            # zipfile stops reading a member at its declared size
+                            extracted += member.file_size
+                            if extracted > Config.BACKGROUND_BATCH_MAX_EXTRACTED_BYTES:
+                                raise ValueError('ZIP contents exceed '
+                                                 f'{Config.BACKGROUND_BATCH_MAX_EXTRACTED_BYTES} bytes')
+                            with archive.open(member) as src, open(add(name), 'wb') as dst:
+                                shutil.copyfileobj(src, dst, CHUNK_SIZE)
+            except zipfile.BadZipFile:
+                append(BatchItem(filename, '', 'Invalid ZIP archive'))
+        elif allowed_file(filename):
+            file.save(add(filename))
+        else:
+            append(BatchItem(filename, '', 'Invalid file type'))
+    return items
+
+
+def _discard_executor(executor: ProcessPoolExecutor) -> None:
+    """Forget a pool whose worker died so the next batch starts a fresh one"""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _submit(*args) -> Future:
+    if Config.BACKGROUND_BATCH_WORKERS <= 0:
+        # Inline mode, e.g. for debugging
+        future = Future()
+        try:
+            future.set_result(remove_background_file(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    executor = _get_executor()
+    try:
+        return executor.submit(remove_background_file, *args)
+    except BrokenProcessPool:
+        _discard_executor(executor)
+        return _get_executor().submit(remove_background_file, *args)
+
+
+def _results(items: List[BatchItem], scratch_dir: str, background_color: str,
+             tolerance: Optional[int], padding: Optional[int], profile: Optional[str],
+             tiff_compression: Optional[str]) -> Iterator[tuple]:
+    """
+    Process items in order with at most BACKGROUND_BATCH_IN_FLIGHT images queued
+
+    Yields:
+        (item, output filename, output path, result dict or None, error or None)
+    """
+    from utils.image_utils import background_output_name
+
+    out_dir = os.path.join(scratch_dir, 'out')
+    os.makedirs(out_dir, exist_ok=True)
+    pending = deque()
+    queue = iter(enumerate(items))
+
+    def submit_next() -> None:
+        for index, item in queue:
+            output_name, file_ext = background_output_name(item.filename)
+            output_path = os.path.join(out_dir, f'{index:05d}.{file_ext}')
+            future = None
+            if not item.error:
+                future = _submit(item.path, output_path, file_ext, background_color,
+                                 tolerance, padding, profile, tiff_compression)
+            pending.append((item, output_name, output_path, future))
+            return
+
+    try:
+        for _ in range(max(1, Config.BACKGROUND_BATCH_IN_FLIGHT)):
+            submit_next()
+
+        while pending:
+            item, output_name, output_path, future = pending.popleft()
+            result, error = None, item.error
+            if future is not None:
+                try:
+                    result = future.result()
+                except BrokenProcessPool as e:
+                    # The pool is replaced on the next submit
+                    error = f'Worker process failed: {e}'
+                except Exception as e:
+                    error = str(e).replace(item.path, item.filename)
+            # Inputs are only needed until their image is processed
+            if item.path and os.path.exists(item.path):
+                os.remove(item.path)
+            submit_next()
+            yield item, output_name, output_path if error is None else None, result, error
+    finally:
+        # Stream closed early (client went away): drop work not yet started
+        for _, _, _, future in pending:
+            if future is not None:
+                future.cancel()
+
+
+def stream_batch_zip(items: List[BatchItem], scratch_dir: str, background_color: str,
+                     tolerance: Optional[int], padding: Optional[int] = None,
+                     profile: Optional[str] = None,
+                     tiff_compression: Optional[str] = None) -> Iterator[bytes]:
+    """
+    Remove backgrounds and yield the output ZIP in chunks
+
+    Each processed image becomes one entry (stored, since PNG and TIFF are
+    already compressed); ``manifest.json`` at the end lists every input with
+    its output name and applied settings, or the error that skipped it.
+    With a ``padding``, transparent margins are trimmed (see trim_transparent);
+    ``profile`` and ``tiff_compression`` select the encoding (see encode_image).
+    The scratch directory is removed when the stream ends or is closed; a
+    stream closed before it started doesn't run at all, so callers should
+    also remove it when the response closes.
+    """
+    stream = _ZipStream()
+    manifest, used = [], {'manifest.json'}
+    try:
+        with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED) as archive:
+            for item, output_name, output_path, result, error in _results(
+                    items, scratch_dir, background_color, tolerance, padding,
+                    profile, tiff_compression):
+                if error is not None:
+                    manifest.append({'file': item.filename, 'error': error})
+                    continue
+                arcname = _unique_name(output_name, used)
+                with open(output_path, 'rb') as src, \
+                        archive.open(arcname, 'w', force_zip64=True) as dst:
+                    while True:
+                        chunk = src.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        dst.write(chunk)
+                        yield stream.drain()
+                os.remove(output_path)
+                manifest.append({'file': item.filename, 'output': arcname, **result})
+                yield stream.drain()
+
+            archive.writestr('manifest.json', json.dumps(manifest, indent=2),
+                             compress_type=zipfile.ZIP_DEFLATED)
+        yield stream.drain()
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+
+def new_scratch_dir() -> str:
+    """Private working directory for one batch under the upload folder"""
+    parent = os.path.join(Config.UPLOAD_FOLDER, '.batches')
+    os.makedirs(parent, exist_ok=True)
+    return tempfile.mkdtemp(prefix='bg-', dir=parent)
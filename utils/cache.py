@@ -0,0 +1,443 @@
+"""
+Namespaced caches with pluggable backends
+
+Every cache is a namespace ('pages', 'palette', 'svg', 'simulation', ...)
+configured in Config.CACHE_NAMESPACES and served by one of two backends:
+
+- ``memory``: a per-process LRU; fastest, but duplicated in every worker and
+  lost on restart.
+- ``sqlite``: a single SQLite file (Config.CACHE_PATH) shared by all workers
+  on the host. Reads go through SQLite's memory-mapped I/O, writes use WAL so
+  readers never wait, and entries survive restarts. Eviction is
+  least-recently-used per namespace.
+
+Config.CACHE_BACKEND selects the default backend; a namespace can override
+it with a ``backend`` key. Values must be picklable. Callers build keys with
+:func:`cache_key` and use :func:`get_cache` to obtain a namespace.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Type
+
+from config import Config
+
+_MISSING = object()
+
+# Hits refresh an entry's LRU position at most this often (seconds), so hot
+# reads on the shared backend don't each turn into a write
+TOUCH_INTERVAL = 5.0
+
+
+def cache_key(*parts) -> str:
+    """Stable key for a combination of JSON-serializable parts"""
+    encoded = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def _cost(value) -> int:
+    """Approximate memory cost of a cached value in bytes"""
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    # Objects whose size getsizeof can't see report their own estimate
+    cost = getattr(value, 'cache_cost', None)
+    if cost is not None:
+        return cost
+    return sys.getsizeof(value)
+
+
+class Cache(ABC):
+    """
+    Base class for a namespace's cache
+
+    Subclasses implement ``_get``, ``_set``, ``delete``, ``clear`` and
+    ``_size``; hit, miss and eviction counters are kept per process.
+    """
+
+    backend = None
+
+    def __init__(self, namespace: str, max_entries: int, max_bytes: int,
+                 max_item_bytes: Optional[int] = None):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_item_bytes = min(max_item_bytes or max_bytes, max_bytes)
+        self._counter_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str, default=None):
+        """Return a cached value, or ``default`` on a miss"""
+        value = self._get(key)
+        self._record(value is not _MISSING)
+        return default if value is _MISSING else value
+
+    def set(self, key: str, value) -> None:
+        """Store a value; values larger than max_item_bytes are skipped"""
+        self._set(key, value)
+
+    def get_or_set(self, key: str, compute: Callable[[], Any]):
+        """Return a cached value, computing and storing it on a miss"""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Drop an entry if present"""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Drop every entry of the namespace"""
+
+    @abstractmethod
+    def _get(self, key: str):
+        """The stored value, or _MISSING"""
+
+    @abstractmethod
+    def _set(self, key: str, value) -> None:
+        """Store a value, evicting as needed"""
+
+    @abstractmethod
+    def _size(self):
+        """(entries, bytes) currently stored"""
+
+    def _record(self, hit: bool) -> None:
+        with self._counter_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _evicted(self, count: int) -> None:
+        with self._counter_lock:
+            self.evictions += count
+
+    def stats(self) -> dict:
+        """Size, limits and this process's hit, miss and eviction counters"""
+        entries, size = self._size()
+        with self._counter_lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': self.backend,
+                'entries': entries,
+                'bytes': size,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0
+            }
+
+
+class MemoryCache(Cache):
+    """Per-process LRU bounded by entry count and approximate memory"""
+
+    backend = 'memory'
+
+    def __init__(self, namespace: str, max_entries: int, max_bytes: int,
+                 max_item_bytes: Optional[int] = None):
+        super().__init__(namespace, max_entries, max_bytes, max_item_bytes)
+        self._entries = OrderedDict()  # key -> (value, cost)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def _set(self, key: str, value) -> None:
+        cost = _cost(value)
+        evicted = 0
+        with self._lock:
+            self._discard(key)
+            if cost > self.max_item_bytes:
+                return
+            self._entries[key] = (value, cost)
+            self._bytes += cost
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_cost) = self._entries.popitem(last=False)
+                self._bytes -= evicted_cost
+                evicted += 1
+        if evicted:
+            self._evicted(evicted)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._discard(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _discard(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def _size(self):
+        with self._lock:
+            return len(self._entries), self._bytes
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS ix_cache_entries_lru ON cache_entries (namespace, accessed);
+CREATE TABLE IF NOT EXISTS cache_namespaces (
+    namespace TEXT PRIMARY KEY,
+    entries INTEGER NOT NULL DEFAULT 0,
+    bytes INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+class SQLiteStore:
+    """
+    Connections to the shared cache file, one per thread and process
+
+    Connections are opened lazily and reopened after a fork, so the store
+    can be created before gunicorn forks its workers.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None,
+                               check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA mmap_size={Config.CACHE_MMAP_SIZE}')
+        with self._schema_lock:
+            if not self._schema_ready:
+                conn.executescript(_SCHEMA)
+                self._schema_ready = True
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+
+class SQLiteCache(Cache):
+    """LRU namespace in a SQLite file shared by every worker on the host"""
+
+    backend = 'sqlite'
+
+    def __init__(self, namespace: str, max_entries: int, max_bytes: int,
+                 max_item_bytes: Optional[int] = None, store: SQLiteStore = None):
+        super().__init__(namespace, max_entries, max_bytes, max_item_bytes)
+        self.store = store or SQLiteStore(Config.CACHE_PATH)
+
+    def _get(self, key: str):
+        conn = self.store.connection()
+        row = conn.execute(
+            'SELECT value, accessed FROM cache_entries WHERE namespace = ? AND key = ?',
+            (self.namespace, key)
+        ).fetchone()
+        if row is None:
+            return _MISSING
+        now = time.time()
+        if now - row[1] > TOUCH_INTERVAL:
+            try:
+                conn.execute(
+                    'UPDATE cache_entries SET accessed = ? WHERE namespace = ? AND key = ?',
+                    (now, self.namespace, key)
+                )
+            except sqlite3.OperationalError:
+                pass  # Busy; the LRU position is only a hint
+        try:
+            return pickle.loads(row[0])
+        except Exception:
+            return _MISSING
+
+    def _set(self, key: str, value) -> None:
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(payload) > self.max_item_bytes:
+            return
+        conn = self.store.connection()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+        except sqlite3.OperationalError:
+            return  # Another worker holds the write lock for too long; skip caching
+        try:
+            old = conn.execute(
+                'SELECT size FROM cache_entries WHERE namespace = ? AND key = ?',
+                (self.namespace, key)
+            ).fetchone()
+            conn.execute(
+                'INSERT OR REPLACE INTO cache_entries (namespace, key, value, size, accessed) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (self.namespace, key, payload, len(payload), time.time())
+            )
+            self._adjust(conn, 0 if old else 1, len(payload) - (old[0] if old else 0))
+            evicted = self._evict(conn)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        if evicted:
+            self._evicted(evicted)
+
+    def _adjust(self, conn, entries: int, size: int) -> None:
+        conn.execute(
+            'INSERT INTO cache_namespaces (namespace, entries, bytes) VALUES (?, ?, ?) '
+            'ON CONFLICT (namespace) DO UPDATE SET '
+            'entries = entries + excluded.entries, bytes = bytes + excluded.bytes',
+            (self.namespace, entries, size)
+        )
+
+    def _evict(self, conn) -> int:
+        """Drop least recently used entries until the namespace fits its limits"""
+        entries, size = conn.execute(
+            'SELECT entries, bytes FROM cache_namespaces WHERE namespace = ?',
+            (self.namespace,)
+        ).fetchone()
+        evicted = 0
+        while entries > self.max_entries or size > self.max_bytes:
+            victims = conn.execute(
+                'SELECT rowid, size FROM cache_entries WHERE namespace = ? '
+                'ORDER BY accessed LIMIT ?',
+                (self.namespace, max(entries - self.max_entries, 16))
+            ).fetchall()
+            if not victims:
+                break
+            for rowid, victim_size in victims:
+                if entries <= self.max_entries and size <= self.max_bytes:
+                    break
+                conn.execute('DELETE FROM cache_entries WHERE rowid = ?', (rowid,))
+                entries -= 1
+                size -= victim_size
+                evicted += 1
+        if evicted:
+            conn.execute(
+                'UPDATE cache_namespaces SET entries = ?, bytes = ? WHERE namespace = ?',
+                (entries, size, self.namespace)
+            )
+        return evicted
+
+    def delete(self, key: str) -> None:
+        conn = self.store.connection()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+        except sqlite3.OperationalError:
+            # Busy, as in _set; keys carry data versions, so a stale entry
+            # only takes space until it is evicted
+            return
+        try:
+            old = conn.execute(
+                'SELECT size FROM cache_entries WHERE namespace = ? AND key = ?',
+                (self.namespace, key)
+            ).fetchone()
+            if old:
+                conn.execute('DELETE FROM cache_entries WHERE namespace = ? AND key = ?',
+                             (self.namespace, key))
+                self._adjust(conn, -1, -old[0])
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def clear(self) -> None:
+        conn = self.store.connection()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+        except sqlite3.OperationalError:
+            return  # Busy; the entries age out through LRU eviction
+        try:
+            conn.execute('DELETE FROM cache_entries WHERE namespace = ?', (self.namespace,))
+            conn.execute('DELETE FROM cache_namespaces WHERE namespace = ?', (self.namespace,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _size(self):
+        row = self.store.connection().execute(
+            'SELECT entries, bytes FROM cache_namespaces WHERE namespace = ?',
+            (self.namespace,)
+        ).fetchone()
+        return tuple(row) if row else (0, 0)
+
+
+BACKENDS = {
+    'memory': MemoryCache,
+    'sqlite': SQLiteCache
+}
+
+_caches: Dict[str, Cache] = {}
+_caches_lock = threading.Lock()
+_stores: Dict[str, SQLiteStore] = {}
+
+
+def _build(namespace: str, cache_class: Optional[Type[Cache]] = None) -> Cache:
+    settings = dict(Config.CACHE_NAMESPACES.get(namespace, {}))
+    backend = settings.pop('backend', Config.CACHE_BACKEND)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown cache backend '{backend}' for namespace '{namespace}'")
+    cache_class = cache_class or BACKENDS[backend]
+    if cache_class.backend != backend:
+        raise ValueError(f"{cache_class.__name__} needs the '{cache_class.backend}' backend "
+                         f"for namespace '{namespace}'")
+    settings.setdefault('max_entries', 1024)
+    settings.setdefault('max_bytes', 16 * 1024 * 1024)
+    if backend == 'sqlite':
+        if Config.CACHE_PATH not in _stores:
+            _stores[Config.CACHE_PATH] = SQLiteStore(Config.CACHE_PATH)
+        settings['store'] = _stores[Config.CACHE_PATH]
+    return cache_class(namespace, **settings)
+
+
+def get_cache(namespace: str, cache_class: Optional[Type[Cache]] = None) -> Cache:
+    """
+    The cache for a namespace, created from Config on first use
+
+    Args:
+        namespace: Key of Config.CACHE_NAMESPACES
+        cache_class: Subclass of the namespace's backend class to build
+            instead (e.g. one with its own lookup rules); only used when
+            the namespace is first created
+    """
+    cache = _caches.get(namespace)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.get(namespace)
+            if cache is None:
+                cache = _caches[namespace] = _build(namespace, cache_class)
+    return cache
+
+
+def cache_stats() -> dict:
+    """Metrics for every configured namespace"""
+    return {namespace: get_cache(namespace).stats() for namespace in Config.CACHE_NAMESPACES}
@@ -0,0 +1,234 @@
+"""
+Nearest named and brand color lookup
+
+Reference colors (the CSS named colors, optionally extended from a file,
+and the IBM brand palette) are indexed in a k-d tree over CIE L*a*b*, so
+each query visits a handful of nodes instead of every reference color.
+Distances are CIE76 delta E, the same metric the archive color search uses.
+"""
+
+import csv
+import heapq
+import json
+import os
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from config import Config
+from utils.color_utils import hex_to_rgb, is_hex_color, rgb_to_lab
+
+Lab = Tuple[float, float, float]
+
+# CSS Color Module Level 4 named colors (grey/gray aliases kept once)
+CSS_COLORS = {
+    'aliceblue': '#F0F8FF', 'antiquewhite': '#FAEBD7', 'aqua': '#00FFFF',
+    'aquamarine': '#7FFFD4', 'azure': '#F0FFFF', 'beige': '#F5F5DC',
+    'bisque': '#FFE4C4', 'black': '#000000', 'blanchedalmond': '#FFEBCD',
+    'blue': '#0000FF', 'blueviolet': '#8A2BE2', 'brown': '#A52A2A',
+    'burlywood': '#DEB887', 'cadetblue': '#5F9EA0', 'chartreuse': '#7FFF00',
+    'chocolate': '#D2691E', 'coral': '#FF7F50', 'cornflowerblue': '#6495ED',
+    'cornsilk': '#FFF8DC', 'crimson': '#DC143C', 'darkblue': '#00008B',
+    'darkcyan': '#008B8B', 'darkgoldenrod': '#B8860B', 'darkgray': '#A9A9A9',
+    'darkgreen': '#006400', 'darkkhaki': '#BDB76B', 'darkmagenta': '#8B008B',
+    'darkolivegreen': '#556B2F', 'darkorange': '#FF8C00', 'darkorchid': '#9932CC',
+    'darkred': '#8B0000', 'darksalmon': '#E9967A', 'darkseagreen': '#8FBC8F',
+    'darkslateblue': '#483D8B', 'darkslategray': '#2F4F4F', 'darkturquoise': '#00CED1',
+    'darkviolet': '#9400D3', 'deeppink': '#FF1493', 'deepskyblue': '#00BFFF',
+    'dimgray': '#696969', 'dodgerblue': '#1E90FF', 'firebrick': '#B22222',
+    'floralwhite': '#FFFAF0', 'forestgreen': '#228B22', 'gainsboro': '#DCDCDC',
+    'ghostwhite': '#F8F8FF', 'gold': '#FFD700', 'goldenrod': '#DAA520',
+    'gray': '#808080', 'green': '#008000', 'greenyellow': '#ADFF2F',
+    'honeydew': '#F0FFF0', 'hotpink': '#FF69B4', 'indianred': '#CD5C5C',
+    'indigo': '#4B0082', 'ivory': '#FFFFF0', 'khaki': '#F0E68C',
+    'lavender': '#E6E6FA', 'lavenderblush': '#FFF0F5', 'lawngreen': '#7CFC00',
+    'lemonchiffon': '#FFFACD', 'lightblue': '#ADD8E6', 'lightcoral': '#F08080',
+    'lightcyan': '#E0FFFF', 'lightgoldenrodyellow': '#FAFAD2', 'lightgray': '#D3D3D3',
+    'lightgreen': '#90EE90', 'lightpink': '#FFB6C1', 'lightsalmon': '#FFA07A',
+    'lightseagreen': '#20B2AA', 'lightskyblue': '#87CEFA', 'lightslategray': '#778899',
+    'lightsteelblue': '#B0C4DE', 'lightyellow': '#FFFFE0', 'lime': '#00FF00',
+    'limegreen': '#32CD32', 'linen': '#FAF0E6', 'maroon': '#800000',
+    'mediumaquamarine': '#66CDAA', 'mediumblue': '#0000CD', 'mediumorchid': '#BA55D3',
+    'mediumpurple': '#9370DB', 'mediumseagreen': '#3CB371', 'mediumslateblue': '#7B68EE',
+    'mediumspringgreen': '#00FA9A', 'mediumturquoise': '#48D1CC', 'mediumvioletred': '#C71585',
+    'midnightblue': '#191970', 'mintcream': '#F5FFFA', 'mistyrose': '#FFE4E1',
+    'moccasin': '#FFE4B5', 'navajowhite': '#FFDEAD', 'navy': '#000080',
+    'oldlace': '#FDF5E6', 'olive': '#808000', 'olivedrab': '#6B8E23',
+    'orange': '#FFA500', 'orangered': '#FF4500', 'orchid': '#DA70D6',
+    'palegoldenrod': '#EEE8AA', 'palegreen': '#98FB98', 'paleturquoise': '#AFEEEE',
+    'palevioletred': '#DB7093', 'papayawhip': '#FFEFD5', 'peachpuff': '#FFDAB9',
+    'peru': '#CD853F', 'pink': '#FFC0CB', 'plum': '#DDA0DD',
+    'powderblue': '#B0E0E6', 'purple': '#800080', 'rebeccapurple': '#663399',
+    'red': '#FF0000', 'rosybrown': '#BC8F8F', 'royalblue': '#4169E1',
+    'saddlebrown': '#8B4513', 'salmon': '#FA8072', 'sandybrown': '#F4A460',
+    'seagreen': '#2E8B57', 'seashell': '#FFF5EE', 'sienna': '#A0522D',
+    'silver': '#C0C0C0', 'skyblue': '#87CEEB', 'slateblue': '#6A5ACD',
+    'slategray': '#708090', 'snow': '#FFFAFA', 'springgreen': '#00FF7F',
+    'steelblue': '#4682B4', 'tan': '#D2B48C', 'teal': '#008080',
+    'thistle': '#D8BFD8', 'tomato': '#FF6347', 'turquoise': '#40E0D0',
+    'violet': '#EE82EE', 'wheat': '#F5DEB3', 'white': '#FFFFFF',
+    'whitesmoke': '#F5F5F5', 'yellow': '#FFFF00', 'yellowgreen': '#9ACD32'
+}
+
+
+class Match(NamedTuple):
+    name: str
+    hex: str
+    distance: float
+
+
+class ColorIndex:
+    """
+    k-d tree over reference colors in Lab space
+
+    The tree is stored in flat lists: node ``i`` splits on axis ``depth % 3``
+    at ``points[i]``, with children at ``left[i]``/``right[i]`` (-1 if none).
+    """
+
+    def __init__(self, colors: Dict[str, str]):
+        self.names = []
+        self.hexes = []
+        self.points = []
+        for name, hex_color in colors.items():
+            if not is_hex_color(hex_color):
+                continue
+            self.names.append(name)
+            self.hexes.append(hex_color.upper())
+            self.points.append(rgb_to_lab(*hex_to_rgb(hex_color)))
+        self.left = [-1] * len(self.points)
+        self.right = [-1] * len(self.points)
+        self.axis = [0] * len(self.points)
+        self.root = self._build(list(range(len(self.points))), 0)
+
+    def __len__(self):
+        return len(self.points)
+
+    def _build(self, indices: List[int], depth: int) -> int:
+        if not indices:
+            return -1
+        axis = depth % 3
+        indices.sort(key=lambda i: self.points[i][axis])
+        middle = len(indices) // 2
+        node = indices[middle]
+        self.axis[node] = axis
+        self.left[node] = self._build(indices[:middle], depth + 1)
+        self.right[node] = self._build(indices[middle + 1:], depth + 1)
+        return node
+
+    def nearest_lab(self, lab: Lab, k: int = 1) -> List[Match]:
+        """The ``k`` reference colors closest to a Lab color, nearest first"""
+        if self.root < 0:
+            return []
+        points, left, right, axes = self.points, self.left, self.right, self.axis
+        best = []  # max-heap of (-squared distance, node)
+        stack = [(self.root, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+            # Skip subtrees whose splitting plane is farther than the k-th best
+            if len(best) == k and bound >= -best[0][0]:
+                continue
+            point = points[node]
+            d = (lab[0] - point[0]) ** 2 + (lab[1] - point[1]) ** 2 + (lab[2] - point[2]) ** 2
+            if len(best) < k:
+                heapq.heappush(best, (-d, node))
+            elif d < -best[0][0]:
+                heapq.heapreplace(best, (-d, node))
+
+            diff = lab[axes[node]] - point[axes[node]]
+            near, far = (left[node], right[node]) if diff < 0 else (right[node], left[node])
+            if far >= 0:
+                stack.append((far, diff * diff))
+            if near >= 0:
+                stack.append((near, 0.0))
+
+        return [
+            Match(self.names[node], self.hexes[node], (-neg_d) ** 0.5)
+            for neg_d, node in sorted(best, reverse=True)
+        ]
+
+    def nearest(self, hex_color: str, k: int = 1) -> List[Match]:
+        """The ``k`` reference colors closest to a hex color"""
+        return self.nearest_lab(rgb_to_lab(*hex_to_rgb(hex_color)), k)
+
+    def nearest_many(self, colors: Iterable[str], k: int = 1) -> List[List[Match]]:
+        """Batched lookup; repeated colors are only searched once"""
+        seen = {}
+        results = []
+        for color in colors:
+            key = color.upper()
+            if key not in seen:
+                seen[key] = self.nearest(color, k)
+            results.append(seen[key])
+        return results
+
+
+def load_reference_colors(path: str) -> Dict[str, str]:
+    """
+    Read extra named colors from a JSON object ({name: hex}) or a CSV file
+    with name and hex columns
+    """
+    if path.lower().endswith('.json'):
+        with open(path, encoding='utf-8') as f:
+            return dict(json.load(f))
+    with open(path, newline='', encoding='utf-8') as f:
+        return {row[0].strip(): row[1].strip() for row in csv.reader(f)
+                if len(row) >= 2 and is_hex_color(row[1].strip())}
+
+
+_indexes: Dict[str, ColorIndex] = {}
+_lock = threading.Lock()
+
+
+def _get_index(kind: str) -> ColorIndex:
+    index = _indexes.get(kind)
+    if index is None:
+        with _lock:
+            index = _indexes.get(kind)
+            if index is None:
+                if kind == 'brand':
+                    index = ColorIndex(Config.IBM_COLORS)
+                else:
+                    colors = dict(CSS_COLORS)
+                    path = Config.COLOR_NAMES_FILE
+                    if path and os.path.exists(path):
+                        colors.update(load_reference_colors(path))
+                    index = ColorIndex(colors)
+                _indexes[kind] = index
+    return index
+
+
+def name_index() -> ColorIndex:
+    """Index of named colors (CSS names plus Config.COLOR_NAMES_FILE)"""
+    return _get_index('names')
+
+
+def brand_index() -> ColorIndex:
+    """Index of the brand palette (Config.IBM_COLORS)"""
+    return _get_index('brand')
+
+
+def annotate_palette(palette: List[str]) -> List[Optional[dict]]:
+    """
+    Closest color name and brand color for every swatch
+
+    Returns:
+        One dict per color (None for values that are not hex colors) with
+        name, name_hex, name_distance, brand, brand_hex and brand_distance
+    """
+    names, brands = name_index(), brand_index()
+    annotations = []
+    for color in palette:
+        if not is_hex_color(color):
+            annotations.append(None)
+            continue
+        lab = rgb_to_lab(*hex_to_rgb(color))
+        name = names.nearest_lab(lab)[0]
+        brand = brands.nearest_lab(lab)[0]
+        annotations.append({
+            'name': name.name,
+            'name_hex': name.hex,
+            'name_distance': round(name.distance, 2),
+            'brand': brand.name,
+            'brand_hex': brand.hex,
+            'brand_distance': round(brand.distance, 2)
+        })
+    return annotations
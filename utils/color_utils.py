@@ -20,6 +20,105 @@ def rgb_to_hex(r: int, g: int, b: int) -> str:
     return f"#{r:02x}{g:02x}{b:02x}"
 
 
+def hex_to_int(hex_color: str) -> int:
+    """Pack a hex color into a 0xRRGGBB integer"""
+    return int(hex_color.lstrip('#')[:6], 16)
+
+
+def int_to_hex(rgb: int) -> str:
+    """Unpack a 0xRRGGBB integer into an uppercase hex color"""
+    return f"#{rgb:06X}"
+
+
+def is_hex_color(value) -> bool:
+    """Check for a 6-digit hex color such as #0F62FE"""
+    if not isinstance(value, str):
+        return False
+    value = value.strip().lstrip('#')
+    return len(value) == 6 and all(c in '0123456789abcdefABCDEF' for c in value)
+
+
+def _srgb_to_linear(c: float) -> float:
+    c = c / 255.0
+    if c <= 0.04045:
+        return c / 12.92
+    return ((c + 0.055) / 1.055) ** 2.4
+
+
+def rgb_to_lab(r: int, g: int, b: int) -> Tuple[float, float, float]:
+    """
+    Convert sRGB to CIE L*a*b* (D65 white point)
+
+    Returns:
+        (L, a, b) with L in [0, 100] and a, b roughly in [-128, 128]
+    """
+    r_lin, g_lin, b_lin = _srgb_to_linear(r), _srgb_to_linear(g), _srgb_to_linear(b)
+
+    # Linear sRGB to XYZ, normalized by the D65 reference white
+    x = (0.4124564 * r_lin + 0.3575761 * g_lin + 0.1804375 * b_lin) / 0.95047
+    y = (0.2126729 * r_lin + 0.7151522 * g_lin + 0.0721750 * b_lin)
+    z = (0.0193339 * r_lin + 0.1191920 * g_lin + 0.9503041 * b_lin) / 1.08883
+
+    def f(t):
+        if t > 216 / 24389:
+            return t ** (1.0 / 3.0)
+        return (24389 / 27 * t + 16) / 116
+
+    fx, fy, fz = f(x), f(y), f(z)
+    return (116 * fy - 16, 500 * (fx - fy), 200 * (fy - fz))
+
+
+def delta_e(lab1: Tuple[float, float, float], lab2: Tuple[float, float, float]) -> float:
+    """CIE76 color difference between two Lab colors"""
+    return math.sqrt(sum((c1 - c2) ** 2 for c1, c2 in zip(lab1, lab2)))
+
+
+# Smallest grid cell whose a/b coordinates of sRGB colors (a + 128 and
+# b + 128 stay below 227) fit the 8-bit fields of a packed cell id
+MIN_LAB_CELL_SIZE = 1.0
+
+
+def _check_cell_size(cell_size: float) -> None:
+    if not cell_size >= MIN_LAB_CELL_SIZE:
+        raise ValueError(f'Lab grid cell size must be at least {MIN_LAB_CELL_SIZE:g} '
+                         f'(PALETTE_SEARCH_CELL_SIZE is {cell_size!r})')
+
+
+def lab_bucket(lab: Tuple[float, float, float], cell_size: float) -> int:
+    """
+    Quantize a Lab color into a packed grid-cell id
+
+    The Lab space is cut into cubes of ``cell_size`` units, and the three cell
+    coordinates are packed into one integer so that colors can be indexed and
+    looked up by cell.
+    """
+    _check_cell_size(cell_size)
+    l, a, b = lab
+    li = max(0, int(l // cell_size))
+    ai = max(0, int((a + 128) // cell_size))
+    bi = max(0, int((b + 128) // cell_size))
+    return (li << 16) | (ai << 8) | bi
+
+
+def lab_buckets_within(lab: Tuple[float, float, float], radius: float, cell_size: float) -> List[int]:
+    """All grid-cell ids that can contain colors within ``radius`` of ``lab``"""
+    _check_cell_size(cell_size)
+    l, a, b = lab
+
+    def cell_range(value, offset):
+        # Cells past 255 hold no colors; they must not spill into the next field
+        low = min(max(0, int((value + offset - radius) // cell_size)), 255)
+        high = min(max(0, int((value + offset + radius) // cell_size)), 255)
+        return range(low, high + 1)
+
+    return [
+        (li << 16) | (ai << 8) | bi
+        for li in cell_range(l, 0)
+        for ai in cell_range(a, 128)
+        for bi in cell_range(b, 128)
+    ]
+
+
 def rgb_to_hsv(r: int, g: int, b: int) -> Tuple[float, float, float]:
     """Convert RGB to HSV"""
     r_norm, g_norm, b_norm = r / 255.0, g / 255.0, b / 255.0
@@ -0,0 +1,255 @@
+"""
+Background removal of deleted upload trees
+
+Deleting an archive or project renames its upload directory into a trash
+folder (a single fast rename) and records a FileTombstone row in the same
+transaction as the database delete. A daemon thread in each worker then
+removes the trashed trees. Because the queue lives in the database,
+removals that were pending when a worker stopped are picked up after a
+restart.
+
+Each trash entry is a directory holding the renamed tree and a note of
+where it came from. A process that dies between the rename and the
+commit leaves an entry with no tombstone; since the tombstone commits
+with the delete, that delete never happened, and the reaper moves the
+tree back where it came from.
+"""
+
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 5
+# Trash entries younger than this may belong to a delete still in flight
+ORPHAN_GRACE_SECONDS = 15 * 60
+
+_TRASHED_NAME = 'item'
+_ORIGIN_NAME = 'origin'
+
+
+def trash_folder() -> str:
+    """Directory holding upload trees waiting to be reaped"""
+    folder = os.path.join(Config.UPLOAD_FOLDER, '.trash')
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def move_to_trash(path: str) -> Optional[str]:
+    """
+    Rename a file or directory into the trash folder
+
+    Returns:
+        The new path, or None if ``path`` does not exist
+    """
+    if not os.path.exists(path):
+        return None
+    trash_path = os.path.join(trash_folder(), uuid.uuid4().hex)
+    os.mkdir(trash_path)
+    try:
+        with open(os.path.join(trash_path, _ORIGIN_NAME), 'w', encoding='utf-8') as f:
+            f.write(os.path.abspath(path))
+        os.replace(path, os.path.join(trash_path, _TRASHED_NAME))
+    except OSError:
+        shutil.rmtree(trash_path, ignore_errors=True)
+        raise
+    return trash_path
+
+
+def restore_from_trash(trash_path: Optional[str], original_path: str) -> None:
+    """Undo :func:`move_to_trash` after a failed database transaction"""
+    if not trash_path:
+        return
+    trashed = os.path.join(trash_path, _TRASHED_NAME)
+    if os.path.lexists(trashed):
+        if os.path.lexists(original_path):
+            # Something new took the old place; keep both
+            original_path = f'{original_path}.restored-{os.path.basename(trash_path)}'
+        os.replace(trashed, original_path)
+    shutil.rmtree(trash_path, ignore_errors=True)
+
+
+def _origin(trash_path: str) -> Optional[str]:
+    try:
+        with open(os.path.join(trash_path, _ORIGIN_NAME), encoding='utf-8') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def schedule_removal(session, path: str) -> Optional[str]:
+    """
+    Trash ``path`` and queue it for the reaper in the caller's transaction
+
+    The caller commits the session; on rollback it should call
+    :func:`restore_from_trash` with the returned path.
+
+    Args:
+        session: SQLAlchemy session the tombstone is added to
+        path: File or directory to remove
+
+    Returns:
+        The trash path, or None if ``path`` did not exist
+    """
+    from models import FileTombstone
+
+    trash_path = move_to_trash(path)
+    if trash_path:
+        session.add(FileTombstone(path=trash_path))
+    return trash_path
+
+
+def _remove(path: str) -> None:
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    elif os.path.lexists(path):
+        os.remove(path)
+
+
+class FileReaper:
+    """Per-process daemon thread draining the file tombstone queue"""
+
+    def __init__(self, app, interval: float):
+        self.app = app
+        self.interval = interval
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def ensure_started(self) -> None:
+        """Start the thread, or restart it in a freshly forked worker"""
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name='huevault-file-reaper', daemon=True
+            )
+            self._thread.start()
+
+    def wake(self) -> None:
+        """Process the queue now instead of waiting for the next interval"""
+        self._wake.set()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.sweep_orphans()
+                while self.reap_once():
+                    pass
+            except Exception:
+                logger.exception('File reaper pass failed')
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def reap_once(self) -> int:
+        """
+        Remove one batch of tombstoned paths
+
+        Returns:
+            Number of tombstones cleared
+        """
+        from models import db, FileTombstone
+
+        with self.app.app_context():
+            tombstones = FileTombstone.query \
+                .filter(FileTombstone.attempts < MAX_ATTEMPTS) \
+                .order_by(FileTombstone.id).limit(BATCH_SIZE).all()
+            # Release the read snapshot while touching the filesystem
+            db.session.commit()
+
+            cleared = 0
+            for tombstone in tombstones:
+                try:
+                    _remove(tombstone.path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    tombstone.attempts += 1
+                    tombstone.last_error = str(e)
+                    continue
+                db.session.delete(tombstone)
+                cleared += 1
+            db.session.commit()
+            return cleared
+
+    def sweep_orphans(self) -> int:
+        """
+        Restore trash entries whose delete never committed
+
+        Returns:
+            Number of entries restored or removed
+        """
+        from models import db, FileTombstone
+
+        folder = trash_folder()
+        cutoff = time.time() - ORPHAN_GRACE_SECONDS
+        candidates = []
+        for entry in os.scandir(folder):
+            try:
+                if entry.stat(follow_symlinks=False).st_mtime < cutoff:
+                    candidates.append(entry.path)
+            except FileNotFoundError:
+                continue
+        if not candidates:
+            return 0
+
+        with self.app.app_context():
+            queued = set()
+            for start in range(0, len(candidates), BATCH_SIZE):
+                chunk = candidates[start:start + BATCH_SIZE]
+                queued.update(path for (path,) in db.session.query(FileTombstone.path)
+                              .filter(FileTombstone.path.in_(chunk)))
+            db.session.commit()
+
+        swept = 0
+        for path in candidates:
+            if path in queued:
+                continue
+            origin = _origin(path)
+            try:
+                if origin:
+                    logger.warning('Restoring %s from uncommitted delete %s', origin, path)
+                    restore_from_trash(path, origin)
+                else:
+                    # Entries from before origins were recorded
+                    _remove(path)
+            except FileNotFoundError:
+                # Another worker got there first
+                continue
+            except OSError:
+                logger.exception('Could not sweep trash entry %s', path)
+                continue
+            swept += 1
+        return swept
+
+
+def init_reaper(app) -> FileReaper:
+    """Attach a FileReaper to the app, started lazily on the first request"""
+    reaper = FileReaper(app, app.config.get('FILE_REAPER_INTERVAL', 30))
+    app.extensions['file_reaper'] = reaper
+
+    if app.config.get('FILE_REAPER_ENABLED', True):
+        @app.before_request
+        def _start_file_reaper():
+            reaper.ensure_started()
+
+    return reaper
+
+
+def wake_reaper(app) -> None:
+    """Ask the app's reaper to process newly queued removals"""
+    reaper = app.extensions.get('file_reaper')
+    if reaper is not None:
+        reaper.wake()
@@ -3,16 +3,246 @@ Image processing utilities for SVG conversion and background removal
 """
 
 import os
-from PIL import Image
-import cairosvg
 import io
-from typing import Tuple, Optional
+import re
+import struct
+import zlib
+from typing import TYPE_CHECKING, NamedTuple, Tuple, Optional
+from config import Config
+from utils.instrumentation import stage
+from utils.svg_cache import parsed_svg_tree
+
+# Pillow and cairosvg (which loads the native cairo library) are imported on
+# first use, so processes that never touch an image don't pay for them
+if TYPE_CHECKING:
+    from PIL import Image
+
+
+# Inches per unit, as cairosvg converts lengths; px and unitless values are user units
+_SVG_UNITS = {'in': 1, 'cm': 1 / 2.54, 'mm': 1 / 25.4, 'pt': 1 / 72, 'pc': 1 / 6}
+_SVG_HEADER_BYTES = 64 * 1024
+_SVG_COMMENT = re.compile(rb'<!--.*?-->', re.DOTALL)
+_SVG_ROOT = re.compile(rb'<(?:[\w.-]+:)?svg\b([^>]*)>')
+_SVG_ATTRIBUTE = re.compile(rb'([\w:.-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+_SVG_LENGTH = re.compile(r'^\s*([+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)\s*([a-zA-Z%]*)\s*$')
+
+
+class SvgTooLarge(ValueError):
+    """An SVG would render past the pixel budget and the policy is 'reject'"""
+
+
+class SvgRenderPlan(NamedTuple):
+    """Output size of an SVG conversion, decided before rendering"""
+    width: int
+    height: int
+    dpi: float  # DPI written to the output; scaled with the size so print size is kept
+    intrinsic: Optional[Tuple[float, float]]  # Size the SVG asks for at the requested DPI
+    explicit: bool  # Size requested by the caller
+    clamped: bool  # Scaled down to fit the pixel budget
+    tiled: bool = False  # Over SVG_MAX_PIXELS, rendered tile by tile (see utils.svg_tiles)
+    
+    @property
+    def pixels(self) -> int:
+        return self.width * self.height
+    
+    @property
+    def estimated_bytes(self) -> int:
+        """Peak pixel memory of the render (cairo surface plus RGBA copy)"""
+        if self.tiled:
+            return Config.SVG_TILE_IN_FLIGHT * Config.SVG_TILE_SIZE ** 2 * 8
+        return self.pixels * 8
+
+
+def _svg_length(value: Optional[str], dpi: float) -> Optional[float]:
+    """A root width/height in pixels, or None when it depends on the viewport"""
+    match = _SVG_LENGTH.match(value) if value else None
+    if not match:
+        return None
+    number, unit = float(match.group(1)), match.group(2).lower()
+    if unit in ('', 'px'):
+        return number
+    if unit in _SVG_UNITS:
+        return number * dpi * _SVG_UNITS[unit]
+    if unit in ('em', 'ex'):
+        # Relative to cairosvg's default 12pt font
+        return number * dpi / 6 / (2 if unit == 'ex' else 1)
+    return None
+
+
+def _svg_root_attributes(svg_data: bytes) -> Optional[dict]:
+    """
+    Attributes of the root ``<svg>`` element
+    
+    The first _SVG_HEADER_BYTES are scanned with a regex. When the root
+    starts later (long comments, DOCTYPE or other preamble), the document
+    is parsed incrementally up to the root's start tag only, with the same
+    entity restrictions cairosvg applies.
+    """
+    compressed = svg_data[:2] == b'\x1f\x8b'  # svgz
+    header = svg_data[:_SVG_HEADER_BYTES]
+    if compressed:
+        try:
+            header = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(svg_data, _SVG_HEADER_BYTES)
+        except zlib.error:
+            return None
+    header = _SVG_COMMENT.sub(b'', header)
+    root = _SVG_ROOT.search(header)
+    # An '<!--' left before the match opens a comment the header cut off
+    if root and b'<!--' not in header[:root.start()]:
+        return {
+            name.decode('ascii', 'replace'): (double or single).decode('utf-8', 'replace')
+            for name, double, single in _SVG_ATTRIBUTE.findall(root.group(1))
+        }
+    
+    import gzip
+    from defusedxml.ElementTree import iterparse  # Installed with cairosvg
+    
+    source = io.BytesIO(svg_data)
+    try:
+        for _, element in iterparse(gzip.GzipFile(fileobj=source) if compressed else source,
+                                    events=('start',)):
+            if element.tag.rsplit('}', 1)[-1] != 'svg':
+                return None
+            return dict(element.attrib)
+    except Exception:
+        # Not well-formed (or forbidden entities): cairosvg couldn't render it either
+        return None
+    return None
+
+
+def svg_intrinsic_size(svg_data: bytes, dpi: float) -> Optional[Tuple[float, float]]:
+    """
+    Pixel size an SVG renders to at ``dpi``, read from its root element
+    
+    Usually only the start of the document is scanned (see
+    _svg_root_attributes), so this is cheap enough to run on every upload
+    before committing to a render.
+    
+    Returns:
+        (width, height), or None if the root element gives no usable size
+    """
+    attributes = _svg_root_attributes(svg_data)
+    if attributes is None:
+        return None
+    width = _svg_length(attributes.get('width'), dpi)
+    height = _svg_length(attributes.get('height'), dpi)
+    
+    try:
+        viewbox = [float(v) for v in re.split(r'[\s,]+', attributes.get('viewBox', '').strip())]
+    except ValueError:
+        viewbox = []
+    if len(viewbox) == 4:
+        # Missing or relative sizes take the viewBox's, as in cairosvg
+        width = width or viewbox[2]
+        height = height or viewbox[3]
+    
+    if not width or not height or width < 0 or height < 0:
+        return None
+    return width, height
+
+
+def plan_svg_render(
+    svg_data: bytes,
+    dpi: float,
+    width: Optional[int] = None,
+    height: Optional[int] = None,
+    policy: Optional[str] = None,
+    allow_tiles: bool = False
+) -> SvgRenderPlan:
+    """
+    Decide the output size of an SVG conversion and check it against the budget
+    
+    Args:
+        svg_data: SVG document bytes
+        dpi: Resolution for physical units (mm, in, pt, ...)
+        width: Target width in pixels, instead of the SVG's own size
+        height: Target height in pixels; with only one of width and height
+            the other follows the SVG's aspect ratio
+        policy: 'clamp', 'reject' or 'tile' for sizes over Config.SVG_MAX_PIXELS
+            or Config.SVG_MAX_DIMENSION (default Config.SVG_OVERSIZE_POLICY)
+        allow_tiles: Whether the caller can render tiled plans (TIFF written
+            to a file, see convert_svg_to_tiled_tiff); 'tile' clamps otherwise
+    
+    Returns:
+        The plan; clamped plans keep the aspect ratio. Tiled plans are
+        limited by Config.SVG_TILED_MAX_PIXELS only
+    
+    Raises:
+        SvgTooLarge: The size is over budget and the policy is 'reject'
+        ValueError: The size cannot be determined or the policy is unknown
+    """
+    policy = policy or Config.SVG_OVERSIZE_POLICY
+    if policy not in ('clamp', 'reject', 'tile'):
+        raise ValueError(f'Unknown SVG oversize policy: {policy}')
+    intrinsic = svg_intrinsic_size(svg_data, dpi)
+    
+    if width and height:
+        size = (width, height)
+    elif intrinsic and width:
+        size = (width, max(1, round(width * intrinsic[1] / intrinsic[0])))
+    elif intrinsic and height:
+        size = (max(1, round(height * intrinsic[0] / intrinsic[1])), height)
+    elif intrinsic:
+        # cairosvg rounds the surface size the same way
+        size = (max(1, round(intrinsic[0])), max(1, round(intrinsic[1])))
+    else:
+        raise ValueError('Cannot determine the SVG size; give an output width and height')
+    
+    w, h = size
+    scale = min(1.0, Config.SVG_MAX_DIMENSION / max(w, h), (Config.SVG_MAX_PIXELS / (w * h)) ** 0.5)
+    tiled = scale < 1 and policy == 'tile' and allow_tiles
+    if tiled:
+        # Memory no longer grows with the size; only the total is limited
+        scale = min(1.0, (Config.SVG_TILED_MAX_PIXELS / (w * h)) ** 0.5)
+    if scale < 1:
+        if policy == 'reject':
+            raise SvgTooLarge(
+                f'SVG renders to {w} x {h} pixels ({w * h / 1e6:.0f} MP); the limit is '
+                f'{Config.SVG_MAX_PIXELS / 1e6:.0f} MP and {Config.SVG_MAX_DIMENSION} pixels per side'
+            )
+        w, h = max(1, int(w * scale)), max(1, int(h * scale))
+    
+    explicit, clamped = bool(width or height), scale < 1
+    output_dpi = dpi * w / intrinsic[0] if intrinsic and (explicit or clamped) else dpi
+    return SvgRenderPlan(w, h, output_dpi, intrinsic, explicit, clamped, tiled)
+
+
+def _render_svg(svg_data: bytes, dpi: float, output_width: Optional[int] = None,
+                output_height: Optional[int] = None) -> 'Image.Image':
+    """
+    Rasterize SVG bytes with cairosvg into an RGBA image
+    
+    The cairo surface is read directly instead of going through
+    ``svg2png``, which would PNG-encode the pixels only for us to decode
+    them again. An output width/height scales the drawing to that size.
+    The parsed document is reused across renders (see utils.svg_cache).
+    """
+    from cairosvg.surface import PNGSurface
+    from PIL import Image
+    
+    surface = PNGSurface(parsed_svg_tree(svg_data), None, dpi,
+                         output_width=output_width, output_height=output_height)
+    cairo_surface = surface.cairo
+    cairo_surface.flush()
+    # Cairo's ARGB32 is premultiplied and native-endian (BGRA bytes on x86/ARM)
+    img = Image.frombuffer(
+        'RGBA',
+        (cairo_surface.get_width(), cairo_surface.get_height()),
+        cairo_surface.get_data(),
+        'raw', 'BGRa', cairo_surface.get_stride(), 1
+    )
+    cairo_surface.finish()
+    return img
 
 
 def convert_svg_to_raster(
     svg_path: str,
     output_format: str = 'png',
-    dpi: int = 1200
+    dpi: int = 1200,
+    profile: Optional[str] = None,
+    tiff_compression: Optional[str] = None,
+    width: Optional[int] = None,
+    height: Optional[int] = None
 ) -> bytes:
     """
     Convert SVG to PNG, JPEG, or TIFF at specified DPI
@@ -21,63 +251,283 @@ def convert_svg_to_raster(
         svg_path: Path to SVG file
         output_format: 'png', 'jpeg', or 'tiff'
         dpi: Output resolution in DPI
+        profile: Encode profile (see encode_image)
+        tiff_compression: TIFF compression, overriding the profile's
+        width: Target width in pixels instead of the size at ``dpi``
+        height: Target height in pixels (see plan_svg_render)
     
     Returns:
         Bytes of the converted image
+    
+    Raises:
+        SvgTooLarge: The output would exceed the pixel budget (see plan_svg_render)
     """
     # Read SVG file
-    with open(svg_path, 'rb') as f:
+    with stage('svg_read'), open(svg_path, 'rb') as f:
         svg_data = f.read()
     
-    # Convert SVG to PNG first (CairoSVG outputs PNG)
-    png_data = cairosvg.svg2png(
-        bytestring=svg_data,
-        dpi=dpi
-    )
-    
-    # If PNG is requested, return as-is
-    if output_format.lower() == 'png':
-        return png_data
+    with stage('svg_preflight'):
+        plan = plan_svg_render(svg_data, dpi, width, height)
     
-    # Convert PNG to requested format
-    img = Image.open(io.BytesIO(png_data))
+    with stage('svg_render'):
+        if plan.explicit or plan.clamped:
+            img = _render_svg(svg_data, dpi, plan.width, plan.height)
+        else:
+            img = _render_svg(svg_data, dpi)
     
     output_buffer = io.BytesIO()
+    with stage('svg_encode'):
+        encode_image(img, output_buffer, output_format, (plan.dpi, plan.dpi), profile, tiff_compression)
+    
+    return output_buffer.getvalue()
+
+
+def convert_svg_to_tiled_tiff(
+    svg_data: bytes,
+    fp,
+    plan: SvgRenderPlan,
+    dpi: float,
+    profile: Optional[str] = None,
+    tiff_compression: Optional[str] = None
+) -> None:
+    """
+    Render an SVG into a tiled TIFF file, one tile at a time
+    
+    For plans too large for a single surface (``plan.tiled``); peak memory
+    depends on Config.SVG_TILE_SIZE, not on the output size.
+    
+    Args:
+        svg_data: SVG document bytes
+        fp: Seekable binary file to write to
+        plan: Output size from plan_svg_render
+        dpi: Resolution for physical units, as given to plan_svg_render
+        profile: Encode profile; its PNG level is used as the deflate level
+        tiff_compression: 'none' or 'deflate' ('lzw' is written as deflate,
+            which tiles can be compressed with independently)
+    """
+    from utils.svg_tiles import render_svg_tiled
+    
+    settings = encode_settings(profile, tiff_compression)
+    level = None if settings['tiff_compression'] == 'none' else settings['png_level']
+    with stage('svg_tiles'):
+        render_svg_tiled(svg_data, fp, plan.width, plan.height, dpi, plan.dpi,
+                         explicit_size=plan.explicit or plan.clamped, level=level)
+
+
+def tiled_svg_render_available() -> bool:
+    """Whether tiled renders match single-surface renders with the installed cairosvg"""
+    from utils.svg_tiles import tiles_match_full_render
+    
+    return tiles_match_full_render()
+
+
+def encode_settings(profile: Optional[str], tiff_compression: Optional[str]) -> dict:
+    """
+    Resolve a profile name and TIFF compression override
     
-    if output_format.lower() in ['jpeg', 'jpg']:
+    Raises:
+        ValueError: For an unknown profile or compression
+    """
+    profile = profile or Config.DEFAULT_ENCODE_PROFILE
+    if profile not in Config.ENCODE_PROFILES:
+        raise ValueError(f'Unknown encode profile: {profile}')
+    settings = dict(Config.ENCODE_PROFILES[profile])
+    if tiff_compression:
+        settings['tiff_compression'] = tiff_compression
+    if settings['tiff_compression'] not in Config.TIFF_COMPRESSIONS:
+        raise ValueError(f"Unknown TIFF compression: {settings['tiff_compression']}")
+    return settings
+
+
+def _png_chunk(fp, chunk_type: bytes, data: bytes) -> None:
+    fp.write(struct.pack('>I', len(data)))
+    fp.write(chunk_type + data)
+    fp.write(struct.pack('>I', zlib.crc32(chunk_type + data) & 0xffffffff))
+
+
+def _save_png_unfiltered(img: 'Image.Image', fp, dpi: Tuple[float, float], level: int) -> None:
+    """
+    Write an 8-bit PNG with filter type 0 on every row
+    
+    Pillow always runs adaptive row filtering, which costs more than
+    low-level deflate itself; skipping it roughly halves encode time at the
+    price of larger files.
+    """
+    color_types = {'L': 0, 'RGB': 2, 'LA': 4, 'RGBA': 6}
+    if img.mode not in color_types:
+        img = img.convert('RGBA' if 'A' in img.getbands() or 'transparency' in img.info else 'RGB')
+    width, height = img.size
+    stride = width * len(img.getbands())
+    raw = img.tobytes()
+    
+    fp.write(b'\x89PNG\r\n\x1a\n')
+    _png_chunk(fp, b'IHDR', struct.pack('>IIBBBBB', width, height, 8, color_types[img.mode], 0, 0, 0))
+    # pHYs is in pixels per meter
+    _png_chunk(fp, b'pHYs', struct.pack('>IIB', int(dpi[0] / 0.0254 + 0.5), int(dpi[1] / 0.0254 + 0.5), 1))
+    
+    compressor = zlib.compressobj(level)
+    rows = max(1, (1 << 20) // (stride + 1))  # About 1 MB of scanlines per IDAT chunk
+    for top in range(0, height, rows):
+        block = b''.join(
+            b'\x00' + raw[y * stride:(y + 1) * stride]
+            for y in range(top, min(height, top + rows))
+        )
+        data = compressor.compress(block)
+        if data:
+            _png_chunk(fp, b'IDAT', data)
+    _png_chunk(fp, b'IDAT', compressor.flush())
+    _png_chunk(fp, b'IEND', b'')
+
+
+def _palette_if_few_colors(img: 'Image.Image') -> 'Image.Image':
+    """Losslessly convert an image with at most 256 colors to palette mode"""
+    from PIL import Image, ImageChops
+    
+    if img.mode not in ('RGB', 'RGBA'):
+        return img
+    colors = img.getcolors(256)
+    if colors is None:
+        return img
+    method = Image.Quantize.FASTOCTREE if img.mode == 'RGBA' else Image.Quantize.MEDIANCUT
+    quantized = img.quantize(colors=len(colors), method=method)
+    # Keep the palette version only if it reproduces every pixel exactly
+    difference = ImageChops.difference(quantized.convert(img.mode), img)
+    if any(high for _, high in difference.getextrema()):
+        return img
+    return quantized
+
+
+def encode_image(
+    img: 'Image.Image',
+    fp,
+    output_format: str,
+    dpi: Tuple[float, float],
+    profile: Optional[str] = None,
+    tiff_compression: Optional[str] = None
+) -> None:
+    """
+    Encode an image as PNG, JPEG or TIFF using an encode profile
+    
+    Profiles (Config.ENCODE_PROFILES) trade encode time against size:
+    'fast' writes unfiltered low-level deflate PNGs, 'balanced' uses
+    Pillow's defaults, and 'smallest' optimizes PNG/JPEG encoding and
+    stores images with few colors as palette PNGs.
+    
+    Args:
+        img: Image to encode; RGBA is flattened onto white for JPEG
+        fp: Binary file object to write to
+        output_format: 'png', 'jpeg'/'jpg' or 'tiff'
+        dpi: Resolution stored in the file
+        profile: Profile name, default Config.DEFAULT_ENCODE_PROFILE
+        tiff_compression: 'none', 'lzw' or 'deflate', overriding the profile
+    """
+    from PIL import Image
+    
+    settings = encode_settings(profile, tiff_compression)
+    output_format = output_format.lower()
+    
+    if output_format in ('jpeg', 'jpg'):
         # Convert RGBA to RGB for JPEG (no transparency)
         if img.mode == 'RGBA':
             rgb_img = Image.new('RGB', img.size, (255, 255, 255))
-            rgb_img.paste(img, mask=img.split()[3])  # Use alpha channel as mask
+            rgb_img.paste(img, mask=img.getchannel('A'))
             img = rgb_img
-        img.save(output_buffer, format='JPEG', quality=95, dpi=(dpi, dpi))
-    elif output_format.lower() == 'tiff':
-        img.save(output_buffer, format='TIFF', dpi=(dpi, dpi))
+        img.save(fp, format='JPEG', quality=95, dpi=dpi, optimize=settings['jpeg_optimize'])
+    elif output_format == 'tiff':
+        img.save(fp, format='TIFF', dpi=dpi,
+                 compression=Config.TIFF_COMPRESSIONS[settings['tiff_compression']])
+    elif not settings['png_filter']:
+        _save_png_unfiltered(img, fp, dpi, settings['png_level'])
     else:
-        # Default to PNG
-        img.save(output_buffer, format='PNG', dpi=(dpi, dpi))
+        if settings['png_palette']:
+            img = _palette_if_few_colors(img)
+        img.save(fp, format='PNG', dpi=dpi, compress_level=settings['png_level'],
+                 optimize=settings['png_optimize'])
+
+
+def detect_background_color(img: 'Image.Image') -> Tuple[str, int, float]:
+    """
+    Guess the background color of an image from its border
     
-    return output_buffer.getvalue()
+    The border bands are gathered into one small image and binned into a
+    16-level-per-channel histogram with Pillow's C routines; the fullest bin
+    is the background. Its exact color is the median of the border pixels in
+    and around that bin, and the suggested tolerance covers their spread
+    (three standard deviations). Coverage counts the same pixels, so a noisy
+    background straddling a bin edge still reports close to 1.
+    
+    Args:
+        img: Decoded image (any mode)
+    
+    Returns:
+        (hex color, suggested tolerance, share of opaque border pixels that
+        belong to the background)
+    """
+    from PIL import Image, ImageChops, ImageStat
+    
+    width, height = img.size
+    band = max(1, int(min(width, height) * Config.BACKGROUND_DETECT_BORDER))
+    band = min(band, 32, max(1, min(width, height) // 2))
+    
+    # Top and bottom bands, then the left and right bands turned on their side;
+    # the unused area stays fully transparent and is masked out below
+    border = Image.new('RGBA', (max(width, height), 4 * band))
+    border.paste(img.crop((0, 0, width, band)).convert('RGBA'), (0, 0))
+    border.paste(img.crop((0, height - band, width, height)).convert('RGBA'), (0, band))
+    border.paste(img.crop((0, 0, band, height)).convert('RGBA').transpose(Image.Transpose.ROTATE_90), (0, 2 * band))
+    border.paste(img.crop((width - band, 0, width, height)).convert('RGBA').transpose(Image.Transpose.ROTATE_90), (0, 3 * band))
+    
+    opaque = border.getchannel('A').point(lambda a: 255 if a >= 128 else 0)
+    rgb = border.convert('RGB')
+    
+    # Bin to 16 levels per channel; transparent pixels go to an out-of-range sentinel
+    binned = Image.composite(rgb.point(lambda v: v >> 4), Image.new('RGB', rgb.size, (255, 255, 255)), opaque)
+    counts = [(count, color) for count, color in binned.getcolors(binned.width * binned.height)
+              if color != (255, 255, 255)]
+    if not counts:
+        return '#FFFFFF', 10, 0.0
+    _, dominant = max(counts)
+    total = sum(c for c, _ in counts)
+    
+    # Border pixels within one bin of the dominant bin, on every channel
+    mask = opaque
+    for channel, center in zip(rgb.split(), dominant):
+        mask = ImageChops.multiply(mask, channel.point(lambda v, c=center: 255 if abs((v >> 4) - c) <= 1 else 0))
+    stat = ImageStat.Stat(rgb, mask)
+    
+    r, g, b = (int(v) for v in stat.median)
+    tolerance = int(round(3 * max(stat.stddev))) + 2
+    tolerance = max(2, min(tolerance, Config.BACKGROUND_DETECT_MAX_TOLERANCE))
+    return f'#{r:02X}{g:02X}{b:02X}', tolerance, stat.count[0] / total
 
 
 def remove_background_color(
     image_path: str,
     background_color: str,
-    tolerance: int = 10
-) -> Image.Image:
+    tolerance: Optional[int] = 10
+) -> 'Image.Image':
     """
     Remove a solid background color from an image
     
     Args:
         image_path: Path to input image
-        background_color: Hex color of background to remove (e.g., "#FFFFFF")
-        tolerance: Color matching tolerance (0-255)
+        background_color: Hex color of background to remove (e.g., "#FFFFFF"),
+            or "auto" to detect it from the image border
+        tolerance: Color matching tolerance (0-255); None uses the tolerance
+            suggested by auto-detection
     
     Returns:
-        PIL Image with transparent background (RGBA mode)
+        PIL Image with transparent background (RGBA mode). The color and
+        tolerance used are in ``info['background_color']`` and
+        ``info['background_tolerance']``; auto-detection also sets
+        ``info['background_coverage']``.
     """
+    from PIL import Image
+    
     # Open image
-    img = Image.open(image_path)
+    with stage('bg_decode'):
+        img = Image.open(image_path)
+        img.load()
     
     # Preserve original DPI if available
     dpi = img.info.get('dpi', (1200, 1200))
@@ -86,9 +536,19 @@ def remove_background_color(
     else:
         dpi_x, dpi_y = 1200, 1200
     
+    coverage = None
+    if background_color == 'auto':
+        with stage('bg_detect'):
+            background_color, suggested_tolerance, coverage = detect_background_color(img)
+        if tolerance is None:
+            tolerance = suggested_tolerance
+    elif tolerance is None:
+        tolerance = 10
+    
     # Convert to RGBA if not already
     if img.mode != 'RGBA':
-        img = img.convert('RGBA')
+        with stage('bg_convert'):
+            img = img.convert('RGBA')
     
     # Parse background color
     bg_color = background_color.lstrip('#')
@@ -97,33 +557,104 @@ def remove_background_color(
     bg_b = int(bg_color[4:6], 16)
     
     # Create mask for pixels to remove
-    data = img.getdata()
-    new_data = []
-    
-    for item in data:
-        r, g, b, a = item
+    with stage('bg_mask'):
+        data = img.getdata()
+        new_data = []
         
-        # Check if pixel is within tolerance of background color
-        if (abs(r - bg_r) <= tolerance and
-            abs(g - bg_g) <= tolerance and
-            abs(b - bg_b) <= tolerance):
-            # Make transparent
-            new_data.append((r, g, b, 0))
-        else:
-            # Keep original
-            new_data.append(item)
+        for item in data:
+            r, g, b, a = item
+            
+            # Check if pixel is within tolerance of background color
+            if (abs(r - bg_r) <= tolerance and
+                abs(g - bg_g) <= tolerance and
+                abs(b - bg_b) <= tolerance):
+                # Make transparent
+                new_data.append((r, g, b, 0))
+            else:
+                # Keep original
+                new_data.append(item)
     
     # Update image with new data
-    img.putdata(new_data)
+    with stage('bg_putdata'):
+        img.putdata(new_data)
     
     # Store DPI in image info for later saving
     img.info['dpi'] = (dpi_x, dpi_y)
+    img.info['background_color'] = background_color.upper()
+    img.info['background_tolerance'] = tolerance
+    if coverage is not None:
+        img.info['background_coverage'] = coverage
     
     return img
 
 
+def trim_transparent(img: 'Image.Image', padding: int = 0) -> Tuple['Image.Image', Tuple[int, int, int, int]]:
+    """
+    Crop away fully transparent margins
+    
+    The bounding box of the non-zero alpha values is computed by Pillow in C.
+    
+    Args:
+        img: RGBA image
+        padding: Transparent pixels to keep around the content (limited by
+            the canvas)
+    
+    Returns:
+        (cropped image, crop box (left, top, right, bottom) in the original
+        image's coordinates). An image without opaque pixels is returned as is.
+    """
+    width, height = img.size
+    with stage('bg_trim'):
+        bbox = img.getchannel('A').getbbox()
+        if bbox is None:
+            return img, (0, 0, width, height)
+        padding = max(0, padding)
+        left, top, right, bottom = bbox
+        box = (max(0, left - padding), max(0, top - padding),
+               min(width, right + padding), min(height, bottom + padding))
+        if box == (0, 0, width, height):
+            return img, box
+        return img.crop(box), box
+
+
+def background_output_name(filename: str) -> Tuple[str, str]:
+    """
+    Output filename and format for a background-removed image
+    
+    The input format is kept, except that JPEG (no transparency) becomes PNG.
+    
+    Returns:
+        (output filename, 'png' or 'tiff')
+    """
+    base, ext = os.path.splitext(filename)
+    file_ext = ext.lstrip('.').lower()
+    if file_ext in ('tif', 'tiff'):
+        file_ext = 'tiff'
+    else:
+        file_ext = 'png'
+    return f"{base}_no_bg.{file_ext}", file_ext
+
+
+def save_background_removed(img: 'Image.Image', fp, file_ext: str,
+                            profile: Optional[str] = None,
+                            tiff_compression: Optional[str] = None) -> None:
+    """Encode a background-removed image as PNG or TIFF, keeping its DPI"""
+    # Get DPI from image info or use 1200
+    dpi = img.info.get('dpi', (1200, 1200))
+    if isinstance(dpi, tuple) and len(dpi) == 2:
+        dpi_x, dpi_y = dpi
+    else:
+        dpi_x, dpi_y = 1200, 1200
+    
+    with stage('bg_encode'):
+        encode_image(img, fp, 'tiff' if file_ext == 'tiff' else 'png', (dpi_x, dpi_y),
+                     profile, tiff_compression)
+
+
 def get_image_dimensions(image_path: str) -> Tuple[int, int]:
     """Get width and height of an image"""
+    from PIL import Image
+    
     with Image.open(image_path) as img:
         return img.size
 
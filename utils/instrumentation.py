@@ -0,0 +1,251 @@
+"""
+Opt-in request timing and metrics
+
+Enabled with Config.INSTRUMENTATION_ENABLED (HUEVAULT_INSTRUMENTATION=1).
+When on, every request records its latency per endpoint, the number and
+duration of SQL statements it ran, and the time spent in named processing
+stages (see :func:`stage`). Timings are reported to the browser in a
+Server-Timing header and aggregated per worker process at ``/metrics`` in
+the Prometheus text format.
+
+When off, no hooks are registered and :func:`stage` returns a shared no-op
+context manager, so the only cost is one global lookup per stage.
+"""
+
+import bisect
+import contextlib
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+
+# Latency buckets in seconds, from cached palette clicks up to large renders
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_enabled = False
+_NOOP = contextlib.nullcontext()
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense"""
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(le label, cumulative count) pairs including +Inf"""
+        total, result = 0, []
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            result.append(('+Inf' if bound == float('inf') else repr(bound), total))
+        return result
+
+
+class Metrics:
+    """Per-process metric registry"""
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self.request_latency: Dict[str, Histogram] = {}
+        self.requests: Dict[Tuple[str, str, int], int] = defaultdict(int)
+        self.sql_queries: Dict[str, int] = defaultdict(int)
+        self.sql_seconds: Dict[str, float] = defaultdict(float)
+        self.stage_latency: Dict[str, Histogram] = {}
+
+    def _histogram(self, table: Dict[str, Histogram], key: str) -> Histogram:
+        histogram = table.get(key)
+        if histogram is None:
+            histogram = table[key] = Histogram(self.buckets)
+        return histogram
+
+    def record_request(self, endpoint: str, method: str, status: int, seconds: float,
+                       sql_queries: int, sql_seconds: float) -> None:
+        with self._lock:
+            self._histogram(self.request_latency, endpoint).observe(seconds)
+            self.requests[(endpoint, method, status)] += 1
+            self.sql_queries[endpoint] += sql_queries
+            self.sql_seconds[endpoint] += sql_seconds
+
+    def record_stage(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._histogram(self.stage_latency, name).observe(seconds)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            _histogram_lines(lines, 'huevault_request_duration_seconds',
+                             'Request latency by endpoint', 'endpoint', self.request_latency)
+
+            lines.append('# HELP huevault_requests_total Requests by endpoint, method and status')
+            lines.append('# TYPE huevault_requests_total counter')
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(f'huevault_requests_total{{endpoint="{_escape(endpoint)}",'
+                             f'method="{method}",status="{status}"}} {count}')
+
+            lines.append('# HELP huevault_sql_queries_total SQL statements executed by endpoint')
+            lines.append('# TYPE huevault_sql_queries_total counter')
+            for endpoint, count in sorted(self.sql_queries.items()):
+                lines.append(f'huevault_sql_queries_total{{endpoint="{_escape(endpoint)}"}} {count}')
+
+            lines.append('# HELP huevault_sql_duration_seconds_total Time spent in SQL by endpoint')
+            lines.append('# TYPE huevault_sql_duration_seconds_total counter')
+            for endpoint, seconds in sorted(self.sql_seconds.items()):
+                lines.append(f'huevault_sql_duration_seconds_total{{endpoint="{_escape(endpoint)}"}} '
+                             f'{seconds:.6f}')
+
+            _histogram_lines(lines, 'huevault_stage_duration_seconds',
+                             'Processing stage latency', 'stage', self.stage_latency)
+
+        _cache_lines(lines)
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _histogram_lines(lines: List[str], name: str, help_text: str, label: str,
+                     histograms: Dict[str, Histogram]) -> None:
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    for key, histogram in sorted(histograms.items()):
+        value = _escape(key)
+        for le, count in histogram.cumulative():
+            lines.append(f'{name}_bucket{{{label}="{value}",le="{le}"}} {count}')
+        lines.append(f'{name}_sum{{{label}="{value}"}} {histogram.sum:.6f}')
+        lines.append(f'{name}_count{{{label}="{value}"}} {histogram.count}')
+
+
+def _cache_lines(lines: List[str]) -> None:
+    from utils.cache import cache_stats
+
+    stats = cache_stats()
+    for metric, field, kind, help_text in (
+        ('huevault_cache_entries', 'entries', 'gauge', 'Entries stored per cache namespace'),
+        ('huevault_cache_bytes', 'bytes', 'gauge', 'Bytes stored per cache namespace'),
+        ('huevault_cache_hits_total', 'hits', 'counter', 'Cache hits in this worker'),
+        ('huevault_cache_misses_total', 'misses', 'counter', 'Cache misses in this worker'),
+        ('huevault_cache_evictions_total', 'evictions', 'counter', 'Cache evictions by this worker')
+    ):
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} {kind}')
+        for namespace, values in sorted(stats.items()):
+            lines.append(f'{metric}{{namespace="{namespace}"}} {values[field]}')
+
+
+metrics = Metrics()
+
+
+class _Stage:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        metrics.record_stage(self.name, elapsed)
+        if has_request_context() and 'timing' in g:
+            stages = g.timing['stages']
+            stages[self.name] = stages.get(self.name, 0.0) + elapsed
+        return False
+
+
+def stage(name: str):
+    """
+    Time a block of work as a named stage
+
+    Usage::
+
+        with stage('svg_render'):
+            png = cairosvg.svg2png(...)
+    """
+    if not _enabled:
+        return _NOOP
+    return _Stage(name)
+
+
+def _server_timing(timing: dict, total: float) -> str:
+    entries = [f'app;dur={total * 1000:.1f}']
+    if timing['sql_queries']:
+        entries.append(f'db;dur={timing["sql_seconds"] * 1000:.1f};'
+                       f'desc="{timing["sql_queries"]} queries"')
+    for name, seconds in timing['stages'].items():
+        entries.append(f'{name};dur={seconds * 1000:.1f}')
+    return ', '.join(entries)
+
+
+def _register_sql_events(engine) -> None:
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        # Background threads (e.g. the file reaper) have no request to charge
+        if has_request_context() and 'timing' in g:
+            g.timing['sql_queries'] += 1
+            g.timing['sql_seconds'] += elapsed
+
+
+def init_instrumentation(app) -> None:
+    """
+    Register timing hooks, SQL events and ``/metrics`` if enabled in config
+
+    Args:
+        app: Flask application; reads INSTRUMENTATION_ENABLED and
+            INSTRUMENTATION_BUCKETS
+    """
+    global _enabled, metrics
+
+    if not app.config.get('INSTRUMENTATION_ENABLED'):
+        return
+    _enabled = True
+    buckets = app.config.get('INSTRUMENTATION_BUCKETS')
+    if buckets:
+        metrics = Metrics(buckets)
+
+    from models import db
+
+    with app.app_context():
+        _register_sql_events(db.engine)
+
+    @app.before_request
+    def _start_timing():
+        g.timing = {'start': time.perf_counter(), 'sql_queries': 0,
+                    'sql_seconds': 0.0, 'stages': {}}
+
+    @app.after_request
+    def _finish_timing(response):
+        timing = g.pop('timing', None)
+        if timing is None:
+            return response
+        total = time.perf_counter() - timing['start']
+        endpoint = request.endpoint or 'unmatched'
+        metrics.record_request(endpoint, request.method, response.status_code, total,
+                               timing['sql_queries'], timing['sql_seconds'])
+        response.headers['Server-Timing'] = _server_timing(timing, total)
+        return response
+
+    @app.route('/metrics')
+    def prometheus_metrics():
+        """Prometheus scrape endpoint (metrics of the worker that answers)"""
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,93 @@
+"""
+Rendered page cache for read-only archive and project views
+
+Pages are cached under a key that includes the object's version (a counter
+bumped on every edit, or a file signature), so edits never need explicit
+invalidation: a new version simply misses. Responses carry an ETag and
+Last-Modified built from the same version, and conditional requests are
+answered with 304 before anything is rendered. Pages live in the 'pages'
+namespace of :mod:`utils.cache`, so with the shared backend a page rendered
+by one worker is served by all of them.
+
+Keys and ETags also carry the build version, so a deploy that changes the
+templates doesn't keep serving (or confirming) markup from the old ones.
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from flask import Response, current_app, make_response, request
+
+from config import Config
+from utils.cache import cache_key, get_cache
+
+_build_version = None
+
+
+def build_version() -> str:
+    """
+    Version of the code that renders pages
+
+    Config.BUILD_VERSION when the deploy sets one, otherwise a hash of every
+    template the app can load (computed once per process).
+    """
+    global _build_version
+    if _build_version is None:
+        if Config.BUILD_VERSION:
+            _build_version = str(Config.BUILD_VERSION)[:16]
+        else:
+            loader = current_app.jinja_env.loader
+            digest = hashlib.sha256()
+            for name in sorted(loader.list_templates()):
+                source = loader.get_source(current_app.jinja_env, name)[0]
+                digest.update(name.encode('utf-8') + b'\0' + source.encode('utf-8') + b'\0')
+            _build_version = digest.hexdigest()[:16]
+    return _build_version
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.replace(microsecond=0)
+
+
+def _not_modified(etag: str, last_modified: Optional[datetime]) -> bool:
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    since = request.if_modified_since
+    return bool(since and last_modified and last_modified <= since)
+
+
+def cached_page(key: tuple, etag: str, last_modified: Optional[datetime],
+                render: Callable[[], str]) -> Response:
+    """
+    Serve a page from the cache, rendering it only on a miss
+
+    Args:
+        key: JSON-serializable parts identifying the page; must change
+            whenever its content changes
+        etag: Entity tag for the current version
+        last_modified: When the current version was produced (naive = UTC)
+        render: Callable returning the page HTML
+
+    Returns:
+        A 200 response with the page, or a 304 for a matching conditional request
+    """
+    version = build_version()
+    etag = f'{etag}-{version}'
+    last_modified = _as_utc(last_modified)
+    if _not_modified(etag, last_modified):
+        response = Response(status=304)
+    else:
+        html = get_cache('pages').get_or_set(cache_key(version, *key), render)
+        response = make_response(html)
+
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    # Let browsers keep the page but revalidate it on every visit
+    response.cache_control.no_cache = True
+    return response
@@ -0,0 +1,166 @@
+"""
+Dominant-color palette extraction from images
+
+The image is decoded at reduced size (JPEG decoding is scaled down in the
+codec itself), reduced to a few dozen candidate colors with Pillow's
+median cut, and those candidates are clustered with weighted k-means in
+CIE L*a*b*, where distances follow perceived differences. All pixel work
+happens in Pillow's C code; the Python clustering only sees at most 256
+weighted candidates and takes milliseconds.
+
+Formats without a reduced-size decoder (PNG, TIFF, WebP, GIF) have to be
+decoded in full, which dominates the run time, so their pixel count is
+limited by Config.PALETTE_EXTRACT_MAX_PIXELS.
+"""
+
+import random
+from typing import BinaryIO, List, Tuple, Union
+
+from config import Config
+from utils.color_utils import rgb_to_hex, rgb_to_lab
+from utils.instrumentation import stage
+
+Lab = Tuple[float, float, float]
+
+# Bounds for the sample's longest side
+MIN_SAMPLE_SIZE = 16
+MAX_SAMPLE_SIZE = 512
+
+
+def _squared_distance(p: Lab, q: Lab) -> float:
+    return (p[0] - q[0]) ** 2 + (p[1] - q[1]) ** 2 + (p[2] - q[2]) ** 2
+
+
+def _load_sample(source, sample_size: int):
+    """Decode a downsampled RGB copy of the image and its opacity mask"""
+    from PIL import Image
+
+    with Image.open(source) as img:
+        # JPEG: let the decoder scale by up to 1/8 instead of decoding every pixel
+        img.draft('RGB', (sample_size, sample_size))
+        # Checked after draft(), so only pixels that will really be decoded count
+        if img.width * img.height > Config.PALETTE_EXTRACT_MAX_PIXELS:
+            raise ValueError(
+                f'Image is too large to analyze ({img.width}x{img.height}); the limit is '
+                f'{Config.PALETTE_EXTRACT_MAX_PIXELS // 1_000_000} megapixels for this format'
+            )
+        img.thumbnail((sample_size, sample_size), Image.Resampling.BILINEAR, reducing_gap=2.0)
+        if img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info:
+            rgba = img.convert('RGBA')
+            mask = rgba.getchannel('A').point(lambda a: 255 if a >= 128 else 0)
+            return rgba.convert('RGB'), mask
+        return img.convert('RGB'), None
+
+
+def _candidates(rgb_image, mask, count: int) -> List[Tuple[Tuple[int, int, int], int]]:
+    """Median-cut the sample into up to ``count`` colors with pixel counts"""
+    from PIL import Image
+
+    quantized = rgb_image.quantize(colors=count, method=Image.Quantize.MEDIANCUT)
+    counts = quantized.histogram(mask=mask)
+    palette = quantized.getpalette()
+    return [
+        (tuple(palette[3 * index:3 * index + 3]), pixels)
+        for index, pixels in enumerate(counts[:count])
+        if pixels
+    ]
+
+
+def _init_centers(points: List[Lab], weights: List[int], k: int, rng: random.Random) -> List[Lab]:
+    """Weighted k-means++ seeding"""
+    centers = [points[rng.choices(range(len(points)), weights=weights)[0]]]
+    nearest = [_squared_distance(p, centers[0]) for p in points]
+    while len(centers) < k:
+        scores = [w * d for w, d in zip(weights, nearest)]
+        if not any(scores):
+            break
+        center = points[rng.choices(range(len(points)), weights=scores)[0]]
+        centers.append(center)
+        nearest = [min(d, _squared_distance(p, center)) for p, d in zip(points, nearest)]
+    return centers
+
+
+def _kmeans(points: List[Lab], weights: List[int], k: int, rng: random.Random,
+            max_iterations: int = 50) -> List[int]:
+    """Weighted Lloyd iterations; returns each point's cluster index"""
+    centers = _init_centers(points, weights, k, rng)
+    assignment = None
+    for _ in range(max_iterations):
+        new_assignment = [
+            min(range(len(centers)), key=lambda c: _squared_distance(p, centers[c]))
+            for p in points
+        ]
+        if new_assignment == assignment:
+            break
+        assignment = new_assignment
+        sums = [[0.0, 0.0, 0.0, 0] for _ in centers]
+        for p, w, c in zip(points, weights, assignment):
+            s = sums[c]
+            s[0] += p[0] * w
+            s[1] += p[1] * w
+            s[2] += p[2] * w
+            s[3] += w
+        centers = [
+            (s[0] / s[3], s[1] / s[3], s[2] / s[3]) if s[3] else centers[i]
+            for i, s in enumerate(sums)
+        ]
+    return assignment
+
+
+def extract_palette(
+    source: Union[str, BinaryIO],
+    num_colors: int = 5,
+    seed: int = None,
+    sample_size: int = None
+) -> List[Tuple[str, float]]:
+    """
+    Extract the dominant colors of an image
+
+    Args:
+        source: Path or binary file object of the image
+        num_colors: Number of colors to return (fewer if the image has fewer)
+        seed: Optional seed for deterministic clustering, as in generate_palette
+        sample_size: Longest side of the analyzed sample in pixels (16-512)
+
+    Returns:
+        (hex color, weight) pairs ordered by weight, where weight is the
+        share of opaque pixels closest to that color. Each color is a real
+        color of the image (the candidate nearest its cluster's center).
+    """
+    num_colors = max(1, min(int(num_colors), Config.PALETTE_EXTRACT_MAX_COLORS))
+    sample_size = sample_size or Config.PALETTE_EXTRACT_SAMPLE_SIZE
+    sample_size = max(MIN_SAMPLE_SIZE, min(int(sample_size), MAX_SAMPLE_SIZE))
+    rng = random.Random(seed)
+
+    with stage('extract_decode'):
+        rgb_image, mask = _load_sample(source, sample_size)
+    with stage('extract_quantize'):
+        candidates = _candidates(rgb_image, mask, min(256, max(64, num_colors * 8)))
+    if not candidates:
+        raise ValueError('Image has no opaque pixels')
+
+    colors = [rgb for rgb, _ in candidates]
+    weights = [pixels for _, pixels in candidates]
+    points = [rgb_to_lab(*rgb) for rgb in colors]
+    total = sum(weights)
+
+    with stage('extract_cluster'):
+        assignment = _kmeans(points, weights, min(num_colors, len(points)), rng)
+
+    clusters = {}
+    for index, cluster in enumerate(assignment):
+        clusters.setdefault(cluster, []).append(index)
+
+    palette = []
+    for members in clusters.values():
+        weight = sum(weights[i] for i in members)
+        center = (
+            sum(points[i][0] * weights[i] for i in members) / weight,
+            sum(points[i][1] * weights[i] for i in members) / weight,
+            sum(points[i][2] * weights[i] for i in members) / weight
+        )
+        representative = min(members, key=lambda i: _squared_distance(points[i], center))
+        palette.append((rgb_to_hex(*colors[representative]), weight / total))
+
+    palette.sort(key=lambda entry: (-entry[1], entry[0]))
+    return palette
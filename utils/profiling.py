@@ -0,0 +1,282 @@
+"""
+On-demand profiling for running workers
+
+Disabled unless Config.PROFILING_TOKEN (HUEVAULT_PROFILING_TOKEN) is set;
+every trigger must present the token in an ``X-Profile-Token`` header. It
+is never read from the query string, where it would end up in access logs,
+browser history and Referer headers.
+
+- Per-request: add ``X-Profile: 1`` (or ``?_profile=1``) to any request to
+  run it under cProfile. The stats are written to Config.PROFILE_FOLDER and
+  named in the ``X-Profile-Stats`` response header; ``report`` instead of
+  ``1`` replaces the response body with a pstats text report. Only one
+  request per worker is profiled at a time (cProfile can't run twice in a
+  process, and a capture sees every thread's calls); others are served
+  unprofiled with ``X-Profile-Stats: busy``.
+- Sampling: ``POST /_profile/sample?seconds=30`` starts a sampler in the
+  worker that answers. It snapshots every thread's stack at a fixed
+  interval for a bounded time and writes the aggregated stacks as a
+  collapsed-stack file (``*.folded``) that flamegraph.pl, speedscope or
+  inferno render directly.
+
+Profiles are listed at ``GET /_profile`` and downloaded from
+``GET /_profile/files/<name>``.
+"""
+
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+from flask import Response, abort, current_app, g, jsonify, request, send_from_directory
+
+PROFILE_EXTENSIONS = ('.prof', '.folded')
+
+# Held while a request runs under cProfile
+_request_profile_lock = threading.Lock()
+
+
+def _frame_label(code) -> str:
+    name = getattr(code, 'co_qualname', code.co_name)
+    return f'{os.path.basename(code.co_filename)}:{name}'
+
+
+def collapse_stack(frame) -> str:
+    """A frame's stack, outermost call first, in collapsed-stack notation"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return ';'.join(label.replace(';', ':').replace(' ', '_') for label in labels)
+
+
+class StackSampler:
+    """Time-boxed sampler aggregating all threads' stacks in one worker"""
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = None
+        self.seconds = 0.0
+        self.interval = 0.0
+        self.output = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds: float, interval: float) -> bool:
+        """Begin sampling; False if a run is already in progress"""
+        with self._lock:
+            if self.running:
+                return False
+            self.stacks = Counter()
+            self.samples = 0
+            self.started_at = time.time()
+            self.seconds = seconds
+            self.interval = interval
+            self.output = None
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name='huevault-stack-sampler', daemon=True
+            )
+            self._thread.start()
+            return True
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        names = {}
+        deadline = time.monotonic() + self.seconds
+        while time.monotonic() < deadline and not self._stop.is_set():
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                thread_name = names.get(thread_id, str(thread_id)).replace(' ', '_')
+                self.stacks[f'{thread_name};{collapse_stack(frame)}'] += 1
+            self.samples += 1
+            self._stop.wait(self.interval)
+        self.output = self._write()
+
+    def _write(self) -> str:
+        os.makedirs(self.folder, exist_ok=True)
+        name = f'sample-{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}.folded'
+        with open(os.path.join(self.folder, name), 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+        return name
+
+    def status(self) -> dict:
+        return {
+            'running': self.running,
+            'pid': os.getpid(),
+            'started_at': self.started_at,
+            'seconds': self.seconds,
+            'interval': self.interval,
+            'samples': self.samples,
+            'output': self.output
+        }
+
+
+def _authorized(token: str) -> bool:
+    supplied = request.headers.get('X-Profile-Token') or ''
+    return hmac.compare_digest(supplied.encode('utf-8'), token.encode('utf-8'))
+
+
+def require_profile_token() -> None:
+    """
+    Guard an operational endpoint with the profiling token
+
+    Aborts with 404 when no token is configured (the endpoint is off, like
+    the ``/_profile`` routes) and 403 when the request's
+    ``X-Profile-Token`` header does not match.
+    """
+    token = current_app.config.get('PROFILING_TOKEN')
+    if not token:
+        abort(404)
+    if not _authorized(token):
+        abort(403)
+
+
+def _profile_mode() -> Optional[str]:
+    mode = request.headers.get('X-Profile') or request.args.get('_profile')
+    return mode.lower() if mode else None
+
+
+def _stats_report(profiler: cProfile.Profile, limit: int) -> str:
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.strip_dirs().sort_stats('cumulative').print_stats(limit)
+    return stream.getvalue()
+
+
+def init_profiling(app) -> None:
+    """
+    Register the profiling hooks and ``/_profile`` routes if a token is configured
+
+    Args:
+        app: Flask application; reads PROFILING_TOKEN, PROFILE_FOLDER,
+            PROFILING_MAX_SECONDS and PROFILING_SAMPLE_INTERVAL
+    """
+    token = app.config.get('PROFILING_TOKEN')
+    if not token:
+        return
+    folder = app.config['PROFILE_FOLDER']
+    max_seconds = app.config.get('PROFILING_MAX_SECONDS', 120)
+    sampler = StackSampler(folder)
+    app.extensions['stack_sampler'] = sampler
+
+    @app.before_request
+    def _start_profile():
+        mode = _profile_mode()
+        if not mode or mode in ('0', 'false') or not _authorized(token):
+            return
+        if not _request_profile_lock.acquire(blocking=False):
+            g.profile_busy = True
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiling tool (e.g. a debugger) is active in this process
+            _request_profile_lock.release()
+            g.profile_busy = True
+            return
+        g.profile_mode = mode
+        g.profiler = profiler
+
+    def _stop_profile():
+        """Disable the request's profiler and free the slot; None if not profiling"""
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return None
+        try:
+            profiler.disable()
+        finally:
+            _request_profile_lock.release()
+        return profiler
+
+    @app.after_request
+    def _finish_profile(response):
+        if g.pop('profile_busy', False):
+            response.headers['X-Profile-Stats'] = 'busy'
+            return response
+        profiler = _stop_profile()
+        if profiler is None:
+            return response
+        os.makedirs(folder, exist_ok=True)
+        name = f'request-{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-{id(profiler):x}.prof'
+        profiler.dump_stats(os.path.join(folder, name))
+        if g.pop('profile_mode', None) == 'report':
+            response = Response(_stats_report(profiler, 60), mimetype='text/plain')
+        response.headers['X-Profile-Stats'] = name
+        return response
+
+    @app.teardown_request
+    def _release_profile(exc):
+        # after_request is skipped when an earlier handler raised
+        _stop_profile()
+
+    def _guard():
+        if not _authorized(token):
+            abort(403)
+
+    @app.route('/_profile')
+    def profile_index():
+        """Sampler status and saved profiles"""
+        _guard()
+        files = []
+        if os.path.isdir(folder):
+            files = sorted(
+                (entry.name for entry in os.scandir(folder)
+                 if entry.name.endswith(PROFILE_EXTENSIONS)),
+                reverse=True
+            )
+        return jsonify({'sampler': sampler.status(), 'files': files})
+
+    @app.route('/_profile/sample', methods=['POST'])
+    def profile_sample():
+        """Start a time-boxed sampling run in this worker"""
+        _guard()
+        try:
+            seconds = float(request.args.get('seconds', 30))
+            interval = float(request.args.get('interval',
+                                              app.config.get('PROFILING_SAMPLE_INTERVAL', 0.005)))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'seconds and interval must be numbers'}), 400
+        seconds = max(0.1, min(seconds, max_seconds))
+        interval = max(0.001, min(interval, 1.0))
+        if not sampler.start(seconds, interval):
+            return jsonify({'success': False, 'error': 'Sampling already running',
+                            'sampler': sampler.status()}), 409
+        return jsonify({'success': True, 'sampler': sampler.status()}), 202
+
+    @app.route('/_profile/sample/stop', methods=['POST'])
+    def profile_sample_stop():
+        """End the current sampling run early and write its output"""
+        _guard()
+        sampler.stop()
+        return jsonify({'success': True, 'sampler': sampler.status()})
+
+    @app.route('/_profile/files/<name>')
+    def profile_file(name):
+        """Download a saved profile"""
+        _guard()
+        if not name.endswith(PROFILE_EXTENSIONS):
+            abort(404)
+        return send_from_directory(folder, name, as_attachment=True)
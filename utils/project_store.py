@@ -0,0 +1,343 @@
+"""
+Storage for public project pages
+
+Each project page is a JSON document in Config.PROJECTS_FOLDER. Listing
+pages reads the project_pages index table instead of scanning and parsing
+every document; the index is updated whenever a project is saved and can
+be rebuilt from the files with ``flask --app wsgi projects rebuild-index``.
+
+Parsed documents are kept in the memory-only 'projects' cache namespace
+(see utils/cache.py), validated against each file's (mtime, size) on every
+read, so edits from another worker or by hand are picked up without
+explicit invalidation.
+
+Writes go to a temporary file that is fsynced and renamed over the
+document, so readers in any worker see either the old or the new version
+and never block. Writers to the same project id serialize on a per-id
+lock file, which is removed again when the writer is done.
+"""
+
+import contextlib
+import json
+import os
+import tempfile
+from typing import NamedTuple, Optional
+
+from sqlalchemy import delete, insert
+
+from config import Config
+from utils.cache import MemoryCache, get_cache
+
+try:
+    import orjson
+except ImportError:  # optional, faster serialization
+    orjson = None
+
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+PREVIEW_COLORS = 5
+CONFLICT_MODES = ('overwrite', 'unique', 'error')
+
+
+class ProjectConflictError(Exception):
+    """Raised when saving with on_conflict='error' and the project exists"""
+
+
+def project_path(project_id: str) -> str:
+    """Path of a project's JSON document"""
+    return os.path.join(Config.PROJECTS_FOLDER, f"{project_id}.json")
+
+
+class CachedProject(NamedTuple):
+    """A parsed document with the file signature it was read at"""
+    signature: tuple
+    data: dict
+    cache_cost: int  # File size, as an approximation of the parsed size
+
+
+class ProjectCache(MemoryCache):
+    """
+    LRU cache of parsed project documents
+
+    Entries are keyed by project id and only count as hits while the file's
+    (st_mtime_ns, st_size) still matches the one they were read at.
+    """
+
+    def get(self, project_id: str, default=None) -> Optional[dict]:
+        """
+        Return a project's parsed document, reading the file only when changed
+
+        The returned dict is shared between requests and must not be mutated.
+        """
+        path = project_path(project_id)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self.delete(project_id)
+            return default
+
+        entry = self._get(project_id)
+        fresh = isinstance(entry, CachedProject) and entry.signature == (stat.st_mtime_ns, stat.st_size)
+        self._record(fresh)
+        if fresh:
+            return entry.data
+
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            self.delete(project_id)
+            return default
+        self.put(project_id, data, stat)
+        return data
+
+    def put(self, project_id: str, data: dict, stat: os.stat_result) -> None:
+        """Store a parsed document read or written with the given file stat"""
+        self.set(project_id, CachedProject((stat.st_mtime_ns, stat.st_size), data, stat.st_size))
+
+
+project_cache = get_cache('projects', ProjectCache)
+
+
+def load_project(project_id: str) -> Optional[dict]:
+    """
+    Read and parse a project document, through the project cache
+
+    Returns:
+        The project data (shared, do not mutate), or None if the project
+        does not exist
+    """
+    return project_cache.get(project_id)
+
+
+def project_signature(project_id: str) -> Optional[os.stat_result]:
+    """
+    Stat a project's document; its (st_mtime_ns, st_size) identifies the version
+
+    Returns:
+        The file stat, or None if the project does not exist
+    """
+    try:
+        return os.stat(project_path(project_id))
+    except FileNotFoundError:
+        return None
+
+
+def _index_row(project_id: str, project_data: dict, stat: os.stat_result) -> dict:
+    """Index columns for a project document"""
+    palettes = project_data.get('palettes') or []
+    first = palettes[0] if palettes and isinstance(palettes[0], list) else []
+    return {
+        'id': project_id,
+        'title': str(project_data.get('title') or project_id)[:200],
+        'description': str(project_data.get('description') or ''),
+        'preview': json.dumps(first[:PREVIEW_COLORS]),
+        'mtime': stat.st_mtime,
+        'size': stat.st_size
+    }
+
+
+def index_project(session, project_id: str, project_data: dict) -> None:
+    """Insert or refresh a project's index entry (the caller commits)"""
+    from models import ProjectPage
+
+    row = _index_row(project_id, project_data, os.stat(project_path(project_id)))
+    session.merge(ProjectPage(**row))
+
+
+def dumps_project(project_data: dict) -> bytes:
+    """Serialize a project document compactly (orjson when installed)"""
+    if orjson is not None:
+        return orjson.dumps(project_data)
+    return json.dumps(project_data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def _open_locked(lock_path: str):
+    """Open and lock a lock file, retrying if it was removed while waiting"""
+    while True:
+        lock_file = open(lock_path, 'a+b')
+        if os.name == 'nt':
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            return lock_file
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        # The previous holder unlinks the file before unlocking; a waiter
+        # that locked the unlinked inode has to start over on a new file
+        try:
+            current = os.stat(lock_path)
+        except FileNotFoundError:
+            current = None
+        held = os.fstat(lock_file.fileno())
+        if current is not None and (current.st_dev, current.st_ino) == (held.st_dev, held.st_ino):
+            return lock_file
+        lock_file.close()
+
+
+@contextlib.contextmanager
+def project_lock(project_id: str):
+    """Exclusive inter-process lock for writers of one project id"""
+    lock_dir = os.path.join(Config.PROJECTS_FOLDER, '.locks')
+    os.makedirs(lock_dir, exist_ok=True)
+    lock_path = os.path.join(lock_dir, f"{project_id}.lock")
+    lock_file = _open_locked(lock_path)
+    try:
+        yield
+    finally:
+        if os.name == 'nt':
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+            lock_file.close()
+            # Fails while another writer has the file open; it removes it later
+            with contextlib.suppress(OSError):
+                os.remove(lock_path)
+        else:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(lock_path)
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            lock_file.close()
+
+
+def atomic_write(path: str, payload: bytes) -> None:
+    """Write a file via fsynced temp file and rename, so it is never seen half-written"""
+    directory, name = os.path.split(path)
+    fd, temp_path = tempfile.mkstemp(prefix=f'.{name}.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(temp_path)
+        raise
+    if os.name != 'nt':
+        # Persist the rename itself
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def save_project(project_id: str, project_data: dict, on_conflict: str = 'overwrite') -> str:
+    """
+    Atomically write a project document and update its index entry
+
+    Args:
+        project_id: Requested project id
+        project_data: Document to store
+        on_conflict: What to do if the id is taken: 'overwrite' (the default)
+            replaces the existing project, 'unique' picks the next free id
+            (``<id>-2``, ``<id>-3``, ...) and 'error' raises
+            ProjectConflictError
+
+    Returns:
+        The id the project was saved under
+    """
+    from models import db
+
+    if on_conflict not in CONFLICT_MODES:
+        raise ValueError(f"on_conflict must be one of {', '.join(CONFLICT_MODES)}")
+
+    payload = dumps_project(project_data)
+    candidate, suffix = project_id, 1
+    while True:
+        with project_lock(candidate):
+            path = project_path(candidate)
+            if os.path.exists(path):
+                if on_conflict == 'error':
+                    raise ProjectConflictError(f"Project '{candidate}' already exists")
+                if on_conflict == 'unique':
+                    suffix += 1
+                    candidate = f"{project_id}-{suffix}"
+                    continue
+
+            atomic_write(path, payload)
+            project_cache.put(candidate, project_data, os.stat(path))
+            index_project(db.session, candidate, project_data)
+            db.session.commit()
+            return candidate
+
+
+def externalize_existing_projects() -> int:
+    """
+    Rewrite project documents whose logos, favicons or graphics are inlined
+    data URLs so they reference the asset blob store instead
+
+    Returns:
+        Number of documents rewritten
+    """
+    from utils.asset_store import externalize_assets
+
+    rewritten = 0
+    if not os.path.isdir(Config.PROJECTS_FOLDER):
+        return rewritten
+    for entry in os.scandir(Config.PROJECTS_FOLDER):
+        if not entry.name.endswith('.json') or not entry.is_file():
+            continue
+        project_id = entry.name[:-len('.json')]
+        with project_lock(project_id):
+            try:
+                with open(entry.path, 'r', encoding='utf-8') as f:
+                    project_data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if not isinstance(project_data, dict):
+                continue
+            project_data, changed = externalize_assets(project_data)
+            if changed:
+                atomic_write(entry.path, dumps_project(project_data))
+                project_cache.delete(project_id)
+                rewritten += 1
+    return rewritten
+
+
+def list_projects(page: int = 1, per_page: int = 24):
+    """
+    Page through indexed projects, most recently saved first
+
+    Returns:
+        A Flask-SQLAlchemy Pagination of ProjectPage rows
+    """
+    from models import ProjectPage
+
+    return ProjectPage.query \
+        .order_by(ProjectPage.mtime.desc(), ProjectPage.id) \
+        .paginate(page=page, per_page=per_page, error_out=False)
+
+
+def rebuild_index(conn) -> int:
+    """
+    Recreate the project_pages index from the JSON files on disk
+
+    Args:
+        conn: SQLAlchemy connection inside a transaction
+
+    Returns:
+        Number of projects indexed
+    """
+    from models import ProjectPage
+
+    table = ProjectPage.__table__
+    rows = []
+    if os.path.isdir(Config.PROJECTS_FOLDER):
+        for entry in os.scandir(Config.PROJECTS_FOLDER):
+            if not entry.name.endswith('.json') or not entry.is_file():
+                continue
+            project_id = entry.name[:-len('.json')]
+            try:
+                with open(entry.path, 'r', encoding='utf-8') as f:
+                    project_data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if isinstance(project_data, dict):
+                rows.append(_index_row(project_id, project_data, entry.stat()))
+
+    conn.execute(delete(table))
+    if rows:
+        conn.execute(insert(table), rows)
+    return len(rows)
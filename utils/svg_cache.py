@@ -0,0 +1,80 @@
+"""
+Parsed SVG documents reused between renders
+
+Before cairosvg draws anything it builds its node tree: the XML is parsed,
+style sheets are matched and every property is cascaded down the document.
+That tree doesn't depend on the DPI, output size or format, so parsed
+documents are kept in the 'svg_tree' cache namespace (per process, bounded
+by estimated memory), keyed by the SHA-256 of the SVG bytes.
+
+Drawing writes into the nodes (resolved mask and pattern sizes, path
+vertices, bounding boxes), so every render gets its own copy of the node
+structure. Copies share the parsed XML and style sheets and cost a small
+fraction of a parse.
+"""
+
+import hashlib
+import sys
+
+from utils.cache import get_cache
+from utils.instrumentation import stage
+
+# The XML element and its selector wrapper, referenced by each node
+ELEMENT_OVERHEAD = 1024
+
+
+class ParsedSvg:
+    """A parsed cairosvg tree with its approximate size in memory"""
+
+    __slots__ = ('tree', 'cache_cost')
+
+    def __init__(self, tree, cache_cost: int):
+        self.tree = tree
+        self.cache_cost = cache_cost
+
+
+def _tree_cost(tree) -> int:
+    cost, stack = 0, [tree]
+    while stack:
+        node = stack.pop()
+        cost += sys.getsizeof(node) + sys.getsizeof(node.__dict__) + ELEMENT_OVERHEAD
+        cost += sum(sys.getsizeof(value) for value in node.values())
+        stack.extend(node.children)
+    return cost
+
+
+def _copy_node(node, copies: dict):
+    """Copy a node and its descendants, sharing everything but the nodes"""
+    copy = dict.__new__(type(node))
+    dict.update(copy, node)
+    copy.__dict__.update(node.__dict__)
+    copies[id(node)] = copy
+    if getattr(node, 'parent', None) is not None:
+        copy.parent = copies.get(id(node.parent), node.parent)
+    copy.children = [_copy_node(child, copies) for child in node.children]
+    return copy
+
+
+def copy_svg_tree(tree):
+    """A copy of a parsed tree that can be rendered without touching the original"""
+    return _copy_node(tree, {})
+
+
+def parsed_svg_tree(svg_data: bytes):
+    """
+    A cairosvg tree for SVG bytes, parsed at most once per cache lifetime
+
+    Returns:
+        A private copy of the cached tree, safe to render (and modify)
+    """
+    from cairosvg.parser import Tree
+
+    cache = get_cache('svg_tree')
+    key = hashlib.sha256(svg_data).hexdigest()
+    parsed = cache.get(key)
+    if parsed is None:
+        with stage('svg_parse'):
+            tree = Tree(bytestring=svg_data)
+            parsed = ParsedSvg(tree, _tree_cost(tree))
+        cache.set(key, parsed)
+    return copy_svg_tree(parsed.tree)
@@ -0,0 +1,287 @@
+"""
+Tiled SVG rendering for outputs too large for one cairo surface
+
+The output is cut into square tiles. Each tile is drawn on its own
+tile-sized cairosvg surface, with the root viewport translated so that the
+tile's region lands on it (cairo clips everything else), so the pixels
+match a single full-size render. Tiles are compressed as they finish and
+written straight into a tiled TIFF on disk: memory use depends on the tile
+size and the number of tiles in flight, not on the output size.
+
+Tiles render on a thread pool; cairo's rasterizer and zlib release the
+GIL. This module imports cairosvg, so it is only imported on first use.
+
+TileSurface hooks into cairosvg internals (written against the pinned
+2.7.1), so :func:`tiles_match_full_render` renders a small document both
+ways once per process; callers only tile when the two agree.
+"""
+
+import struct
+import threading
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from fractions import Fraction
+from typing import BinaryIO, List, Optional, Tuple
+
+import cairocffi
+from cairosvg.surface import PNGSurface
+
+from config import Config
+from utils.svg_cache import copy_svg_tree, parsed_svg_tree
+
+Box = Tuple[int, int, int, int]
+
+# TIFF field types and the struct format of one value of each
+SHORT, LONG, RATIONAL, LONG8 = 3, 4, 5, 16
+_FIELD_FORMATS = {SHORT: 'H', LONG: 'I', RATIONAL: 'II', LONG8: 'Q'}
+COMPRESSION_NONE, COMPRESSION_DEFLATE = 1, 8
+
+# Parity check document: non-integer scaling, a nested viewport, strokes,
+# transparency, and a size that leaves partial tiles on both edges
+_PARITY_SVG = b'''<svg xmlns="http://www.w3.org/2000/svg" width="43" height="29" viewBox="0 0 20 13.5">
+<rect x="0.5" y="0.5" width="19" height="12.5" fill="#0f62fe" stroke="#da1e28" stroke-width="0.7"/>
+<circle cx="13" cy="7" r="5" fill="#24a148" fill-opacity="0.6"/>
+<svg x="2" y="2" width="7" height="7" viewBox="0 0 1 1"><rect width="1" height="1" fill="#f1c21b"/></svg>
+</svg>'''
+_PARITY_TILE_SIZE = 16
+
+_executor = None
+_executor_lock = threading.Lock()
+_parity = None
+
+
+class TileSurface(PNGSurface):
+    """PNG surface holding only the ``box`` region of the full output"""
+
+    def __init__(self, tree, dpi: float, box: Box, output_width: Optional[int] = None,
+                 output_height: Optional[int] = None):
+        self.box = box
+        self._translated = False
+        super().__init__(tree, None, dpi, output_width=output_width, output_height=output_height)
+
+    def _create_surface(self, width, height):
+        left, top, right, bottom = self.box
+        surface = cairocffi.ImageSurface(cairocffi.FORMAT_ARGB32, right - left, bottom - top)
+        # Report the full size: cairosvg lays out the document against it
+        return surface, int(round(width)), int(round(height))
+
+    def set_context_size(self, width, height, viewbox, tree):
+        if not self._translated:
+            # First call sets up the root viewport; nested <svg> elements come later
+            self.context.translate(-self.box[0], -self.box[1])
+            self._translated = True
+        super().set_context_size(width, height, viewbox, tree)
+
+
+class TiledTiffWriter:
+    """
+    Write an 8-bit RGBA TIFF tile by tile
+
+    Tiles are appended as they arrive and the directory is written by
+    :meth:`close`, so nothing but the tile offsets is kept in memory.
+    BigTIFF (64-bit offsets) is used when the file could pass 4 GB.
+    """
+
+    def __init__(self, fp: BinaryIO, width: int, height: int, tile_size: int,
+                 dpi: float, compression: int = COMPRESSION_NONE):
+        if tile_size % 16:
+            raise ValueError('TIFF tile size must be a multiple of 16')
+        self.fp = fp
+        self.width, self.height, self.tile_size = width, height, tile_size
+        self.dpi = dpi
+        self.compression = compression
+        self.columns = -(-width // tile_size)
+        self.rows = -(-height // tile_size)
+        tile_bytes = tile_size * tile_size * 4
+        # zlib can grow incompressible data slightly
+        self.bigtiff = self.columns * self.rows * (tile_bytes + tile_bytes // 100 + 64) >= 2 ** 32 - 2 ** 20
+        self.offsets = [0] * (self.columns * self.rows)
+        self.byte_counts = [0] * (self.columns * self.rows)
+        self.fp.write(b'\0' * (16 if self.bigtiff else 8))  # Header, patched on close
+
+    def boxes(self) -> List[Box]:
+        """Tile regions in file order (rows of tiles, top to bottom)"""
+        size = self.tile_size
+        return [(x, y, x + size, y + size)
+                for y in range(0, self.height, size) for x in range(0, self.width, size)]
+
+    def write_tile(self, index: int, data: bytes) -> None:
+        """Store one tile's (already compressed) bytes"""
+        self.offsets[index] = self.fp.tell()
+        self.byte_counts[index] = len(data)
+        self.fp.write(data)
+        if len(data) % 2:
+            self.fp.write(b'\0')  # Keep offsets word-aligned
+
+    def close(self) -> None:
+        """Write the image directory and the header pointing at it"""
+        offset_type = LONG8 if self.bigtiff else LONG
+        resolution = Fraction(self.dpi).limit_denominator(10000)
+        fields = [
+            (256, LONG, [self.width]),
+            (257, LONG, [self.height]),
+            (258, SHORT, [8, 8, 8, 8]),
+            (259, SHORT, [self.compression]),
+            (262, SHORT, [2]),  # RGB
+            (277, SHORT, [4]),
+            (282, RATIONAL, [resolution.numerator, resolution.denominator]),
+            (283, RATIONAL, [resolution.numerator, resolution.denominator]),
+            (284, SHORT, [1]),  # Chunky pixels
+            (296, SHORT, [2]),  # Resolution in inches
+            (322, LONG, [self.tile_size]),
+            (323, LONG, [self.tile_size]),
+            (324, offset_type, self.offsets),
+            (325, offset_type, self.byte_counts),
+            (338, SHORT, [2])  # Unassociated alpha, as Pillow writes RGBA
+        ]
+        if self.bigtiff:
+            header = struct.pack('<2sHHHQ', b'II', 43, 8, 0, 0)
+            count_format, entry_format, inline, next_format = '<Q', '<HHQ', 8, '<Q'
+        else:
+            header = struct.pack('<2sHI', b'II', 42, 0)
+            count_format, entry_format, inline, next_format = '<H', '<HHI', 4, '<I'
+
+        ifd_offset = self.fp.tell()
+        entry_size = struct.calcsize(entry_format) + inline
+        data_offset = (ifd_offset + struct.calcsize(count_format) + len(fields) * entry_size
+                       + struct.calcsize(next_format))
+        entries, extra = [struct.pack(count_format, len(fields))], []
+        extra_size = 0
+        for tag, field_type, values in fields:
+            fmt = _FIELD_FORMATS[field_type]
+            packed = struct.pack(f'<{len(values)}{fmt[0]}', *values)
+            count = len(values) // len(fmt)
+            if len(packed) <= inline:
+                value = packed.ljust(inline, b'\0')
+            else:
+                value = struct.pack('<Q' if self.bigtiff else '<I', data_offset + extra_size)
+                packed += b'\0' * (len(packed) % 2)
+                extra.append(packed)
+                extra_size += len(packed)
+            entries.append(struct.pack(entry_format, tag, field_type, count) + value)
+        entries.append(struct.pack(next_format, 0))
+
+        self.fp.write(b''.join(entries))
+        self.fp.write(b''.join(extra))
+        self.fp.seek(0)
+        self.fp.write(header[:-struct.calcsize(next_format)] + struct.pack(next_format, ifd_offset))
+        self.fp.seek(0, 2)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=max(1, Config.SVG_TILE_WORKERS),
+                    thread_name_prefix='huevault-svg-tile'
+                )
+    return _executor
+
+
+def render_tile(tree, dpi: float, box: Box, output_size: Tuple[Optional[int], Optional[int]],
+                level: Optional[int]) -> bytes:
+    """
+    Render one tile to straight-alpha RGBA bytes
+
+    Args:
+        tree: Parsed SVG tree; it is copied, not modified
+        dpi: Resolution for physical units
+        box: Tile region (left, top, right, bottom) of the full output
+        output_size: Output width/height as passed to cairosvg (None for the SVG's size)
+        level: zlib level to compress the tile with, or None for raw bytes
+    """
+    surface = TileSurface(copy_svg_tree(tree), dpi, box, *output_size)
+    cairo_surface = surface.cairo
+    data = _rgba(cairo_surface, box[2] - box[0], box[3] - box[1]).tobytes()
+    cairo_surface.finish()
+    return data if level is None else zlib.compress(data, level)
+
+
+def _rgba(cairo_surface, width: int, height: int):
+    from PIL import Image
+
+    cairo_surface.flush()
+    return Image.frombuffer('RGBA', (width, height), cairo_surface.get_data(),
+                            'raw', 'BGRa', cairo_surface.get_stride(), 1)
+
+
+def _tiles_match(tree, output_size: Tuple[Optional[int], Optional[int]]) -> bool:
+    from PIL import Image
+
+    full = PNGSurface(copy_svg_tree(tree), None, 96,
+                      output_width=output_size[0], output_height=output_size[1])
+    expected = _rgba(full.cairo, full.width, full.height).tobytes()
+    size = _PARITY_TILE_SIZE
+    tiled = Image.new('RGBA', (-(-full.width // size) * size, -(-full.height // size) * size))
+    for y in range(0, full.height, size):
+        for x in range(0, full.width, size):
+            data = render_tile(tree, 96, (x, y, x + size, y + size), output_size, None)
+            tiled.paste(Image.frombytes('RGBA', (size, size), data), (x, y))
+    return tiled.crop((0, 0, full.width, full.height)).tobytes() == expected
+
+
+def tiles_match_full_render() -> bool:
+    """
+    Whether tiles reassemble into exactly the single-surface render
+
+    Checked once per process on a small document, at its own size and at an
+    explicit output size, with 16 px tiles.
+    """
+    global _parity
+    if _parity is None:
+        from cairosvg.parser import Tree
+
+        try:
+            tree = Tree(bytestring=_PARITY_SVG)
+            _parity = _tiles_match(tree, (None, None)) and _tiles_match(tree, (61, 41))
+        except Exception:
+            _parity = False
+    return _parity
+
+
+def render_svg_tiled(svg_data: bytes, fp: BinaryIO, width: int, height: int, dpi: float,
+                     output_dpi: float, explicit_size: bool = False,
+                     level: Optional[int] = None, tile_size: Optional[int] = None) -> None:
+    """
+    Render an SVG into a tiled TIFF file
+
+    Args:
+        svg_data: SVG document bytes
+        fp: Seekable binary file to write the TIFF to
+        width: Output width in pixels
+        height: Output height in pixels
+        dpi: Resolution for physical units in the SVG
+        output_dpi: Resolution recorded in the TIFF
+        explicit_size: Scale the drawing to width x height (as for a requested
+            output size) instead of rendering the SVG at its own size
+        level: Deflate level for the tiles, or None for uncompressed
+        tile_size: Tile edge in pixels (default Config.SVG_TILE_SIZE)
+    """
+    tree = parsed_svg_tree(svg_data)  # Parsed once; every tile renders a copy
+    output_size = (width, height) if explicit_size else (None, None)
+    writer = TiledTiffWriter(fp, width, height, tile_size or Config.SVG_TILE_SIZE, output_dpi,
+                             COMPRESSION_NONE if level is None else COMPRESSION_DEFLATE)
+    tiles = iter(enumerate(writer.boxes()))
+    pending = deque()
+
+    def submit_next() -> None:
+        for index, box in tiles:
+            pending.append((index, _get_executor().submit(
+                render_tile, tree, dpi, box, output_size, level)))
+            return
+
+    try:
+        for _ in range(max(1, Config.SVG_TILE_IN_FLIGHT)):
+            submit_next()
+        while pending:
+            index, future = pending.popleft()
+            data = future.result()
+            submit_next()
+            writer.write_tile(index, data)
+    finally:
+        for _, future in pending:
+            future.cancel()
+    writer.close()
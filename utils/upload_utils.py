@@ -0,0 +1,226 @@
+"""
+Streaming upload helpers for multi-image archive uploads
+
+Uploaded files are written straight to disk while the multipart body is
+parsed, hashed and size-checked on the fly, and then moved into place with
+a rename instead of being copied a second time.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import uuid
+import weakref
+from typing import Iterable, List, NamedTuple, Optional
+
+from flask import Request, current_app, has_app_context
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.utils import secure_filename
+
+from config import Config
+
+CHUNK_SIZE = 64 * 1024
+
+
+class StagedUpload(NamedTuple):
+    """An uploaded file that has landed on disk but is not yet in place"""
+    filename: str
+    unique_filename: str
+    path: str
+    size: int
+    sha256: str
+
+
+def incoming_folder() -> str:
+    """Directory holding uploads that are still being received or staged"""
+    folder = os.path.join(Config.UPLOAD_FOLDER, '.incoming')
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class HashingUploadStream:
+    """
+    File-like container handed to the multipart parser
+
+    Every chunk written by the parser goes to a temporary file next to the
+    upload folder, updates a SHA-256 digest and is counted against
+    ``max_size``. The temporary file is removed when the stream is closed
+    or garbage collected, unless it was claimed with :meth:`claim`.
+    """
+
+    def __init__(self, directory: str, max_size: Optional[int] = None):
+        fd, self.path = tempfile.mkstemp(prefix='.upload-', dir=directory)
+        self._file = os.fdopen(fd, 'w+b')
+        self._hash = hashlib.sha256()
+        self._finalizer = weakref.finalize(self, _remove_quietly, self.path)
+        self.max_size = max_size
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.max_size is not None and self.size > self.max_size:
+            raise RequestEntityTooLarge(
+                f'Uploaded file exceeds {self.max_size // (1024 * 1024)}MB limit'
+            )
+        self._hash.update(data)
+        return self._file.write(data)
+
+    @property
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+    def claim(self, destination: str) -> None:
+        """Move the received file to ``destination`` and stop tracking it"""
+        self._file.close()
+        os.replace(self.path, destination)
+        self._finalizer.detach()
+
+    def close(self) -> None:
+        self._file.close()
+        self._finalizer()
+
+    def __getattr__(self, name):
+        # read, readline, seek, tell, flush, ... go to the temporary file
+        return getattr(self._file, name)
+
+
+def streamed_uploads(view):
+    """Mark a view so its file uploads are received by HashingUploadStream"""
+    view.streamed_uploads = True
+    return view
+
+
+def upload_limit(max_content_length: int):
+    """Give a view its own request size limit instead of MAX_CONTENT_LENGTH"""
+    def decorator(view):
+        view.max_content_length = max_content_length
+        return view
+    return decorator
+
+
+class StreamingUploadRequest(Request):
+    """Request class that streams uploads of marked views straight to disk"""
+
+    def _view(self):
+        if has_app_context() and self.endpoint:
+            return current_app.view_functions.get(self.endpoint)
+        return None
+
+    @property
+    def max_content_length(self) -> Optional[int]:
+        limit = getattr(self._view(), 'max_content_length', None)
+        if limit is not None:
+            return limit
+        return super().max_content_length
+
+    def _get_file_stream(self, total_content_length, content_type,
+                         filename=None, content_length=None):
+        view = self._view()
+        if getattr(view, 'streamed_uploads', False):
+            return HashingUploadStream(incoming_folder(), Config.MAX_UPLOAD_FILE_SIZE)
+        return super()._get_file_stream(
+            total_content_length, content_type, filename, content_length
+        )
+
+
+def _stage_one(file) -> StagedUpload:
+    """Land a single uploaded file in the incoming folder"""
+    filename = secure_filename(file.filename)
+    # Add UUID to avoid conflicts
+    unique_filename = f"{uuid.uuid4().hex[:8]}_{filename}"
+    path = os.path.join(incoming_folder(), f".staged-{unique_filename}")
+
+    stream = file.stream
+    if isinstance(stream, HashingUploadStream):
+        # Already on disk and hashed while the request body was parsed
+        size, digest = stream.size, stream.hexdigest
+        stream.claim(path)
+    else:
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(path, 'wb') as out:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > Config.MAX_UPLOAD_FILE_SIZE:
+                        raise RequestEntityTooLarge(
+                            f'Uploaded file exceeds '
+                            f'{Config.MAX_UPLOAD_FILE_SIZE // (1024 * 1024)}MB limit'
+                        )
+                    digest.update(chunk)
+                    out.write(chunk)
+        except Exception:
+            _remove_quietly(path)
+            raise
+        digest = digest.hexdigest()
+
+    return StagedUpload(filename, unique_filename, path, size, digest)
+
+
+def stage_uploads(files: Iterable, allowed_file) -> List[StagedUpload]:
+    """
+    Land uploaded files in the incoming folder
+
+    Streamed uploads were already written and hashed while the request body
+    was parsed, so staging them is a rename; this runs inline rather than on
+    a thread pool, which would only add hand-off overhead. Files with a
+    disallowed extension are skipped, as are empty files and files whose
+    content duplicates an earlier file in the same batch.
+
+    Args:
+        files: FileStorage objects from ``request.files.getlist``
+        allowed_file: Predicate on the client-supplied filename
+
+    Returns:
+        Staged uploads in the order they were submitted
+    """
+    accepted = [f for f in files if f and f.filename and allowed_file(f.filename)]
+    if not accepted:
+        return []
+
+    staged, seen = [], set()
+    try:
+        for file in accepted:
+            upload = _stage_one(file)
+            if upload.size == 0 or upload.sha256 in seen:
+                _remove_quietly(upload.path)
+                continue
+            seen.add(upload.sha256)
+            staged.append(upload)
+    except Exception:
+        discard_uploads(staged)
+        raise
+    return staged
+
+
+def promote_uploads(staged: List[StagedUpload], dest_dir: str) -> None:
+    """Rename staged uploads into their final directory"""
+    if not staged:
+        return
+    os.makedirs(dest_dir, exist_ok=True)
+    for upload in staged:
+        target = os.path.join(dest_dir, upload.unique_filename)
+        try:
+            os.replace(upload.path, target)
+        except OSError:
+            # Incoming folder on another filesystem
+            shutil.move(upload.path, target)
+
+
+def discard_uploads(staged: List[StagedUpload], dest_dir: Optional[str] = None) -> None:
+    """Remove staged uploads, whether or not they were already promoted"""
+    for upload in staged:
+        _remove_quietly(upload.path)
+        if dest_dir:
+            _remove_quietly(os.path.join(dest_dir, upload.unique_filename))